@@ -0,0 +1,87 @@
+# scripts/bench_db_import.py
+# Benchmark for the genus / feature table parsers in src/pipeline/db_import.py.
+# Writes synthetic biom TSV exports of increasing size and times the columnar
+# parsers against the old per-sample iterrows() implementation, then times the
+# FASTA + taxonomy join on a 50k-ASV project.
+# Run with: python3 -m scripts.bench_db_import
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.pipeline.db_import import parse_feat_tax_seqs, parse_feature_counts, parse_genus_table
+
+SAMPLES = 20
+ROW_SIZES = [2_000, 4_000, 8_000, 16_000]
+LEGACY_MAX_ROWS = 4_000   # iterrows() is too slow to run at the larger sizes
+FASTA_ASVS = 50_000
+
+
+def _write_table(path: str, n_rows: int, n_samples: int, genus: bool) -> None:
+    rng = np.random.default_rng(0)
+    if genus:
+        ids = [f"d__Bacteria;p__Firmicutes;g__Genus{i}" for i in range(n_rows)]
+        values = rng.dirichlet(np.ones(n_rows), size=n_samples).T
+    else:
+        ids = [f"{i:032x}" for i in range(n_rows)]
+        values = rng.poisson(20, size=(n_rows, n_samples)).astype(float)
+    with open(path, "w") as f:
+        f.write("# Constructed from biom file\n")
+        f.write("#OTU ID\t" + "\t".join(f"SRR{j}" for j in range(n_samples)) + "\n")
+        for rid, row in zip(ids, values):
+            f.write(rid + "\t" + "\t".join(repr(float(v)) for v in row) + "\n")
+
+
+def _write_fasta_and_taxonomy(fasta: str, tax: str, n_asvs: int) -> None:
+    rng = np.random.default_rng(0)
+    bases = np.array(list("ACGT"))
+    with open(fasta, "w") as f, open(tax, "w") as t:
+        t.write("Feature ID\tTaxon\tConfidence\n")
+        for i in range(n_asvs):
+            seq = "".join(bases[rng.integers(0, 4, 250)])
+            # wrap at 80 columns like most FASTA writers
+            f.write(f">{i:032x}\n" + "\n".join(seq[k:k + 80] for k in range(0, 250, 80)) + "\n")
+            t.write(f"{i:032x}\td__Bacteria;g__Genus{i % 300}\t0.9\n")
+
+
+def _legacy_feature_counts(feat: str):
+    feature_table = pd.read_csv(feat, sep='\t', skiprows=1)
+    feature_table.rename(columns={'#OTU ID': 'feature_id'}, inplace=True)
+    features = {}
+    for col in feature_table.columns[1:]:
+        features[col] = {row['feature_id']: int(row[col]) for _, row in feature_table.iterrows()}
+    return features
+
+
+def _time(fn, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    tmp = tempfile.mkdtemp()
+    print(f"{'rows':>8} {'cells':>10} {'genus (s)':>10} {'feature (s)':>12} {'ns/cell':>8} {'iterrows (s)':>13}")
+    for n_rows in ROW_SIZES:
+        genus_path = os.path.join(tmp, f"genus-{n_rows}.tsv")
+        feat_path = os.path.join(tmp, f"feat-{n_rows}.tsv")
+        _write_table(genus_path, n_rows, SAMPLES, genus=True)
+        _write_table(feat_path, n_rows, SAMPLES, genus=False)
+
+        t_genus = _time(parse_genus_table, genus_path)
+        t_feat = _time(parse_feature_counts, feat_path)
+        cells = n_rows * SAMPLES
+        legacy = f"{_time(_legacy_feature_counts, feat_path):13.3f}" if n_rows <= LEGACY_MAX_ROWS else f"{'—':>13}"
+        print(f"{n_rows:>8} {cells:>10} {t_genus:>10.3f} {t_feat:>12.3f} {t_feat / cells * 1e9:>8.0f} {legacy}")
+
+    fasta = os.path.join(tmp, "dna-sequences.fasta")
+    tax = os.path.join(tmp, "taxonomy.tsv")
+    _write_fasta_and_taxonomy(fasta, tax, FASTA_ASVS)
+    print(f"\nparse_feat_tax_seqs, {FASTA_ASVS:,} ASVs: {_time(parse_feat_tax_seqs, tax, fasta):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# scripts/bench_distance_scheduler.py
+# Benchmark for the multiprocess tile scheduler in src/services/distance_scheduler.py.
+# Times Bray-Curtis and all UniFrac variants in-process against the process
+# pool at 200 / 500 runs.
+# Run with: python3 -m scripts.bench_distance_scheduler [workers]
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from scripts.bench_unifrac import _random_tree
+from src.services.distance_scheduler import DistanceScheduler
+from src.services.diversity import braycurtis_matrix
+from src.services.unifrac import TreeArrays, unifrac_matrices
+
+SAMPLE_SIZES = [200, 500]
+N_FEATURES = 2_000
+
+
+def _counts(n: int, f: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    x = rng.poisson(5, size=(n, f))
+    x[rng.random((n, f)) < 0.8] = 0
+    return x
+
+
+def _time(fn, *args, **kwargs) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(2, (os.cpu_count() or 2) - 1)
+    pool = DistanceScheduler(max_workers=workers, min_rows=0)
+    tree = TreeArrays.from_tree(_random_tree(N_FEATURES, np.random.default_rng(1)))
+    tips = tree.tip_index([f"asv{i}" for i in range(N_FEATURES)])
+    print(f"{N_FEATURES:,} features, 80% zeros, {workers} workers on {os.cpu_count()} CPUs")
+    print(f"{'runs':>6} {'metric':>8} {'serial (s)':>11} {'pool (s)':>9} {'speed-up':>9}")
+    for n in SAMPLE_SIZES:
+        x = _counts(n, N_FEATURES)
+        t_old, old = _time(braycurtis_matrix, x)
+        t_new, new = _time(braycurtis_matrix, x, scheduler=pool)
+        assert np.allclose(old, new)
+        print(f"{n:>6} {'bray':>8} {t_old:>11.3f} {t_new:>9.3f} {t_old / t_new:>8.1f}x")
+        t_old, old = _time(unifrac_matrices, tree, x, tips)
+        t_new, new = _time(unifrac_matrices, tree, x, tips, scheduler=pool)
+        assert all(np.allclose(old[m], new[m]) for m in old)
+        print(f"{n:>6} {'unifrac':>8} {t_old:>11.3f} {t_new:>9.3f} {t_old / t_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# scripts/bench_ingest.py
+# Benchmark for ingest_run_data on a synthetic 100k-feature run.
+# "before" replays the old per-ASV create_feature() + ORM add() path,
+# "after" is the Core executemany path now used by ingest_run_data.
+# Uses a throw-away SQLCipher DB in a temp dir — data/axisad.db is untouched.
+# Run with: python3 -m scripts.bench_ingest [n_features]
+
+import os
+import sys
+import tempfile
+import time
+
+import src.db.database as database
+from src.db.db_models import Base
+from src.db.repository import (
+    create_user, create_project, create_run, get_run,
+    create_genus_bulk, create_feature, create_feature_count_bulk,
+)
+from src.services.assessment_service import ingest_run_data
+
+
+def _setup(n_runs: int) -> list[int]:
+    database.DEFAULT_DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.init_engine(os.urandom(32))
+    Base.metadata.create_all(database.get_engine())
+    session = database.SessionLocal()
+    user = create_user(session, username="bench", password_hash="x", user_email="")
+    project = create_project(session, user=user, name="bench")
+    run_ids = [create_run(session, project=project, source="upload", srr_accession=f"BENCH{i}").run_id
+               for i in range(n_runs)]
+    session.commit()
+    session.close()
+    return run_ids
+
+
+def _legacy_ingest(run_id, genus_rows, features, feature_counts) -> None:
+    session = database.SessionLocal()
+    try:
+        run = get_run(session, run_id)
+        create_genus_bulk(session, run=run, genus_abundances=dict(genus_rows))
+        for f in features:
+            create_feature(session, project=run.project, feature_id=f["feature_id"],
+                           sequence=f.get("sequence"), taxonomy=f.get("taxonomy"))
+        session.flush()
+        create_feature_count_bulk(session, run=run, counts=feature_counts)
+        session.commit()
+    finally:
+        session.close()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    features = [
+        {"feature_id": f"{i:032x}", "sequence": "ACGT" * 63, "taxonomy": f"d__Bacteria;g__Genus{i % 300}"}
+        for i in range(n)
+    ]
+    counts = {f["feature_id"]: (i % 97) + 1 for i, f in enumerate(features)}
+    genus_rows = [(f"Genus{i}", 1 / 300) for i in range(300)]
+    rows = len(features) + len(counts) + len(genus_rows)
+
+    before_id, after_id = _setup(2)
+    print(f"Ingesting {n:,} features ({rows:,} rows) per run")
+
+    t0 = time.perf_counter()
+    _legacy_ingest(before_id, genus_rows, features, counts)
+    t_before = time.perf_counter() - t0
+    print(f"  before (ORM, flush per ASV): {t_before:7.2f} s  {rows / t_before:>10,.0f} rows/s")
+
+    t0 = time.perf_counter()
+    ingest_run_data(after_id, genus_rows, features, counts)
+    t_after = time.perf_counter() - t0
+    print(f"  after  (Core executemany):   {t_after:7.2f} s  {rows / t_after:>10,.0f} rows/s")
+    print(f"  speed-up: {t_before / t_after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# scripts/bench_pcoa.py
+# Benchmark for PCoA in src/services/ordination.py.
+# Times the old H-matrix double-centring + full eigh from
+# _AnalysisWorkerReal._pcoa_from_matrix against the in-place centring with
+# a truncated subset solve and with Lanczos (eigsh) at 200 / 1000 / 3000 runs.
+# Run with: python3 -m scripts.bench_pcoa [k]
+
+import sys
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist, squareform
+
+from src.services.ordination import N_AXES, pcoa
+
+SAMPLE_SIZES = [200, 1000, 3000]
+
+
+def _legacy_pcoa(matrix: np.ndarray) -> np.ndarray:
+    n = matrix.shape[0]
+    H = np.eye(n) - np.ones((n, n)) / n
+    B = -0.5 * H @ (matrix ** 2) @ H
+    eigenvalues, eigenvectors = np.linalg.eigh(B)
+    return eigenvalues[::-1]
+
+
+def _distances(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return squareform(pdist(rng.gamma(1.0, size=(n, 50)), "braycurtis"))
+
+
+def _time(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+def main(k: int) -> None:
+    print(f"{'runs':>6} {'legacy':>10} {'dense-k':>10} {'eigsh-k':>10} {'max |Δλ|':>10}")
+    for n in SAMPLE_SIZES:
+        d = _distances(n)
+        t_old, full = _time(_legacy_pcoa, d)
+        t_dense, dense = _time(pcoa, d, k, method="dense")
+        t_lanczos, lanczos = _time(pcoa, d, k, method="eigsh")
+        err = max(np.abs(dense.eigenvalues - full[:k]).max(), np.abs(lanczos.eigenvalues - full[:k]).max())
+        print(f"{n:>6} {t_old:>9.3f}s {t_dense:>9.3f}s {t_lanczos:>9.3f}s {err:>10.1e}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N_AXES)
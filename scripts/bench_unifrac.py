@@ -0,0 +1,125 @@
+# scripts/bench_unifrac.py
+# Benchmark for the UniFrac engine in src/services/unifrac.py.
+# Builds random binary trees with 1k / 10k / 50k tips and times the flat-array
+# engine against the old per-pair postorder walk from _UnifracWorker, and
+# times all four UniFrac variants computed together from one accumulation.
+# Run with: python3 -m scripts.bench_unifrac [n_samples]
+
+import sys
+import time
+
+import numpy as np
+
+from src.services.unifrac import TreeArrays, unifrac_matrices, weighted_normalized_unifrac
+
+TIP_SIZES = [1_000, 10_000, 50_000]
+N_SAMPLES = 10
+
+
+class _Node:
+    __slots__ = ("name", "length", "parent", "children")
+
+    def __init__(self, name="", length=None):
+        self.name, self.length, self.parent, self.children = name, length, None, []
+
+
+def _random_tree(n_tips: int, rng) -> _Node:
+    """Join random pairs of subtrees until one root remains."""
+    nodes = [_Node(f"asv{i}", float(rng.exponential(0.1))) for i in range(n_tips)]
+    while len(nodes) > 1:
+        i, j = sorted(rng.choice(len(nodes), 2, replace=False))
+        a, b = nodes.pop(j), nodes.pop(i)
+        parent = _Node("", float(rng.exponential(0.1)))
+        parent.children = [a, b]
+        a.parent = b.parent = parent
+        nodes.append(parent)
+    root = nodes[0]
+    root.length = None
+    return root
+
+
+def _postorder(root):
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            yield node
+        else:
+            stack.append((node, True))
+            for c in reversed(node.children):
+                stack.append((c, False))
+
+
+def _legacy_wunifrac(postorder_nodes, counts_a: dict, counts_b: dict) -> float:
+    total_a, total_b = sum(counts_a.values()), sum(counts_b.values())
+    if total_a == 0 and total_b == 0:
+        return 0.0
+    prop_a = {k: v / total_a for k, v in counts_a.items()} if total_a else {}
+    prop_b = {k: v / total_b for k, v in counts_b.items()} if total_b else {}
+    sub_a: dict[int, float] = {}
+    sub_b: dict[int, float] = {}
+    for node in postorder_nodes:
+        nid = id(node)
+        if not node.children:
+            sub_a[nid] = prop_a.get(node.name or "", 0.0)
+            sub_b[nid] = prop_b.get(node.name or "", 0.0)
+        else:
+            sub_a[nid] = sum(sub_a[id(c)] for c in node.children)
+            sub_b[nid] = sum(sub_b[id(c)] for c in node.children)
+    numerator = denominator = 0.0
+    for node in postorder_nodes:
+        if node.parent is None:
+            continue
+        bl = node.length or 0.0
+        if bl == 0.0:
+            continue
+        sa, sb = sub_a[id(node)], sub_b[id(node)]
+        numerator += bl * abs(sa - sb)
+        denominator += bl * (sa + sb)
+    return numerator / denominator if denominator > 0 else 0.0
+
+
+def _legacy(root, feature_ids, counts) -> np.ndarray:
+    postorder_nodes = list(_postorder(root))
+    per_run = [dict(zip(feature_ids, row)) for row in counts.tolist()]
+    n = len(per_run)
+    out = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1, n):
+            out[i, j] = out[j, i] = _legacy_wunifrac(postorder_nodes, per_run[i], per_run[j])
+    return out
+
+
+def main() -> None:
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else N_SAMPLES
+    rng = np.random.default_rng(0)
+    print(f"{n_samples} samples ({n_samples * (n_samples - 1) // 2} pairs)")
+    print(f"{'tips':>8} {'legacy (s)':>11} {'flatten (s)':>12} {'engine (s)':>11} {'speed-up':>9} {'all 4 (s)':>10}")
+    for n_tips in TIP_SIZES:
+        root = _random_tree(n_tips, rng)
+        feature_ids = [f"asv{i}" for i in range(n_tips)]
+        counts = rng.poisson(2, size=(n_samples, n_tips))
+        counts[rng.random(counts.shape) < 0.7] = 0
+
+        t0 = time.perf_counter()
+        old = _legacy(root, feature_ids, counts)
+        t_old = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        tree = TreeArrays.from_tree(root)
+        t_flat = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        new = weighted_normalized_unifrac(tree, counts, tree.tip_index(feature_ids))
+        t_new = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        unifrac_matrices(tree, counts, tree.tip_index(feature_ids))
+        t_all = time.perf_counter() - t0
+
+        assert np.allclose(old, new)
+        print(f"{n_tips:>8,} {t_old:>11.3f} {t_flat:>12.3f} {t_new:>11.3f} {t_old / (t_flat + t_new):>8.1f}x"
+              f" {t_all:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, Text,
+    Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON,
     CheckConstraint, ForeignKeyConstraint, UniqueConstraint
 )
 from sqlalchemy.orm import declarative_base, relationship
@@ -43,11 +43,16 @@ class Project(Base):
     user_id    = Column(Integer, ForeignKey("user.user_id"), nullable=False)
     name       = Column(String(128), nullable=False)
     created_at = Column(DateTime(timezone=True), default=utcnow)
+    # Bumped whenever a run's feature counts change; keys cached count matrices
+    ingest_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User", back_populates="projects")
     # Deleting a project cascades to all its runs and everything under them.
     runs = relationship("Run", back_populates="project", cascade="all, delete-orphan")
     trees = relationship("Tree", back_populates="project", cascade="all, delete-orphan")
+    # Project-wide ASV dictionary shared by every run in the project
+    features = relationship("Feature", back_populates="project", cascade="all, delete-orphan")
+    pcoa_axes = relationship("PCoAAxis", back_populates="project", cascade="all, delete-orphan")
 
 
 # ==== RUN ====
@@ -66,11 +71,14 @@ class Run(Base):
     risk_score         = Column(Float)       # 0-100
     risk_label         = Column(String(32))  # "Low", "Moderate", "High"
     confidence         = Column(Float)       # 0-100
+    ingested_at        = Column(DateTime(timezone=True))  # last ingest_run_data; NULL until counts exist
 
     project           = relationship("Project", back_populates="runs")
     genus_data        = relationship("Genus",         back_populates="run", cascade="all, delete-orphan")
-    features          = relationship("Feature",       back_populates="run", cascade="all, delete-orphan")
+    feature_counts    = relationship("FeatureCount",  back_populates="run", cascade="all, delete-orphan")
     alpha_diversities = relationship("AlphaDiversity", back_populates="run", cascade="all, delete-orphan")
+    rarefaction       = relationship("Rarefaction",   back_populates="run", cascade="all, delete-orphan")
+    analysis_stamps   = relationship("AnalysisStamp", back_populates="run", cascade="all, delete-orphan")
     pcoa_coords       = relationship("PCoA", back_populates="run", cascade="all, delete-orphan")
     simulations       = relationship("Simulation",    back_populates="run", cascade="all, delete-orphan")
 
@@ -100,39 +108,43 @@ class Genus(Base):
 
 
 # ==== FEATURE ====
-# An ASV (Amplicon Sequence Variant)
-# Populated from .fastq and .tsv files
-# Composite PK: (run_id, feature_id) — feature IDs are ASV hashes (unique for each run)
+# An ASV (Amplicon Sequence Variant) in a project's feature dictionary
+# Populated from .fasta and taxonomy.tsv files
+# Composite PK: (project_id, feature_id) — one row per ASV hash per project,
+# shared by every run in the project; per-run data lives in FeatureCount
 class Feature(Base):
     __tablename__ = "feature"
 
-    run_id     = Column(Integer, ForeignKey("run.run_id"), primary_key=True, nullable=False)
+    project_id = Column(Integer, ForeignKey("project.project_id"), primary_key=True, nullable=False)
     feature_id = Column(String(64), primary_key=True, nullable=False)  # ASV hash ID
-    sequence   = Column(Text)     # DNA sequence from .fastq
+    sequence   = Column(Text)     # DNA sequence from .fasta
     taxonomy   = Column(Text)     # Taxonomic classification string from .tsv
 
-    run    = relationship("Run", back_populates="features")
-    counts = relationship("FeatureCount", back_populates="feature", cascade="all, delete-orphan")
+    project = relationship("Project", back_populates="features")
+    counts  = relationship("FeatureCount", back_populates="feature", cascade="all, delete-orphan")
 
 
 # ==== FEATURE COUNT ====
-# Raw abundance count for one ASV in one run
+# Raw abundance count for one ASV in one run (zero counts are not stored)
 # Populated from .tsv (rows = ASVs, columns = run IDs, values = counts)
-# Composite PK + composite FK back to Feature: (run_id, feature_id)
+# Composite PK: (run_id, feature_id)
+# Composite FK back to the project's Feature row: (project_id, feature_id)
 class FeatureCount(Base):
     __tablename__ = "feature_count"
 
-    run_id     = Column(Integer, primary_key=True, nullable=False)
+    run_id     = Column(Integer, ForeignKey("run.run_id"), primary_key=True, nullable=False)
     feature_id = Column(String(64), primary_key=True, nullable=False)
+    project_id = Column(Integer, nullable=False)
     abundance  = Column(Integer, nullable=False)
 
+    run     = relationship("Run", back_populates="feature_counts")
     # Composite FK — both columns together point to the Feature row
     feature = relationship("Feature", back_populates="counts")
 
     __table_args__ = (
         ForeignKeyConstraint(
-            ["run_id", "feature_id"],
-            ["feature.run_id", "feature.feature_id"],
+            ["project_id", "feature_id"],
+            ["feature.project_id", "feature.feature_id"],
         ),
     )
 
@@ -164,6 +176,40 @@ class AlphaDiversity(Base):
     run = relationship("Run", back_populates="alpha_diversities")
 
 
+# ==== RAREFACTION ====
+# Summary of an alpha metric over repeated subsamples of a run at one depth
+# Composite PK: (run_id, metric, depth) — one row per depth per metric per run
+class Rarefaction(Base):
+    __tablename__ = "rarefaction"
+
+    run_id  = Column(Integer, ForeignKey("run.run_id"), primary_key=True, nullable=False)
+    metric  = Column(String(64), primary_key=True, nullable=False)
+    depth   = Column(Integer, primary_key=True, nullable=False)   # reads per subsample
+    n_iter  = Column(Integer, nullable=False)                     # subsamples drawn
+    mean    = Column(Float, nullable=False)
+    minimum = Column(Float, nullable=False)
+    q1      = Column(Float, nullable=False)
+    median  = Column(Float, nullable=False)
+    q3      = Column(Float, nullable=False)
+    maximum = Column(Float, nullable=False)
+
+    run = relationship("Run", back_populates="rarefaction")
+
+
+# ==== ANALYSIS STAMP ====
+# When a derived analysis last covered a run. A run is dirty for an analysis
+# when it has no stamp or was ingested after its stamp was written.
+# Composite PK: (run_id, analysis) — one row per analysis per run
+class AnalysisStamp(Base):
+    __tablename__ = "analysis_stamp"
+
+    run_id      = Column(Integer, ForeignKey("run.run_id"), primary_key=True, nullable=False)
+    analysis    = Column(String(32), primary_key=True, nullable=False)  # "alpha", "bray_curtis", "unifrac"
+    computed_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+    run = relationship("Run", back_populates="analysis_stamps")
+
+
 # ==== BETA DIVERSITY ====
 # A pairwise diversity distance between two runs
 # Composite PK: (run_id_1, run_id_2, metric) — one row per pair per metric
@@ -186,9 +232,10 @@ class PCoA(Base):
     # Integer surrogate PK matches Tree — avoids a wide composite PK on floats
     pcoa_id = Column(Integer, primary_key=True)
     run_id  = Column(Integer, ForeignKey("run.run_id"), nullable=False)
-    metric  = Column(String(64), nullable=False)   # "bray_curtis" or "unifrac"
+    metric  = Column(String(64), nullable=False)   # "bray_curtis" or one of the *_unifrac keys
     pc1     = Column(Float, nullable=False)
     pc2     = Column(Float, nullable=False)
+    coords  = Column(JSON)    # all stored axes [pc1, pc2, pc3, ...]; NULL for legacy 2-axis rows
  
     run = relationship("Run", back_populates="pcoa_coords")
  
@@ -197,6 +244,21 @@ class PCoA(Base):
         UniqueConstraint("run_id", "metric", name="uq_pcoa_run_metric"),
     )
 
+
+# ==== PCOA AXIS ====
+# Eigenvalue of one ordination axis, shared by every run of the project
+# Composite PK: (project_id, metric, axis) — axis is 1-based, as in "PC1"
+class PCoAAxis(Base):
+    __tablename__ = "pcoa_axis"
+
+    project_id           = Column(Integer, ForeignKey("project.project_id"), primary_key=True, nullable=False)
+    metric               = Column(String(64), primary_key=True, nullable=False)
+    axis                 = Column(Integer, primary_key=True, nullable=False)
+    eigenvalue           = Column(Float, nullable=False)
+    proportion_explained = Column(Float, nullable=False)   # eigenvalue / trace of the centred matrix
+
+    project = relationship("Project", back_populates="pcoa_axes")
+
 class Simulation(Base):
     __tablename__ = "simulation"
 
@@ -1,8 +1,10 @@
 # src/db/init_db.py
 from src.db.database import get_engine
 from src.db.db_models import Base
+from src.db.migrations import run_migrations
 import os
 
 def init_db():
     os.makedirs("data", exist_ok=True)
+    run_migrations(get_engine())
     Base.metadata.create_all(get_engine())
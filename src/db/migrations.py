@@ -0,0 +1,99 @@
+# src/db/migrations.py
+# In-place upgrades for axisad.db files created by older releases.
+# create_all() only adds missing tables, so any change to an existing table's
+# layout needs a step here. Each step checks the live schema and is a no-op
+# once applied, so run_migrations() is safe to call on every start-up.
+from __future__ import annotations
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from src.db.db_models import Feature, FeatureCount
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    insp = inspect(conn)
+    if not insp.has_table(table):
+        return set()
+    return {c["name"] for c in insp.get_columns(table)}
+
+
+def _migrate_run_scoped_features(conn: Connection) -> None:
+    """
+    feature used to be keyed by (run_id, feature_id), storing the sequence and
+    taxonomy once per run. Fold it into the per-project dictionary keyed by
+    (project_id, feature_id) and move project_id onto feature_count.
+    Zero counts are dropped on the way; they are implied by absence now.
+    """
+    if "run_id" not in _columns(conn, "feature"):
+        return
+
+    conn.execute(text("ALTER TABLE feature_count RENAME TO feature_count_legacy"))
+    conn.execute(text("ALTER TABLE feature RENAME TO feature_legacy"))
+    Feature.__table__.create(conn)
+    FeatureCount.__table__.create(conn)
+
+    # One dictionary row per (project, ASV); any run's copy of the sequence will do
+    conn.execute(text("""
+        INSERT INTO feature (project_id, feature_id, sequence, taxonomy)
+        SELECT r.project_id, f.feature_id, MAX(f.sequence), MAX(f.taxonomy)
+        FROM feature_legacy AS f
+        JOIN run AS r ON r.run_id = f.run_id
+        GROUP BY r.project_id, f.feature_id
+    """))
+    conn.execute(text("""
+        INSERT INTO feature_count (run_id, feature_id, project_id, abundance)
+        SELECT fc.run_id, fc.feature_id, r.project_id, fc.abundance
+        FROM feature_count_legacy AS fc
+        JOIN run AS r ON r.run_id = fc.run_id
+        WHERE fc.abundance > 0
+    """))
+
+    conn.execute(text("DROP TABLE feature_count_legacy"))
+    conn.execute(text("DROP TABLE feature_legacy"))
+
+
+def _add_project_ingest_version(conn: Connection) -> None:
+    """project.ingest_version keys the in-memory count matrix cache."""
+    cols = _columns(conn, "project")
+    if not cols or "ingest_version" in cols:
+        return
+    conn.execute(text("ALTER TABLE project ADD COLUMN ingest_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_run_ingested_at(conn: Connection) -> None:
+    """run.ingested_at drives incremental diversity recomputation (see analysis_stamp)."""
+    cols = _columns(conn, "run")
+    if not cols or "ingested_at" in cols:
+        return
+    conn.execute(text("ALTER TABLE run ADD COLUMN ingested_at DATETIME"))
+
+
+def _add_pcoa_coords(conn: Connection) -> None:
+    """pcoa.coords holds every stored axis; pc1/pc2 stay for existing readers."""
+    cols = _columns(conn, "pcoa")
+    if not cols or "coords" in cols:
+        return
+    conn.execute(text("ALTER TABLE pcoa ADD COLUMN coords JSON"))
+
+
+def _rename_unifrac_metric(conn: Connection) -> None:
+    """
+    "unifrac" was the only UniFrac variant and was normalised weighted UniFrac;
+    it now sits alongside unweighted / weighted / generalised under explicit keys.
+    """
+    for table in ("beta_div", "pcoa"):
+        if _columns(conn, table):
+            conn.execute(text(
+                f"UPDATE {table} SET metric = 'weighted_normalized_unifrac' WHERE metric = 'unifrac'"
+            ))
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply every pending schema upgrade in one transaction."""
+    with engine.begin() as conn:
+        _add_project_ingest_version(conn)
+        _add_run_ingested_at(conn)
+        _add_pcoa_coords(conn)
+        _migrate_run_scoped_features(conn)
+        _rename_unifrac_metric(conn)
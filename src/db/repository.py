@@ -6,12 +6,14 @@
 # The service layer own the session lifecycle (flush/commit/rollback/close)
 from __future__ import annotations
 
-from sqlalchemy.orm import Session
-from sqlalchemy import select, delete, desc, exists, or_, and_
+from sqlalchemy.orm import Session, selectinload, aliased
+from sqlalchemy import select, insert, update, delete, desc, exists, literal, or_, and_, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from src.db.db_models import (
     User, Project, Run, Genus, Feature, FeatureCount,
-    Tree, AlphaDiversity, BetaDiversity, PCoA, Simulation,
+    Tree, AlphaDiversity, Rarefaction, AnalysisStamp, BetaDiversity, PCoA, PCoAAxis, Simulation,
+    utcnow,
 )
 
 from argon2 import PasswordHasher
@@ -19,6 +21,18 @@ from argon2.exceptions import VerifyMismatchError
 
 ph = PasswordHasher()
 
+# Rows per executemany() call for the bulk_insert_* helpers.
+# Ingesting n rows costs ceil(n / BULK_BATCH_SIZE) round-trips.
+BULK_BATCH_SIZE = 5000
+
+
+def _executemany(session: Session, table, rows: list[dict], batch_size: int) -> int:
+    """Core INSERT of plain dicts in fixed-size executemany batches (no ORM objects)."""
+    stmt = insert(table)
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
 
 # ==== Custom errors ====
 class RepositoryError(Exception):
@@ -94,6 +108,72 @@ def list_projects_for_user(session: Session, user_id: int) -> list[Project]:
     return list(session.execute(stmt).scalars().all())  # Return all matching rows
 
 
+def bump_ingest_version(session: Session, project_id: int) -> None:
+    """Mark a project's feature counts as changed (invalidates cached count matrices)."""
+    session.execute(
+        update(Project)
+        .where(Project.project_id == project_id)
+        .values(ingest_version=Project.ingest_version + 1)
+    )
+
+
+def get_project_ingest_version(session: Session, project_id: int) -> int:
+    stmt = select(Project.ingest_version).where(Project.project_id == project_id)
+    version = session.execute(stmt).scalar_one_or_none()
+    if version is None:
+        raise NotFoundError(f"Project not found: project_id={project_id}")
+    return version
+
+
+def list_projects_with_runs_for_user(session: Session, user_id: int) -> list[Project]:
+    """
+    Return all projects for a user, newest first, with Project.runs eagerly
+    loaded by a single SELECT ... WHERE project_id IN (...) (two queries total).
+    """
+    stmt = (
+        select(Project)
+        .where(Project.user_id == user_id)
+        .options(selectinload(Project.runs))
+        .order_by(desc(Project.created_at), desc(Project.project_id))
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+def get_project_run_summaries(session: Session, project_id: int) -> list[tuple[int, str | None, bool]]:
+    """
+    Return (run_id, bio_proj_accession, has_data) for every run in a project,
+    newest first. has_data is true when the run has any feature counts or
+    genus rows; both are correlated EXISTS checks in the same SELECT.
+    """
+    has_data = or_(
+        exists().where(FeatureCount.run_id == Run.run_id),
+        exists().where(Genus.run_id == Run.run_id),
+    )
+    stmt = (
+        select(Run.run_id, Run.bio_proj_accession, has_data)
+        .where(Run.project_id == project_id)
+        .order_by(desc(Run.created_at), desc(Run.run_id))
+    )
+    return [(run_id, acc, bool(flag)) for run_id, acc, flag in session.execute(stmt).all()]
+
+
+def get_project_distinct_counts(session: Session, project_id: int) -> tuple[int, int]:
+    """Return (distinct ASVs, distinct genera) observed across a project's runs in one SELECT."""
+    asvs = (
+        select(func.count(func.distinct(FeatureCount.feature_id)))
+        .where(FeatureCount.project_id == project_id)
+        .scalar_subquery()
+    )
+    genera = (
+        select(func.count(func.distinct(Genus.genus)))
+        .join(Run, Genus.run_id == Run.run_id)
+        .where(Run.project_id == project_id)
+        .scalar_subquery()
+    )
+    total_asvs, total_genera = session.execute(select(asvs, genera)).one()
+    return int(total_asvs), int(total_genera)
+
+
 # ==== RUN ====
 def create_run(
         session: Session,
@@ -148,6 +228,26 @@ def update_run_risk(
     return run
 
 
+def count_runs_in_project(session: Session, project_id: int, run_ids: list[int]) -> int:
+    """How many of run_ids belong to project_id (one COUNT query)."""
+    stmt = (
+        select(func.count())
+        .select_from(Run)
+        .where(Run.project_id == project_id, Run.run_id.in_(run_ids))
+    )
+    return int(session.execute(stmt).scalar())
+
+
+def count_existing_runs(session: Session, run_ids: list[int]) -> int:
+    """How many of run_ids exist at all (one COUNT query)."""
+    stmt = select(func.count()).select_from(Run).where(Run.run_id.in_(run_ids))
+    return int(session.execute(stmt).scalar())
+
+
+def mark_run_ingested(session: Session, run_id: int) -> None:
+    session.execute(update(Run).where(Run.run_id == run_id).values(ingested_at=utcnow()))
+
+
 def list_runs_for_project(session: Session, project_id: int) -> list[Run]:
     """Return all runs for a project, newest first."""
     stmt = (
@@ -176,6 +276,22 @@ def create_genus_bulk(
     return rows
 
 
+def bulk_insert_genus(
+        session: Session,
+        *,
+        run_id: int,
+        genus_abundances: dict[str, float],   # {"Firmicutes": 0.35, ...}
+        simulation_id: int | None = None,
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """Core executemany insert of genus abundances for a run. Returns rows inserted."""
+    rows = [
+        {"run_id": run_id, "genus": genus_name, "relative_abundance": abundance, "simulation_id": simulation_id}
+        for genus_name, abundance in genus_abundances.items()
+    ]
+    return _executemany(session, Genus.__table__, rows, batch_size)
+
+
 def get_genus_for_run(session: Session, run_id: int) -> list[Genus]:
     """Return all genus rows for a run, sorted alphabetically by genus name."""
     stmt = (
@@ -192,16 +308,17 @@ def get_run_exists_genus_table(session: Session, run_id: int) -> bool:
     return bool(session.execute(stmt).scalar())
 
 # ==== FEATURE ====
+# Features form a per-project dictionary keyed by ASV hash; runs only own FeatureCount rows
 def create_feature(
         session: Session,
         *,
-        run: Run,
+        project: Project,
         feature_id: str,
         sequence: str | None = None,
         taxonomy: str | None = None,
 ) -> Feature:
     feature = Feature(
-        run_id=run.run_id,
+        project_id=project.project_id,
         feature_id=feature_id,
         sequence=sequence,
         taxonomy=taxonomy,
@@ -211,32 +328,120 @@ def create_feature(
     return feature
 
 
-def get_feature(session: Session, run_id: int, feature_id: str) -> Feature:
-    stmt = select(Feature).where(   # Composit key - pass two conditions to .where() is equivalent to WHERE run_id = ? AND feature_id = ?
-        Feature.run_id == run_id,
+def upsert_project_features(
+        session: Session,
+        *,
+        project_id: int,
+        features: list[dict],   # [{"feature_id": ..., "sequence": ..., "taxonomy": ...}]
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Core executemany upsert into a project's feature dictionary.
+    ASVs already known to the project keep one row; their sequence and
+    taxonomy are refreshed from the latest classification.
+    """
+    stmt = sqlite_insert(Feature.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Feature.project_id, Feature.feature_id],
+        set_={"sequence": stmt.excluded.sequence, "taxonomy": stmt.excluded.taxonomy},
+    )
+    rows = [
+        {"project_id": project_id, "feature_id": f["feature_id"],
+         "sequence": f.get("sequence"), "taxonomy": f.get("taxonomy")}
+        for f in features
+    ]
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
+
+def get_feature(session: Session, project_id: int, feature_id: str) -> Feature:
+    stmt = select(Feature).where(   # Composit key - pass two conditions to .where() is equivalent to WHERE project_id = ? AND feature_id = ?
+        Feature.project_id == project_id,
         Feature.feature_id == feature_id,
     )
     feature = session.execute(stmt).scalar_one_or_none()
     if feature is None:
-        raise NotFoundError(f"Feature not found: run_id={run_id}, feature_id={feature_id!r}")
+        raise NotFoundError(f"Feature not found: project_id={project_id}, feature_id={feature_id!r}")
     return feature
 
 
+def list_feature_ids_for_project(session: Session, project_id: int) -> set[str]:
+    stmt = select(Feature.feature_id).where(Feature.project_id == project_id)
+    return set(session.execute(stmt).scalars().all())
+
+
+def list_features_for_project(session: Session, project_id: int) -> list[Feature]:
+    stmt = select(Feature).where(Feature.project_id == project_id)
+    return list(session.execute(stmt).scalars().all())
+
+
 def list_features_for_run(session: Session, run_id: int) -> list[Feature]:
-    stmt = select(Feature).where(Feature.run_id == run_id)
+    """Return the dictionary Feature rows observed in a run (via its FeatureCount rows)."""
+    stmt = (
+        select(Feature)
+        .join(FeatureCount, and_(FeatureCount.project_id == Feature.project_id,
+                                 FeatureCount.feature_id == Feature.feature_id))
+        .where(FeatureCount.run_id == run_id)
+    )
     return list(session.execute(stmt).scalars().all())
 
 
-def delete_features_for_run(session: Session, run_id: int) -> None:
-    """Delete all Feature rows for a run (cascades to FeatureCount via ORM relationship)."""
-    features = session.execute(select(Feature).where(Feature.run_id == run_id)).scalars().all()
-    for feat in features:
-        session.delete(feat)
+def delete_features_for_run(session: Session, run_id: int, *, prune: bool = False) -> None:
+    """
+    Set-based delete of a run's FeatureCount rows.
+    With prune=True, dictionary entries of the run's project that no other run
+    still counts are removed afterwards (children first, so FKs stay satisfied).
+    """
+    session.execute(delete(FeatureCount).where(FeatureCount.run_id == run_id))
+    if prune:
+        project_id = select(Run.project_id).where(Run.run_id == run_id).scalar_subquery()
+        delete_orphan_features(session, project_id)
+
+
+def delete_orphan_features(session: Session, project_id) -> int:
+    """Delete a project's Feature rows that no FeatureCount references. Returns rows deleted."""
+    referenced = exists().where(
+        FeatureCount.project_id == Feature.project_id,
+        FeatureCount.feature_id == Feature.feature_id,
+    )
+    result = session.execute(
+        delete(Feature).where(Feature.project_id == project_id, ~referenced)
+    )
+    return result.rowcount
+
+
+def move_run_features(session: Session, *, run: Run, project_id: int) -> None:
+    """
+    Re-point a run's FeatureCount rows at another project's feature dictionary,
+    copying any dictionary entries the target project does not have yet and
+    pruning the ones the source project no longer uses.
+    Call before changing run.project_id so both dictionaries stay FK-consistent.
+    """
+    if run.project_id == project_id:
+        return
+    copy = (
+        select(literal(project_id), Feature.feature_id, Feature.sequence, Feature.taxonomy)
+        .join(FeatureCount, and_(FeatureCount.project_id == Feature.project_id,
+                                 FeatureCount.feature_id == Feature.feature_id))
+        .where(FeatureCount.run_id == run.run_id)
+    )
+    session.execute(
+        insert(Feature.__table__)
+        .prefix_with("OR IGNORE")
+        .from_select(["project_id", "feature_id", "sequence", "taxonomy"], copy)
+    )
+    session.execute(
+        update(FeatureCount)
+        .where(FeatureCount.run_id == run.run_id)
+        .values(project_id=project_id)
+    )
+    # The old project's entries that only this run used are now dead weight
+    delete_orphan_features(session, run.project_id)
 
 
 def delete_genus_for_run(session: Session, run_id: int) -> None:
     """Delete all Genus rows for a run."""
-    from src.db.db_models import Genus
     session.execute(delete(Genus).where(Genus.run_id == run_id))
 
 
@@ -244,27 +449,86 @@ def delete_genus_for_run(session: Session, run_id: int) -> None:
 def create_feature_count_bulk(
         session: Session,
         *,
-        run_id: int,
+        run: Run,
         counts: dict[str, int],   # {feature_id: abundance_count}
 ) -> list[FeatureCount]:
     """Insert all feature counts for a run at once (from feature-table.tsv)."""
     rows = []
     for feature_id, abundance in counts.items():
-        row = FeatureCount(run_id=run_id, feature_id=feature_id, abundance=abundance)
+        row = FeatureCount(run_id=run.run_id, project_id=run.project_id,
+                           feature_id=feature_id, abundance=abundance)
         session.add(row)
         rows.append(row)
     session.flush()
     return rows
 
 
+def bulk_insert_feature_counts(
+        session: Session,
+        *,
+        run_id: int,
+        project_id: int,
+        counts: dict[str, int],   # {feature_id: abundance_count}
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Core executemany insert of feature counts for a run. Returns rows inserted.
+    Zero counts are skipped — an ASV absent from a run has no row.
+    """
+    rows = [
+        {"run_id": run_id, "project_id": project_id, "feature_id": feature_id, "abundance": abundance}
+        for feature_id, abundance in counts.items()
+        if abundance
+    ]
+    return _executemany(session, FeatureCount.__table__, rows, batch_size)
+
+
 def get_feature_counts_for_run(session: Session, run_id: int) -> list[FeatureCount]:
     stmt = select(FeatureCount).where(FeatureCount.run_id == run_id)
     return list(session.execute(stmt).scalars().all())
 
 
+def get_feature_counts_with_taxonomy(session: Session, run_id: int) -> list[tuple[str, int, str | None]]:
+    """Return (feature_id, abundance, taxonomy) rows for a run in one joined SELECT."""
+    stmt = (
+        select(FeatureCount.feature_id, FeatureCount.abundance, Feature.taxonomy)
+        .outerjoin(Feature, and_(Feature.project_id == FeatureCount.project_id,
+                                 Feature.feature_id == FeatureCount.feature_id))
+        .where(FeatureCount.run_id == run_id)
+    )
+    return [tuple(row) for row in session.execute(stmt).all()]
+
+
+def get_project_count_triplets(
+        session: Session,
+        project_id: int,
+        run_ids: list[int] | None = None,
+) -> list[tuple[int, str, int]]:
+    """
+    Return every (run_id, feature_id, abundance) in a project from one SELECT,
+    optionally restricted to some runs. Used to build sample x feature matrices.
+    """
+    stmt = (
+        select(FeatureCount.run_id, FeatureCount.feature_id, FeatureCount.abundance)
+        .where(FeatureCount.project_id == project_id)
+    )
+    if run_ids is not None:
+        stmt = stmt.where(FeatureCount.run_id.in_(run_ids))
+    return [tuple(row) for row in session.execute(stmt).all()]
+
+
+def get_project_feature_taxonomy_map(session: Session, project_id: int) -> dict[str, str]:
+    """Return {feature_id: taxonomy} for a project's classified features."""
+    stmt = (
+        select(Feature.feature_id, Feature.taxonomy)
+        .where(Feature.project_id == project_id, Feature.taxonomy.is_not(None))
+    )
+    return {fid: tax for fid, tax in session.execute(stmt).all() if tax}
+
+
 def get_run_exists_feature_table(session: Session, run_id: int) -> bool:
     stmt = (
-        select(exists().where(Feature.run_id == run_id))
+        select(exists().where(FeatureCount.run_id == run_id))
     )
     return bool(session.execute(stmt).scalar())
 
@@ -308,6 +572,24 @@ def create_alpha_diversity(
     return alpha
 
 
+def bulk_insert_alpha(
+        session: Session,
+        *,
+        rows: list[dict],   # [{"run_id": ..., "metric": ..., "value": ...}]
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """Core executemany insert of alpha diversity rows. Returns rows inserted."""
+    return _executemany(session, AlphaDiversity.__table__, rows, batch_size)
+
+
+def delete_alpha_for_runs(session: Session, run_ids: list[int], metrics: list[str] | None = None) -> int:
+    """Set-based delete of AlphaDiversity rows for several runs, optionally only some metrics."""
+    stmt = delete(AlphaDiversity).where(AlphaDiversity.run_id.in_(run_ids))
+    if metrics is not None:
+        stmt = stmt.where(AlphaDiversity.metric.in_(metrics))
+    return session.execute(stmt).rowcount
+
+
 def get_alpha_diversity_for_run(session: Session, run_id: int) -> list[AlphaDiversity]:
     """Return all alpha diversity metrics for a run."""
     stmt = select(AlphaDiversity).where(AlphaDiversity.run_id == run_id)
@@ -321,6 +603,80 @@ def get_run_exists_alpha_table(session: Session, run_id: int) -> bool:
     return bool(session.execute(stmt).scalar())
 
 
+# ==== RAREFACTION ====
+def upsert_rarefaction_bulk(
+        session: Session,
+        *,
+        rows: list[dict],   # [{"run_id", "metric", "depth", "n_iter", "mean", "minimum", "q1", "median", "q3", "maximum"}]
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """Core executemany upsert of rarefaction summaries on (run_id, metric, depth)."""
+    stmt = sqlite_insert(Rarefaction.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Rarefaction.run_id, Rarefaction.metric, Rarefaction.depth],
+        set_={c: stmt.excluded[c] for c in ("n_iter", "mean", "minimum", "q1", "median", "q3", "maximum")},
+    )
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
+
+def delete_rarefaction_for_runs(session: Session, run_ids: list[int]) -> int:
+    """Set-based delete of every rarefaction row for several runs."""
+    return session.execute(delete(Rarefaction).where(Rarefaction.run_id.in_(run_ids))).rowcount
+
+
+def get_rarefaction_for_project(session: Session, project_id: int, metric: str) -> list[Rarefaction]:
+    """Return a project's rarefaction rows for one metric, ordered by run then depth."""
+    stmt = (
+        select(Rarefaction)
+        .join(Run, Rarefaction.run_id == Run.run_id)
+        .where(Run.project_id == project_id, Rarefaction.metric == metric)
+        .order_by(Rarefaction.run_id, Rarefaction.depth)
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+# ==== ANALYSIS STAMPS ====
+# Dirty tracking for incremental recomputation: a run needs an analysis when
+# it has no stamp for it, or was ingested (or the input, e.g. the tree,
+# changed) after the stamp was written.
+def get_dirty_run_ids(
+        session: Session,
+        project_id: int,
+        analysis: str,
+        *,
+        since=None,     # datetime; stamps older than this are stale too
+) -> list[int]:
+    """Run ids in a project whose stamp for analysis is missing or stale, ascending."""
+    stale = [AnalysisStamp.run_id.is_(None),
+             and_(Run.ingested_at.is_not(None), AnalysisStamp.computed_at < Run.ingested_at)]
+    if since is not None:
+        stale.append(AnalysisStamp.computed_at < since)
+    stmt = (
+        select(Run.run_id)
+        .outerjoin(AnalysisStamp, and_(AnalysisStamp.run_id == Run.run_id,
+                                       AnalysisStamp.analysis == analysis))
+        .where(Run.project_id == project_id, or_(*stale))
+        .order_by(Run.run_id)
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+def mark_runs_analysed(session: Session, run_ids: list[int], analysis: str) -> int:
+    """Upsert the stamp of analysis for every run in run_ids to now."""
+    if not run_ids:
+        return 0
+    now = utcnow()
+    stmt = sqlite_insert(AnalysisStamp.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnalysisStamp.run_id, AnalysisStamp.analysis],
+        set_={"computed_at": stmt.excluded.computed_at},
+    )
+    session.execute(stmt, [{"run_id": r, "analysis": analysis, "computed_at": now} for r in run_ids])
+    return len(run_ids)
+
+
 # ==== BETA DIVERSITY ====
 def create_beta_diversity(
         session: Session,
@@ -343,6 +699,27 @@ def create_beta_diversity(
     return beta
 
 
+def upsert_beta_diversity_bulk(
+        session: Session,
+        *,
+        rows: list[dict],   # [{"run_id_1": lo, "run_id_2": hi, "metric": ..., "value": ...}]
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Core executemany upsert of pairwise beta diversity rows keyed on
+    (run_id_1, run_id_2, metric). Callers store each pair once with
+    run_id_1 < run_id_2, matching create_beta_diversity's callers.
+    """
+    stmt = sqlite_insert(BetaDiversity.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[BetaDiversity.run_id_1, BetaDiversity.run_id_2, BetaDiversity.metric],
+        set_={"value": stmt.excluded.value},
+    )
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
+
 def get_beta_diversity(
         session: Session,
         run_id_1: int,
@@ -359,6 +736,39 @@ def get_beta_diversity(
     return list(session.execute(stmt).scalars().all())
 
 
+def get_beta_diversity_for_project(
+        session: Session,
+        project_id: int,
+        metric: str,
+) -> list[tuple[int, int, float]]:
+    """
+    Return (run_id_1, run_id_2, value) for every stored pair in a project
+    and metric from one SELECT joining beta_div to run on both sides.
+    """
+    run_1, run_2 = aliased(Run), aliased(Run)
+    stmt = (
+        select(BetaDiversity.run_id_1, BetaDiversity.run_id_2, BetaDiversity.value)
+        .join(run_1, BetaDiversity.run_id_1 == run_1.run_id)
+        .join(run_2, BetaDiversity.run_id_2 == run_2.run_id)
+        .where(
+            BetaDiversity.metric == metric,
+            run_1.project_id == project_id,
+            run_2.project_id == project_id,
+        )
+    )
+    return [tuple(row) for row in session.execute(stmt).all()]
+
+
+def count_beta_pairs_among(session: Session, run_ids: list[int], metric: str) -> int:
+    """Number of stored pairs for metric with both runs in run_ids."""
+    stmt = select(func.count()).select_from(BetaDiversity).where(
+        BetaDiversity.metric == metric,
+        BetaDiversity.run_id_1.in_(run_ids),
+        BetaDiversity.run_id_2.in_(run_ids),
+    )
+    return session.execute(stmt).scalar_one()
+
+
 def get_run_exists_beta_table(session: Session, run_id_1: int, run_id_2: int, metric: str) -> bool:
     stmt = select(exists().where(
         or_(
@@ -389,6 +799,7 @@ def create_pcoa(
     if existing:
         existing.pc1 = pc1
         existing.pc2 = pc2
+        existing.coords = None      # any stored higher axes no longer match
         session.flush()
         return existing
     row = PCoA(run_id=run.run_id, metric=metric, pc1=pc1, pc2=pc2)
@@ -397,6 +808,23 @@ def create_pcoa(
     return row
  
  
+def upsert_pcoa_bulk(
+        session: Session,
+        *,
+        rows: list[dict],   # [{"run_id": ..., "metric": ..., "pc1": ..., "pc2": ..., "coords": [...] | None}]
+        batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """Core executemany upsert of PCoA coordinates on the (run_id, metric) unique key."""
+    stmt = sqlite_insert(PCoA.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PCoA.run_id, PCoA.metric],
+        set_={"pc1": stmt.excluded.pc1, "pc2": stmt.excluded.pc2, "coords": stmt.excluded.coords},
+    )
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
+
+
 def get_pcoa_for_project(
         session: Session,
         project_id: int,
@@ -415,6 +843,29 @@ def get_pcoa_for_project(
     return list(session.execute(stmt).scalars().all())
 
 
+def replace_pcoa_axes(
+        session: Session,
+        project_id: int,
+        metric: str,
+        rows: list[dict],   # [{"axis": 1, "eigenvalue": ..., "proportion_explained": ...}]
+) -> int:
+    """Replace a project's per-axis eigenvalues for metric (k may change between runs)."""
+    session.execute(delete(PCoAAxis).where(PCoAAxis.project_id == project_id, PCoAAxis.metric == metric))
+    if rows:
+        session.execute(insert(PCoAAxis), [{"project_id": project_id, "metric": metric, **r} for r in rows])
+    return len(rows)
+
+
+def get_pcoa_axes_for_project(session: Session, project_id: int, metric: str) -> list[PCoAAxis]:
+    """Per-axis eigenvalues for a project and metric, ordered by axis."""
+    stmt = (
+        select(PCoAAxis)
+        .where(PCoAAxis.project_id == project_id, PCoAAxis.metric == metric)
+        .order_by(PCoAAxis.axis)
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
 # ==== SIMULATION ====
 
 def create_simulation(session: Session, *, run: Run) -> Simulation:
@@ -427,3 +878,158 @@ def create_simulation(session: Session, *, run: Run) -> Simulation:
 def get_simulations_for_run(session: Session, run_id: int) -> list[Simulation]:
     stmt = select(Simulation).where(Simulation.run_id == run_id)
     return list(session.execute(stmt).scalars().all())
+
+
+# ==== COLUMNAR EXPORT / IMPORT ====
+def _export_select(project_id: int, table: str):
+    runs = _project_run_ids(project_id)
+    if table == "runs":
+        return (select(Run.run_id, Run.srr_accession, Run.bio_proj_accession, Run.library_layout,
+                       Run.source, Run.risk_score, Run.risk_label, Run.confidence, Run.ingested_at)
+                .where(Run.project_id == project_id).order_by(Run.run_id))
+    if table == "genus":
+        return (select(Genus.run_id, Genus.genus, Genus.relative_abundance)
+                .where(Genus.run_id.in_(runs), Genus.simulation_id.is_(None)))
+    if table == "features":
+        return (select(Feature.feature_id, Feature.sequence, Feature.taxonomy)
+                .where(Feature.project_id == project_id))
+    if table == "feature_counts":
+        return (select(FeatureCount.run_id, FeatureCount.feature_id, FeatureCount.abundance)
+                .where(FeatureCount.project_id == project_id))
+    if table == "alpha":
+        return (select(AlphaDiversity.run_id, AlphaDiversity.metric, AlphaDiversity.value)
+                .where(AlphaDiversity.run_id.in_(runs)))
+    if table == "beta":
+        return (select(BetaDiversity.run_id_1, BetaDiversity.run_id_2, BetaDiversity.metric,
+                       BetaDiversity.value)
+                # the pairs delete_beta_for_project would remove, narrowed to
+                # those wholly inside the project so both ids can be remapped
+                .where(and_(BetaDiversity.run_id_1.in_(runs), BetaDiversity.run_id_2.in_(runs))))
+    if table == "pcoa":
+        return (select(PCoA.run_id, PCoA.metric, PCoA.pc1, PCoA.pc2, PCoA.coords)
+                .where(PCoA.run_id.in_(runs)))
+    if table == "pcoa_axes":
+        return (select(PCoAAxis.metric, PCoAAxis.axis, PCoAAxis.eigenvalue, PCoAAxis.proportion_explained)
+                .where(PCoAAxis.project_id == project_id))
+    if table == "analysis_stamps":
+        return (select(AnalysisStamp.run_id, AnalysisStamp.analysis, AnalysisStamp.computed_at)
+                .where(AnalysisStamp.run_id.in_(runs)))
+    if table == "tree":
+        return (select(Tree.newick_path.label("newick"), Tree.created_at)
+                .where(Tree.project_id == project_id).order_by(desc(Tree.created_at)).limit(1))
+    raise RepositoryError(f"Unknown export table: {table}")
+
+
+EXPORT_TABLES = ("runs", "genus", "features", "feature_counts", "alpha", "beta",
+                 "pcoa", "pcoa_axes", "analysis_stamps", "tree")
+
+
+def get_project_table_columns(session: Session, project_id: int, table: str) -> dict[str, list]:
+    """One SELECT of an export table, returned column-wise: {column: [values...]}."""
+    result = session.execute(_export_select(project_id, table))
+    names = list(result.keys())
+    rows = result.all()
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def bulk_insert_rows(session: Session, model, rows: list[dict], batch_size: int = BULK_BATCH_SIZE) -> int:
+    """Core executemany insert of plain dicts into model's table (used by project import)."""
+    return _executemany(session, model.__table__, rows, batch_size)
+
+
+def get_run_ids_by_srr(session: Session, project_id: int) -> dict[str, int]:
+    stmt = select(Run.srr_accession, Run.run_id).where(Run.project_id == project_id)
+    return dict(session.execute(stmt).all())
+
+
+def get_existing_srr(session: Session, srr_accessions: list[str]) -> list[str]:
+    """The subset of srr_accessions that already belong to some run."""
+    if not srr_accessions:
+        return []
+    stmt = select(Run.srr_accession).where(Run.srr_accession.in_(srr_accessions))
+    return list(session.execute(stmt).scalars().all())
+
+
+# ==== SET-BASED PROJECT DELETES ====
+# One DELETE ... WHERE run_id IN (SELECT run_id FROM run WHERE project_id = ?)
+# per table, so clearing a project costs a fixed number of round-trips and
+# never materialises ORM objects.
+def _project_run_ids(project_id: int):
+    return select(Run.run_id).where(Run.project_id == project_id)
+
+
+def delete_genus_for_project(session: Session, project_id: int, *, observed_only: bool = True) -> int:
+    """Delete Genus rows for every run in a project (simulated rows kept unless observed_only=False)."""
+    stmt = delete(Genus).where(Genus.run_id.in_(_project_run_ids(project_id)))
+    if observed_only:
+        stmt = stmt.where(Genus.simulation_id.is_(None))
+    return session.execute(stmt).rowcount
+
+
+def delete_feature_counts_for_project(session: Session, project_id: int) -> int:
+    """Delete every FeatureCount row in a project, then its now-unreferenced feature dictionary."""
+    deleted = session.execute(
+        delete(FeatureCount).where(FeatureCount.run_id.in_(_project_run_ids(project_id)))
+    ).rowcount
+    delete_orphan_features(session, project_id)
+    return deleted
+
+
+def delete_alpha_for_project(session: Session, project_id: int, metrics: list[str] | None = None) -> int:
+    """Delete AlphaDiversity rows for every run in a project, optionally only some metrics."""
+    stmt = delete(AlphaDiversity).where(AlphaDiversity.run_id.in_(_project_run_ids(project_id)))
+    if metrics is not None:
+        stmt = stmt.where(AlphaDiversity.metric.in_(metrics))
+    return session.execute(stmt).rowcount
+
+
+def delete_rarefaction_for_project(session: Session, project_id: int) -> int:
+    """Delete Rarefaction rows for every run in a project."""
+    stmt = delete(Rarefaction).where(Rarefaction.run_id.in_(_project_run_ids(project_id)))
+    return session.execute(stmt).rowcount
+
+
+def delete_beta_for_project(session: Session, project_id: int, metric: str | None = None) -> int:
+    """Delete BetaDiversity rows touching any run in a project, optionally for one metric."""
+    run_ids = _project_run_ids(project_id)
+    stmt = delete(BetaDiversity).where(
+        or_(BetaDiversity.run_id_1.in_(run_ids), BetaDiversity.run_id_2.in_(run_ids))
+    )
+    if metric is not None:
+        stmt = stmt.where(BetaDiversity.metric == metric)
+    return session.execute(stmt).rowcount
+
+
+def delete_pcoa_for_project(session: Session, project_id: int, metric: str | None = None) -> int:
+    """Delete PCoA rows (and axis eigenvalues) for every run in a project, optionally for one metric."""
+    stmt = delete(PCoA).where(PCoA.run_id.in_(_project_run_ids(project_id)))
+    axes = delete(PCoAAxis).where(PCoAAxis.project_id == project_id)
+    if metric is not None:
+        stmt = stmt.where(PCoA.metric == metric)
+        axes = axes.where(PCoAAxis.metric == metric)
+    session.execute(axes)
+    return session.execute(stmt).rowcount
+
+
+def delete_project_tree(session: Session, project_id: int) -> int:
+    return session.execute(delete(Tree).where(Tree.project_id == project_id)).rowcount
+
+
+def delete_project_cascade(session: Session, project_id: int) -> None:
+    """
+    Remove a project and everything under it with one DELETE per table,
+    children before parents so foreign-key enforcement stays on throughout.
+    """
+    run_ids = _project_run_ids(project_id)
+    delete_beta_for_project(session, project_id)
+    delete_pcoa_for_project(session, project_id)
+    delete_alpha_for_project(session, project_id)
+    delete_rarefaction_for_project(session, project_id)
+    session.execute(delete(AnalysisStamp).where(AnalysisStamp.run_id.in_(run_ids)))
+    session.execute(delete(FeatureCount).where(FeatureCount.run_id.in_(run_ids)))
+    session.execute(delete(Feature).where(Feature.project_id == project_id))
+    delete_genus_for_project(session, project_id, observed_only=False)
+    session.execute(delete(Simulation).where(Simulation.run_id.in_(run_ids)))
+    delete_project_tree(session, project_id)
+    session.execute(delete(Run).where(Run.project_id == project_id))
+    session.execute(delete(Project).where(Project.project_id == project_id))
@@ -67,8 +67,10 @@ class  AppState:
 
     # Alpha diversity: run_label → {"shannon": (min,q1,med,q3,max), "simpson": ...}
     alpha_diversity:   dict[str, dict]                    = field(default_factory=dict)
-    # Beta diversity matrices
-    count_matrix: Optional[npt.NDArray[np.int_]] | None = None
+    # Project count matrices shared by the diversity workers and the ASV table:
+    # (project_id, ingest_version, sparse) → CountMatrix (see services/count_matrix.py).
+    # The workers keep the int32 CSR form; no dense runs x features copy lives here.
+    count_matrices: dict = field(default_factory=dict)
     # beta_bray_curtis:  list[list[float]]                  = field(default_factory=list)
     # beta_unifrac:      list[list[float]]                  = field(default_factory=list)
     # # PCoA coordinates: run_label → (pc1, pc2)
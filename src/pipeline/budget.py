@@ -0,0 +1,211 @@
+# Shared CPU / memory budget for pipeline subprocesses.
+# Every QiimeRunner subprocess takes a slice of one machine-wide pool before
+# it starts: a thread count between its minimum and what it asked for, plus
+# an optional memory reservation. When the pool cannot cover a job's minimum
+# the job queues until enough is released, so concurrent DAG branches never
+# oversubscribe the machine. The granted thread count is substituted for
+# THREADS in the command line.
+#
+# Multi-threaded jobs share the pool rather than drain it: each is granted
+# at most an even share among the jobs running or waiting, and never the
+# last free core, which is kept for single-threaded steps (imports,
+# classify-sklearn) of the other branches. Queued requests start in arrival
+# order, except that one that fits may start ahead of one that does not.
+from __future__ import annotations
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+RESERVED_CORES = 4          # left free for the UI and the OS, as before
+MEMORY_FRACTION = 0.8       # of physical memory handed out to subprocesses
+THREADS = "{threads}"       # placeholder argument replaced by the granted thread count
+DEFAULT_SHARE = 2           # a THREADS job asks for 1/DEFAULT_SHARE of the pool unless told otherwise,
+                            # so the other layout's multi-threaded step can run alongside it
+
+
+class BudgetCancelled(Exception):
+    """Raised in a thread whose queued request was cancelled before it started."""
+
+
+@dataclass
+class Allocation:
+    id: int
+    job: str
+    threads: int
+    memory_mb: int
+    started: float = field(default_factory=time.monotonic)
+
+
+@dataclass(eq=False)
+class _Request:
+    id: int
+    job: str
+    min_threads: int
+    max_threads: int
+    memory_mb: int
+    cancelled: bool = False
+
+
+@dataclass
+class BudgetSnapshot:
+    cores: int
+    free_cores: int
+    memory_mb: int | None           # None: memory is not budgeted
+    free_memory_mb: int | None
+    running: list[Allocation]
+    queued: list[str]               # job labels, in the order they will start
+
+
+def _physical_memory_mb() -> int | None:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1 << 20)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_cores() -> int:
+    return max((os.cpu_count() or 1) - RESERVED_CORES, 1)
+
+
+class ResourceBudget:
+    """
+    A pool of cores (and optionally memory, in MB) shared by every
+    subprocess. acquire() blocks until the request at the head of the queue
+    fits; listeners are called with a BudgetSnapshot after every change, from
+    whichever thread made it.
+    """
+
+    def __init__(self, cores: int | None = None, memory_mb: int | None = None) -> None:
+        self.cores = max(cores or default_cores(), 1)
+        self.memory_mb = memory_mb
+        self._free_cores = self.cores
+        self._free_memory = memory_mb
+        self._running: dict[int, Allocation] = {}
+        self._queue: deque[_Request] = deque()
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._listeners: list[Callable[[BudgetSnapshot], None]] = []
+
+    # ── requests ──────────────────────────────────────────────────────────────
+
+    def request(self, job: str, threads: int = 1, min_threads: int = 1, memory_mb: int = 0) -> _Request:
+        """Queue a request; pass it to acquire() (or cancel()) afterwards."""
+        max_threads = min(max(threads, 1), self.cores)
+        min_threads = min(max(min_threads, 1), max_threads)
+        if self.memory_mb is not None:
+            memory_mb = min(memory_mb, self.memory_mb)     # a job larger than the machine runs alone
+        with self._cond:
+            req = _Request(next(self._ids), job, min_threads, max_threads, memory_mb)
+            self._queue.append(req)
+        self._notify()
+        return req
+
+    def acquire(self, req: _Request) -> Allocation:
+        """Block until req can start; return its allocation."""
+        with self._cond:
+            while not req.cancelled and self._next() is not req:
+                self._cond.wait()
+            self._queue.remove(req)
+            if req.cancelled:
+                self._cond.notify_all()
+                raise BudgetCancelled(f"{req.job} was cancelled before it started")
+            alloc = Allocation(req.id, req.job, self._grant(req), req.memory_mb)
+            self._free_cores -= alloc.threads
+            if self._free_memory is not None:
+                self._free_memory -= alloc.memory_mb
+            self._running[alloc.id] = alloc
+            self._cond.notify_all()         # the next request in line may fit as well
+        self._notify()
+        return alloc
+
+    def release(self, alloc: Allocation) -> None:
+        with self._cond:
+            if self._running.pop(alloc.id, None) is None:
+                return
+            self._free_cores += alloc.threads
+            if self._free_memory is not None:
+                self._free_memory += alloc.memory_mb
+            self._cond.notify_all()
+        self._notify()
+
+    def cancel(self, req: _Request) -> None:
+        """Make a queued request's acquire() raise BudgetCancelled (no-op once it has started)."""
+        with self._cond:
+            req.cancelled = True
+            self._cond.notify_all()
+
+    def _headroom(self, req: _Request) -> int:
+        """Cores a multi-threaded request leaves free for single-threaded ones (when it can)."""
+        return 1 if 1 < req.max_threads and req.min_threads < self.cores else 0
+
+    def _fits(self, req: _Request) -> bool:
+        if self._free_cores - self._headroom(req) < req.min_threads:
+            return False
+        return self._free_memory is None or self._free_memory >= req.memory_mb
+
+    def _next(self) -> _Request | None:
+        """The first live queued request that fits now."""
+        return next((r for r in self._queue if not r.cancelled and self._fits(r)), None)
+
+    def _grant(self, req: _Request) -> int:
+        """Threads for req (already off the queue): its even share of the pool, within what is free."""
+        waiting = sum(1 for r in self._queue if not r.cancelled)
+        share = self.cores // (len(self._running) + waiting + 1)
+        return max(min(req.max_threads, share, self._free_cores - self._headroom(req)), req.min_threads)
+
+    # ── reporting ─────────────────────────────────────────────────────────────
+
+    def snapshot(self) -> BudgetSnapshot:
+        with self._cond:
+            return BudgetSnapshot(
+                cores=self.cores,
+                free_cores=self._free_cores,
+                memory_mb=self.memory_mb,
+                free_memory_mb=self._free_memory,
+                running=list(self._running.values()),
+                queued=[r.job for r in self._queue if not r.cancelled],
+            )
+
+    def add_listener(self, listener: Callable[[BudgetSnapshot], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[BudgetSnapshot], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self) -> None:
+        if not self._listeners:
+            return
+        snapshot = self.snapshot()
+        for listener in list(self._listeners):
+            listener(snapshot)
+
+
+def describe(snapshot: BudgetSnapshot) -> str:
+    """One status line for the UI, e.g. "3/4 cores · qiime deblur denoise-16S (2), ... · 1 queued"; '' when idle."""
+    if not snapshot.running and not snapshot.queued:
+        return ""
+    parts = [f"{snapshot.cores - snapshot.free_cores}/{snapshot.cores} cores"]
+    if snapshot.running:
+        parts.append(", ".join(f"{a.job} ({a.threads})" for a in snapshot.running))
+    if snapshot.queued:
+        parts.append(f"{len(snapshot.queued)} queued")
+    return " · ".join(parts)
+
+
+_shared: ResourceBudget | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_budget() -> ResourceBudget:
+    """The process-wide budget every QiimeRunner uses unless given its own."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            memory = _physical_memory_mb()
+            _shared = ResourceBudget(memory_mb=int(memory * MEMORY_FRACTION) if memory else None)
+        return _shared
@@ -0,0 +1,215 @@
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+# A small DAG executor for the preprocessing pipeline.
+# Each Step declares the files it reads (inputs), the files it writes
+# (outputs) and the parameters it depends on. A step whose inputs are
+# another step's outputs runs after it; steps with no path between them run
+# concurrently on a thread pool (the work itself is in QIIME subprocesses).
+#
+# A step is skipped when its key -- a SHA-256 over its name, params and the
+# content of every input -- matches the stamp its last successful run left in
+# stamp_dir, and its outputs are still on disk unchanged. Changing a
+# parameter or an upstream file therefore reruns only the steps downstream
+# of it. File digests are memoised on (size, mtime) so unchanged multi-GB
+# inputs are not re-read on every run.
+
+MAX_WORKERS = 4
+DAG_VERSION = "1"
+
+# step states
+CACHED, DONE, SKIPPED, FAILED = "cached", "done", "skipped", "failed"
+
+
+class PipelineError(Exception):
+    pass
+
+
+class SkipBranch(Exception):
+    """Raised by a step to stop its branch without failing the run (e.g. no reads survived)."""
+
+
+@dataclass
+class Step:
+    name: str
+    run: Callable[[], None]
+    inputs: list[Path] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    after: list[str] = field(default_factory=list)      # order-only dependencies
+
+
+class _Digests:
+    """SHA-256 of files, memoised on (size, mtime_ns) and persisted between runs."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        try:
+            self._memo = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self._memo = {}
+
+    def __call__(self, file: Path) -> str | None:
+        try:
+            st = file.stat()
+        except OSError:
+            return None
+        key = str(file.resolve())
+        with self._lock:
+            hit = self._memo.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(file, "rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._memo[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def save(self) -> None:
+        with self._lock:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._path.write_text(json.dumps(self._memo))
+
+
+class DagExecutor:
+    """
+    Run steps in dependency order, max_workers at a time.
+    run() returns {step name: "cached" | "done" | "skipped" | "failed"}; once
+    every branch that can still run has finished, the first step error (if
+    any) is re-raised. Steps downstream of a failed or skipped step are skipped.
+    """
+
+    def __init__(self, steps: list[Step], stamp_dir: str | Path,
+                 max_workers: int = MAX_WORKERS, log: Callable[[str], None] = print) -> None:
+        self.steps = {s.name: s for s in steps}
+        if len(self.steps) != len(steps):
+            raise PipelineError("Duplicate step names")
+        self.stamp_dir = Path(stamp_dir)
+        self.max_workers = max_workers
+        self.log = log
+        self.deps = self._dependencies()
+        self._order()     # fails early on a cycle
+
+    def _dependencies(self) -> dict[str, set[str]]:
+        producer = {}
+        for step in self.steps.values():
+            for out in step.outputs:
+                if str(out) in producer:
+                    raise PipelineError(f"{out} is an output of both {producer[str(out)]} and {step.name}")
+                producer[str(out)] = step.name
+        deps = {}
+        for step in self.steps.values():
+            unknown = [a for a in step.after if a not in self.steps]
+            if unknown:
+                raise PipelineError(f"{step.name}: unknown dependency {unknown[0]}")
+            deps[step.name] = {producer[str(i)] for i in step.inputs if str(i) in producer} | set(step.after)
+            deps[step.name].discard(step.name)
+        return deps
+
+    def _order(self) -> list[str]:
+        order, seen, active = [], set(), set()
+
+        def visit(name: str) -> None:
+            if name in seen:
+                return
+            if name in active:
+                raise PipelineError(f"Dependency cycle through {name}")
+            active.add(name)
+            for dep in sorted(self.deps[name]):
+                visit(dep)
+            active.discard(name)
+            seen.add(name)
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
+
+    # ── caching ───────────────────────────────────────────────────────────────
+
+    def _stamp_path(self, name: str) -> Path:
+        return self.stamp_dir / f"{name.replace('/', '__')}.json"
+
+    def key(self, step: Step, digests: _Digests) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps([DAG_VERSION, step.name, step.params], sort_keys=True, default=str).encode())
+        for path in step.inputs:
+            h.update(f"\0{path}\0{digests(Path(path))}".encode())
+        return h.hexdigest()
+
+    def _is_cached(self, step: Step, key: str, digests: _Digests) -> bool:
+        try:
+            stamp = json.loads(self._stamp_path(step.name).read_text())
+        except (OSError, ValueError):
+            return False
+        if stamp.get("key") != key:
+            return False
+        return all(digests(Path(p)) == d for p, d in stamp.get("outputs", {}).items())
+
+    def _write_stamp(self, step: Step, key: str, digests: _Digests) -> None:
+        outputs = {str(p): digests(Path(p)) for p in step.outputs}
+        if None in outputs.values():
+            return      # an output is missing: let the next run try again
+        self.stamp_dir.mkdir(parents=True, exist_ok=True)
+        self._stamp_path(step.name).write_text(json.dumps({"key": key, "outputs": outputs}, indent=2))
+
+    def _execute(self, step: Step, digests: _Digests) -> str:
+        key = self.key(step, digests)
+        if self._is_cached(step, key, digests):
+            self.log(f"[{step.name}] Up to date — skipping.")
+            return CACHED
+        self._stamp_path(step.name).unlink(missing_ok=True)
+        for out in step.outputs:
+            Path(out).unlink(missing_ok=True)       # never let a stale output pass for a new one
+        step.run()
+        self._write_stamp(step, key, digests)
+        return DONE
+
+    # ── scheduling ────────────────────────────────────────────────────────────
+
+    def run(self) -> dict[str, str]:
+        digests = _Digests(self.stamp_dir / "digests.json")
+        state: dict[str, str] = {}
+        errors: list[BaseException] = []
+        pending = list(self._order())
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    dep_states = [state.get(d) for d in self.deps[name]]
+                    if any(s in (SKIPPED, FAILED) for s in dep_states):
+                        state[name] = SKIPPED
+                        pending.remove(name)
+                    elif all(s in (CACHED, DONE) for s in dep_states):
+                        running[pool.submit(self._execute, self.steps[name], digests)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        state[name] = future.result()
+                    except SkipBranch as e:
+                        self.log(f"[{name}] {e}")
+                        state[name] = SKIPPED
+                    except Exception as e:
+                        self.log(f"[{name}] failed: {e}")
+                        state[name] = FAILED
+                        errors.append(e)
+
+        digests.save()
+        if errors:
+            raise errors[0]
+        return state
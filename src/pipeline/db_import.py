@@ -5,6 +5,7 @@ This module provides methods to interact with the "assessment_service.py" module
 # import the data tables generated by qiime2_preproc.py into the database
 # import the representative sequences file path generated by qiime2_preproc.py into the database
 import os
+import numpy as np
 import pandas as pd
 import re
 from src.services.assessment_service import get_run_feature_ids, get_is_run_in_genus
@@ -37,24 +38,48 @@ def clean_genus(tax_string):
 
     return genus
 
+def read_biom_tsv(path: str, dtype=np.float64) -> tuple[np.ndarray, list[str], np.ndarray]:
+    """
+    Read a `biom convert --to-tsv` table in a single pass.
+
+    Returns (row_ids, sample_ids, matrix) where matrix is samples x rows so each
+    sample's values are one contiguous slice. Every sample column is declared
+    float64 up front so pandas never has to infer dtypes column by column.
+    """
+    # line 1 is "# Constructed from biom file", line 2 is the header
+    with open(path, mode="r") as f:
+        f.readline()
+        header = f.readline().rstrip("\n").split("\t")
+    id_col, samples = header[0], header[1:]
+
+    table = pd.read_csv(
+        path, sep="\t", skiprows=1, engine="c",
+        dtype={id_col: str, **{s: np.float64 for s in samples}},
+    )
+    row_ids = table[id_col].to_numpy(dtype=object)
+    matrix = np.ascontiguousarray(table[samples].to_numpy(dtype=np.float64).T)
+    if dtype is not np.float64:
+        matrix = matrix.astype(dtype)
+
+    return row_ids, samples, matrix
+
+
 def parse_genus_table(genus: str): # dictionary of lists of tuples(str, float)
     # if the genus table is unavailable, return an empty dictionary so ingestion can continue
     try:
-        abundance = pd.read_csv(genus, sep="\t", skiprows=1)
+        tax_strings, samples, abundance = read_biom_tsv(genus)
     except FileNotFoundError:
         return {}
 
-    abundance.rename(columns={'#OTU ID': 'genus'}, inplace=True)
+    # extract genus from each distinct taxonomy string once, then broadcast back to the rows
+    codes, uniques = pd.factorize(tax_strings)
+    genera = np.array([clean_genus(t) for t in uniques], dtype=object)[codes].tolist()
 
-    # extract genus from taxonomy string and rename
-    abundance['genus'] = abundance['genus'].apply(clean_genus)
-    
     # construct a dictionary of column name (srr): list of tuples (genus, abundance)
-    records = {}
-    for col in abundance.columns[1:]:
-        records[col] = [(row['genus'], row[col]) for _, row in abundance.iterrows()]
-
-    return records
+    return {
+        sample: list(zip(genera, abundance[i].tolist()))
+        for i, sample in enumerate(samples)
+    }
 
 
 # parse reps-seq.fasta and taxonomy.tsv for feature table
@@ -66,31 +91,55 @@ features=[{'sequence': 'TGGGCGAGAGCCTGAACCAGCCAAGTAGCGTG',
            'feature_id': '21f4de567ca86c973a9a0d07ed17e3d2', 
            'taxonomy': 'd__Bacteria;p__Bacteroidota;c__Bacteroidia;o__Bacteroidales;f__Prevotellaceae;g__Prevotella_9;s__'}]
 '''
-def parse_feat_tax_seqs(tax: str, seqs: str) -> list[dict]:
-    taxonomy = None
-    if os.path.exists(tax):
-        taxonomy = pd.read_csv(tax, sep='\t')
-
-    feature_seqs = []
+def iter_fasta(seqs: str):
+    """
+    Stream (feature_id, sequence) records from a FASTA file.
+
+    Handles wrapped (multi-line) sequences and reads line by line, so only the
+    record currently being assembled is held in memory.
+    """
+    header = None
+    chunks: list[str] = []
     with open(seqs, mode="r") as s:
-        lines = s.readlines()
-        lines_feature_id = lines[::2] # feature id lines at even indices
-        lines_sequence = lines[1::2] # sequence lines at odd indices
-        for feature_id, sequence in zip(lines_feature_id, lines_sequence):
-            feature_id_str = feature_id[1:].strip()
-            taxonomy_value = None
-            if taxonomy is not None:
-                condition = taxonomy['Feature ID'] == feature_id_str
-                taxon = taxonomy.loc[condition, 'Taxon']
-                taxonomy_value = taxon.iloc[0] if not taxon.empty else None
-
-            feature_seqs.append({
-                'sequence': sequence.strip(),
-                'feature_id': feature_id_str,
-                'taxonomy': taxonomy_value
-            })
-
-    return feature_seqs
+        for line in s:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(chunks)
+                fields = line[1:].split(maxsplit=1)
+                header = fields[0] if fields else ""
+                chunks = []
+            else:
+                chunks.append(line)
+    if header is not None:
+        yield header, "".join(chunks)
+
+
+def read_taxonomy(tax: str) -> dict[str, str]:
+    """Return {feature_id: taxon} from taxonomy.tsv, or {} if it was not exported."""
+    if not os.path.exists(tax):
+        return {}
+    taxonomy = pd.read_csv(tax, sep='\t', usecols=['Feature ID', 'Taxon'],
+                           dtype=str, na_filter=False)
+    # keep the first assignment if a feature is listed twice
+    taxonomy = taxonomy.drop_duplicates(subset='Feature ID', keep='first')
+    return dict(zip(taxonomy['Feature ID'], taxonomy['Taxon']))
+
+
+def parse_feat_tax_seqs(tax: str, seqs: str) -> list[dict]:
+    # hash index on Feature ID so each FASTA record is an O(1) lookup
+    taxonomy = read_taxonomy(tax)
+
+    return [
+        {
+            'sequence': sequence,
+            'feature_id': feature_id,
+            'taxonomy': taxonomy.get(feature_id) or None,
+        }
+        for feature_id, sequence in iter_fasta(seqs)
+    ]
 
 
 # parse feature-table.tsv
@@ -101,16 +150,12 @@ example:
 run_id='SRR35606904', rows=[('21f4de567ca86c973a9a0d07ed17e3d2', 4655), ('9cc977b5dee75ca96f18928722049c50', 3818), ...]
 '''
 def parse_feature_counts(feat: str):
-    # get the dataframe
-    feature_table = pd.read_csv(feat, sep='\t', skiprows=1)
-    feature_table.rename(columns={'#OTU ID': 'feature_id'}, inplace=True)
-
-    # get a dictionary of column_name (srr): list of tuples (feature_id, raw abundance counts)
-    features = {}
-    for col in feature_table.columns[1:]:
-        features[col] = { 
-            row['feature_id'] : int(row[col])
-            for _, row in feature_table.iterrows() 
-        }
-
-    return features
\ No newline at end of file
+    # counts are written as floats by biom ("4655.0"), truncate to int like int() would
+    feature_ids, samples, counts = read_biom_tsv(feat, dtype=np.int64)
+    feature_ids = feature_ids.tolist()
+
+    # get a dictionary of column_name (srr): dict of feature_id -> raw abundance counts
+    return {
+        sample: dict(zip(feature_ids, counts[i].tolist()))
+        for i, sample in enumerate(samples)
+    }
@@ -0,0 +1,192 @@
+# Parallel, resumable FASTQ downloads.
+# Each .fastq.gz is fetched over HTTP(S) or FTP into <dest>.part and kept
+# compressed (QIIME imports it as is). An interrupted transfer resumes from
+# the .part with an HTTP Range / FTP REST request, and the finished file is
+# checked against ENA's fastq_md5 before it is moved into place.
+from __future__ import annotations
+import ftplib
+import hashlib
+import io
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+CHUNK = 1 << 20         # bytes per read from the network
+MAX_WORKERS = 4         # files downloading at once
+RETRIES = 3             # attempts per file, each resuming where the last stopped
+TIMEOUT = 60            # seconds without data before a connection is dropped
+
+# progress(run, bytes_done, bytes_total or None), called from pool threads
+Progress = Callable[[str, int, "int | None"], None]
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class FileJob:
+    run: str                    # SRR accession the file belongs to
+    url: str                    # http(s):// or ftp:// URL of the .fastq.gz
+    dest: Path                  # where the .fastq.gz ends up
+    md5: str | None = None      # of the compressed file, as reported by ENA
+    size: int | None = None     # compressed bytes, if known up front
+
+
+@contextmanager
+def _http_source(url: str, offset: int, timeout: float) -> Iterator[tuple]:
+    req = urllib.request.Request(url)
+    if offset:
+        req.add_header("Range", f"bytes={offset}-")
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 416:
+            raise
+        # the range starts at the end of the file: everything is already in .part
+        yield io.BytesIO(), offset, offset
+        return
+    with resp:
+        start = offset if resp.status == 206 else 0      # 200: the server ignored the range
+        length = resp.headers.get("Content-Length")
+        total = start + int(length) if length is not None else None
+        yield resp, start, total
+
+
+@contextmanager
+def _ftp_source(url: str, offset: int, timeout: float) -> Iterator[tuple]:
+    parts = urllib.parse.urlsplit(url)
+    ftp = ftplib.FTP(timeout=timeout)
+    try:
+        ftp.connect(parts.hostname, parts.port or 21)
+        ftp.login(parts.username or "anonymous", parts.password or "")
+        ftp.voidcmd("TYPE I")
+        path = urllib.parse.unquote(parts.path)
+        try:
+            total = ftp.size(path)
+        except ftplib.error_perm:
+            total = None
+        conn = ftp.transfercmd(f"RETR {path}", rest=offset or None)
+        with conn, conn.makefile("rb") as stream:
+            yield stream, offset, total
+        ftp.voidresp()
+    finally:
+        ftp.close()
+
+
+def _source(url: str, offset: int, timeout: float):
+    scheme = urllib.parse.urlsplit(url).scheme
+    if scheme in ("http", "https"):
+        return _http_source(url, offset, timeout)
+    if scheme == "ftp":
+        return _ftp_source(url, offset, timeout)
+    raise DownloadError(f"Unsupported URL scheme: {url}")
+
+
+def _hash_prefix(part: Path, length: int, md5) -> None:
+    """Feed the first length bytes already in part through md5."""
+    with open(part, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(CHUNK, length))
+            if not chunk:
+                break
+            md5.update(chunk)
+            length -= len(chunk)
+
+
+def _attempt(job: FileJob, progress: Progress | None, timeout: float) -> None:
+    part = job.dest.with_name(job.dest.name + ".part")
+    offset = part.stat().st_size if part.exists() else 0
+    if job.size is not None and offset > job.size:
+        # left over from a larger, since replaced file: nothing in it can be reused
+        part.unlink()
+        offset = 0
+
+    md5 = hashlib.md5()
+    if job.size is not None and offset == job.size:
+        # every byte already arrived last time; only the check was lost
+        _hash_prefix(part, offset, md5)
+        done = offset
+    else:
+        with _source(job.url, offset, timeout) as (stream, start, total), \
+                open(part, "r+b" if part.exists() else "wb") as raw:
+            raw.truncate(start)
+            _hash_prefix(part, start, md5)
+            raw.seek(start)
+            done, total = start, total or job.size
+            while chunk := stream.read(CHUNK):
+                raw.write(chunk)
+                md5.update(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(job.run, done, total)
+
+    if job.size is not None and done != job.size:
+        raise OSError(f"{job.url}: got {done} of {job.size} bytes")
+    if job.md5 and md5.hexdigest() != job.md5.lower():
+        part.unlink(missing_ok=True)          # corrupt rather than short: start over
+        raise DownloadError(f"{job.url}: md5 mismatch")
+    os.replace(part, job.dest)
+
+
+def fetch_file(job: FileJob, progress: Progress | None = None,
+               retries: int = RETRIES, timeout: float = TIMEOUT) -> Path:
+    """
+    Download job.url to job.dest, resuming from an existing .part and
+    retrying network errors up to retries times.
+    Raises DownloadError once the attempts are used up.
+    """
+    job.dest.parent.mkdir(parents=True, exist_ok=True)
+    error: Exception | None = None
+    for _ in range(max(retries, 1)):
+        try:
+            _attempt(job, progress, timeout)
+            return job.dest
+        except (OSError, EOFError, ftplib.Error, DownloadError) as e:
+            error = e
+    raise DownloadError(f"{job.url}: {error}") from error
+
+
+def download_files(jobs: list[FileJob], progress: Progress | None = None,
+                   max_workers: int = MAX_WORKERS, **kwargs) -> dict[str, str | None]:
+    """
+    Fetch jobs on a pool of max_workers threads.
+    progress is called with each run's bytes so far summed over its files.
+    Returns {run: None on success, else the first error message}.
+    """
+    totals: dict[str, int | None] = {}
+    for job in jobs:
+        prev = totals.get(job.run, 0)
+        totals[job.run] = None if prev is None or job.size is None else prev + job.size
+    received = [0] * len(jobs)          # bytes so far, per job
+    lock = threading.Lock()
+
+    def _progress(i: int, nbytes: int) -> None:
+        run = jobs[i].run
+        with lock:
+            received[i] = nbytes
+            run_done = sum(n for j, n in zip(jobs, received) if j.run == run)
+        progress(run, run_done, totals[run])
+
+    results: dict[str, str | None] = {job.run: None for job in jobs}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_file, job,
+                        (lambda _r, n, _t, i=i: _progress(i, n)) if progress else None, **kwargs): job
+            for i, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            run = futures[future].run
+            try:
+                future.result()
+            except DownloadError as e:
+                if results[run] is None:
+                    results[run] = str(e)
+    return results
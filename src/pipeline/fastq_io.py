@@ -0,0 +1,89 @@
+from __future__ import annotations
+import gzip
+import io
+from pathlib import Path
+
+# FASTQ files stay gzipped from download to the QIIME import (the manifest
+# formats read .fastq.gz directly); fasterq-dump output and local uploads may
+# still be plain .fastq, so every reader here accepts either.
+
+FASTQ_SUFFIXES = (".fastq.gz", ".fastq")     # preferred first
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_gzip(path: str | Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def open_fastq(path: str | Path, binary: bool = False, buffering: int = io.DEFAULT_BUFFER_SIZE):
+    """
+    Open a FASTQ file for reading, gunzipping on the fly if it is compressed.
+    Text by default; binary=True gives a byte stream read buffering bytes at a time.
+    """
+    if is_gzip(path):
+        stream = io.BufferedReader(gzip.open(path, "rb"), buffer_size=buffering)
+    else:
+        stream = open(path, "rb", buffering=buffering)
+    return stream if binary else io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def split_fastq_name(name: str) -> tuple[str, str | None] | None:
+    """
+    "SRR1_1.fastq.gz" -> ("SRR1", "1"), "SRR1.fastq" -> ("SRR1", None);
+    None for anything that is not a FASTQ file name (.sra, .part, ...).
+    """
+    for suffix in FASTQ_SUFFIXES:
+        if name.endswith(suffix):
+            stem = name[:-len(suffix)]
+            if stem[-2:] in ("_1", "_2"):
+                return stem[:-2], stem[-1]
+            return stem, None
+    return None
+
+
+def find_fastq(directory: str | Path, stem: str) -> Path | None:
+    """directory/stem.fastq.gz or directory/stem.fastq, whichever exists (gzipped first)."""
+    for suffix in FASTQ_SUFFIXES:
+        path = Path(directory) / f"{stem}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def list_fastqs(directory: str | Path) -> dict[str, dict[str | None, str]]:
+    """
+    {run: {mate: file name}} of the FASTQ files in directory; mate is "1" / "2"
+    for paired files and None for single-end ones. Where a run has both a
+    .fastq.gz and a .fastq copy, the gzipped one is listed.
+    """
+    runs: dict[str, dict[str | None, str]] = {}
+    for name in sorted(p.name for p in Path(directory).iterdir()):
+        parsed = split_fastq_name(name)
+        if parsed is None:
+            continue
+        run, mate = parsed
+        current = runs.setdefault(run, {}).get(mate)
+        if current is None or (name.endswith(".gz") and not current.endswith(".gz")):
+            runs[run][mate] = name
+    return runs
+
+
+# checks that path is a readable FASTQ record (gzipped or not) whose
+# compression matches its name: QIIME's manifest import decides by the .gz suffix
+# returns (valid, error message)
+def validate_fastq_header(path: str | Path) -> tuple[bool, str]:
+
+    try:
+        gzipped = is_gzip(path)
+        if gzipped != str(path).endswith('.gz'):
+            return False, ("File is gzip-compressed but not named .gz" if gzipped
+                           else "File is named .gz but is not gzip-compressed")
+        with open_fastq(path) as f:
+            header, seq, plus = f.readline(), f.readline(), f.readline()
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        return False, f"Cannot read FASTQ: {e}"
+
+    if not header.startswith('@') or not seq.strip() or not plus.startswith('+'):
+        return False, "Not a FASTQ file (expected @header / sequence / + lines)"
+    return True, ""
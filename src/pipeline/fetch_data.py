@@ -1,6 +1,5 @@
 from __future__ import annotations
 import csv
-import gzip
 import json
 import pandas as pd
 from pathlib import Path
@@ -10,6 +9,10 @@ import shutil
 import urllib.error
 import urllib.request
 
+from src.pipeline.budget import THREADS
+from src.pipeline.downloader import MAX_WORKERS, FileJob, download_files
+from src.pipeline.fastq_io import find_fastq, list_fastqs
+
 if TYPE_CHECKING:
     from models.app_state import AppState
 
@@ -218,77 +221,102 @@ def fetch_runs(email, runner, bioproject: str, srr=None, n_runs=1, callback=None
     return single_runs, paired_runs, project
 
 
-def _download_from_ena(run: str, output_dir: Path) -> bool:
-    """Download FASTQ files for a run from ENA FTP. Returns True on success."""
+def _ena_fastq_jobs(run: str, output_dir: Path) -> list[FileJob]:
+    """FASTQ files of a run on ENA, with their md5 and size. [] if ENA has none."""
     api_url = (
         f"https://www.ebi.ac.uk/ena/portal/api/filereport"
-        f"?accession={run}&result=read_run&fields=fastq_ftp&format=json"
+        f"?accession={run}&result=read_run&fields=fastq_ftp,fastq_md5,fastq_bytes&format=json"
     )
     try:
         with urllib.request.urlopen(api_url, timeout=30) as resp:
             data = json.loads(resp.read())
     except Exception as e:
         print(f"ENA API lookup failed for {run}: {e}")
-        return False
+        return []
 
     if not data:
         print(f"No ENA records for {run}")
-        return False
+        return []
 
-    ftp_field = data[0].get("fastq_ftp", "")
-    if not ftp_field:
-        print(f"No fastq_ftp URLs for {run}")
-        return False
+    def _split(field: str) -> list[str]:
+        return [v.strip() for v in str(data[0].get(field) or "").split(";")]
 
-    urls = [u.strip() for u in ftp_field.split(";") if u.strip()]
-    downloaded_any = False
-    for url in urls:
-        if not url.startswith("ftp://"):
+    urls, md5s, sizes = _split("fastq_ftp"), _split("fastq_md5"), _split("fastq_bytes")
+    jobs = []
+    for i, url in enumerate(urls):
+        if not url:
+            continue
+        if "://" not in url:
             url = "ftp://" + url
         filename = url.split("/")[-1]
-        dest_gz = output_dir / filename
-        dest = output_dir / filename.replace(".fastq.gz", ".fastq")
-        if dest.exists():
-            downloaded_any = True
-            continue
-        try:
-            print(f"Downloading {url} …")
-            urllib.request.urlretrieve(url, dest_gz)
-            with gzip.open(dest_gz, 'rb') as f_in, open(dest, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-            dest_gz.unlink(missing_ok=True)
-            downloaded_any = True
-        except Exception as e:
-            print(f"Failed to download {url}: {e}")
-            dest_gz.unlink(missing_ok=True)
+        md5 = md5s[i] if i < len(md5s) and md5s[i] else None
+        size = int(sizes[i]) if i < len(sizes) and sizes[i].isdigit() else None
+        jobs.append(FileJob(run, url, output_dir / filename, md5, size))
+    if not jobs:
+        print(f"No fastq_ftp URLs for {run}")
+    return jobs
+
+
+def _ena_ready(run: str, output_dir: Path) -> bool:
+    """True once a run's FASTQ (single, or both paired mates) is on disk, gzipped or not."""
+    if find_fastq(output_dir, run):
+        return True
+    return bool(find_fastq(output_dir, f"{run}_1") and find_fastq(output_dir, f"{run}_2"))
+
 
-    return downloaded_any
+def _progress_messages(callback, step: int = 10):
+    """
+    Adapt download_files' byte progress to "SRR… 40% (12.1 / 30.2 MB)" messages
+    for callback, at most one per run every step percent (or every 50 MB when
+    the size is unknown).
+    """
+    last: dict[str, int] = {}
+
+    def _progress(run: str, done: int, total: int | None) -> None:
+        mark = done * 100 // total // step if total else done // (50 << 20)
+        if last.get(run) == mark:
+            return
+        last[run] = mark
+        mb = done / 1e6
+        if total:
+            callback(f"{run} — {done * 100 // total}% ({mb:.1f} / {total / 1e6:.1f} MB)")
+        else:
+            callback(f"{run} — {mb:.1f} MB")
+
+    return _progress
 
 
 # lib_layout = 'paired' or 'single'
 # runs = list of SRR Accessions
-def download_runs(runner, bioproject: str, lib_layout: str, runs: list[str], state: AppState) -> AppState:
+# runs are downloaded from ENA max_workers files at a time; runs ENA cannot
+# serve fall back to fasterq-dump one after another
+def download_runs(runner, bioproject: str, lib_layout: str, runs: list[str], state: AppState,
+                  callback=None, max_workers: int = MAX_WORKERS) -> AppState:
 
     APP_DIR = Path(__file__).parent
     SRA_BIN = APP_DIR / "bin" / "sratoolkit" / "bin"
     output_dir = Path(APP_DIR / f"data/{bioproject}/fastq/{lib_layout}").resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    cores = str(max(os.cpu_count() - 4, 1))
+    pending = [run for run in runs if not _ena_ready(run, output_dir)]
+    jobs = {run: _ena_fastq_jobs(run, output_dir) for run in pending}
+    results = download_files(
+        [j for run_jobs in jobs.values() for j in run_jobs if not j.dest.exists()],
+        _progress_messages(callback) if callback else None,
+        max_workers=max_workers,
+    )
 
-    for run in runs:
-        already_paired = (output_dir / f"{run}_1.fastq").exists()
-        already_single = (output_dir / f"{run}.fastq").exists()
-        if already_paired or already_single:
+    for run in pending:
+        if results.get(run):
+            print(f"Failed to download {run}: {results[run]}")
+        if jobs[run] and not results.get(run) and _ena_ready(run, output_dir):
             continue
-
-        if not _download_from_ena(run, output_dir):
-            print(f"ENA download failed for {run}, falling back to fasterq-dump…")
-            runner.fq_run([
-                str(SRA_BIN / "fasterq-dump"), run, "--split-files",
-                "--threads", cores,
-                "--outdir", str(output_dir),
-            ])
+        print(f"ENA download failed for {run}, falling back to fasterq-dump…")
+        runner.fq_run([
+            str(SRA_BIN / "fasterq-dump"), run, "--split-files",
+            "--threads", THREADS,
+            "--outdir", str(output_dir),
+        ])
 
     return state
 
@@ -303,44 +331,37 @@ def write_manifest(bioproject: str, lib_layout: str, state: AppState) -> None:
     # # create the temporary qiime directory
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    # organize fastq types (only .fastq files, ignore .sra and other artefacts)
-    files = [f for f in os.listdir(input_dir) if f.endswith('.fastq')]
-    if files:
-        # if single, they will all be contained in files list
-        forward, reverse = [], []
-        for file in files:
-            if '_1.fastq' in file:
-                forward.append(file)
-            elif '_2.fastq' in file:
-                reverse.append(file)
-        
+    # organize fastq types (.fastq.gz or .fastq, ignore .sra, .part and other artefacts)
+    # QIIME's manifest import reads gzipped files directly, so they are listed as is
+    fastqs = list_fastqs(input_dir)
+    if fastqs:
+        paired = {run: mates for run, mates in fastqs.items() if "1" in mates and "2" in mates}
+
         # open the manifest file for writing
         with open(f"{output_dir}/manifest.tsv", "w", newline="") as m:
             writer = csv.writer(m, delimiter='\t')
-            if forward:
+            if paired:
                 # paired end
                 state.local_paths['paired'] = []
                 writer.writerow(['sample-id',
                                  'forward-absolute-filepath',
                                  'reverse-absolute-filepath'])
-                for f, r in zip(sorted(forward), sorted(reverse)):
-                    srr = f[:-8]   # strip _1.fastq (8 chars)
+                for srr, mates in sorted(paired.items()):
                     if srr not in state.runs:
                         continue   # skip leftover files from previous fetches
                     state.runs[srr]['uploaded'] = True
-                    fwd_path = str(Path(f"{input_dir}/{f}").resolve())
-                    rev_path = str(Path(f"{input_dir}/{r}").resolve())
+                    fwd_path = str(Path(f"{input_dir}/{mates['1']}").resolve())
+                    rev_path = str(Path(f"{input_dir}/{mates['2']}").resolve())
                     writer.writerow([srr, fwd_path, rev_path])
             else:
                 # single end
                 state.local_paths['single'] = []
                 writer.writerow(['sample-id', 'absolute-filepath'])
-                for s in files:
-                    srr = s[:-6]   # strip .fastq (6 chars)
-                    if srr not in state.runs:
+                for srr, mates in sorted(fastqs.items()):
+                    if srr not in state.runs or None not in mates:
                         continue   # skip leftover files from previous fetches
                     state.runs[srr]['uploaded'] = True
-                    single_path = str(Path(f"{input_dir}/{s}").resolve())
+                    single_path = str(Path(f"{input_dir}/{mates[None]}").resolve())
                     writer.writerow([srr, single_path])
 
 
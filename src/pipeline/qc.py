@@ -1,67 +1,169 @@
 from __future__ import annotations
 import pandas as pd
+import numpy as np
+from dataclasses import dataclass, field
+from itertools import islice
+from math import exp, log, log1p
 from pathlib import Path
-import os
 import zipfile
 from typing import TYPE_CHECKING
 
+from src.pipeline.fastq_io import list_fastqs, open_fastq
+
 if TYPE_CHECKING:
     from src.models.app_state import AppState
 
 
-# lib_layout = 'paired' or 'single'
-# fastqs = list of fastq filenames
-def get_min_run_len(bioproject: str, lib_layout: str, fastqs: list[str], state: AppState) -> int:
-    
-    print('get min run length')
-    lengths = []
-    
-    APP_DIR = Path(__file__).parent
+# Streaming FASTQ profiling.
+# Each file is read once, in buffered chunks and gunzipped on the fly, while a
+# reservoir sample of SAMPLE_READS reads is kept (Vitter's algorithm L, so the
+# random draws scale with the sample, not the file). Read lengths and the
+# per-position quality quantiles of the sample replace the first-read length
+# and the `qiime demux summarize` seven-number summaries in get_trunc().
+
+SAMPLE_READS = 10_000
+SEED = 42
+PHRED_OFFSET = 33
+READ_BUFFER = 1 << 20
+DATA_DIR = Path(__file__).parent / "data"
+# the seven-number summary rows of `qiime demux summarize`
+SUMMARY_PERCENTILES = (2, 9, 25, 50, 75, 91, 98)
+# trim length that this percentage of sampled reads is shorter than
+# (deblur discards reads shorter than --p-trim-length)
+LENGTH_PERCENTILE = 2
+
+
+@dataclass
+class FastqProfile:
+    reads: int                              # reads in the file
+    lengths: np.ndarray                     # length of each sampled read
+    qualities: list[bytes] = field(repr=False, default_factory=list)   # sampled quality strings
+
+    @property
+    def min_len(self) -> int:
+        """Length kept by all but LENGTH_PERCENTILE % of reads."""
+        if not len(self.lengths):
+            return 0
+        return int(np.percentile(self.lengths, LENGTH_PERCENTILE, method="lower"))
+
+    @property
+    def summary(self) -> pd.DataFrame:
+        return quality_summary(self.qualities)
+
+
+def _records(f):
+    """(sequence, quality) of each FASTQ record in binary file f."""
+    while True:
+        header = f.readline()
+        if not header:
+            return
+        seq = f.readline()
+        f.readline()
+        qual = f.readline()
+        yield seq.rstrip(b"\r\n"), qual.rstrip(b"\r\n")
+
+
+def _reservoir(records, k: int, rng: np.random.Generator) -> tuple[list, int]:
+    """Uniform sample of k items from an iterator of unknown length, and its length."""
+    sample = list(islice(records, k))
+    n = len(sample)
+    if n < k:
+        return sample, n
+    w = exp(log(rng.random()) / k)
+    while True:
+        skip = int(log(rng.random()) / log1p(-w))
+        skipped = sum(1 for _ in islice(records, skip))
+        n += skipped
+        if skipped < skip:
+            return sample, n
+        item = next(records, None)
+        if item is None:
+            return sample, n
+        n += 1
+        sample[rng.integers(k)] = item
+        w *= exp(log(rng.random()) / k)
+
+
+def profile_fastq(path: str | Path, n_reads: int = SAMPLE_READS, seed: int = SEED) -> FastqProfile:
+    """Read lengths and qualities of a uniform sample of n_reads reads of a FASTQ(.gz) file."""
+    with open_fastq(path, binary=True, buffering=READ_BUFFER) as f:
+        sample, reads = _reservoir(_records(f), n_reads, np.random.default_rng(seed))
+    lengths = np.fromiter((len(seq) for seq, _ in sample), dtype=np.int64, count=len(sample))
+    return FastqProfile(reads, lengths, [qual for _, qual in sample])
+
+
+def quality_summary(qualities: list[bytes]) -> pd.DataFrame:
+    """
+    Per-position Phred quality quantiles in the layout of QIIME's
+    *-seven-number-summaries.tsv: rows "count", "2%" ... "98%", one column per
+    read position, numbered from 1 as QIIME does, counting only the reads
+    that reach it.
+    """
+    index = ["count"] + [f"{p}%" for p in SUMMARY_PERCENTILES]
+    lens = np.fromiter((len(q) for q in qualities), dtype=np.int64, count=len(qualities))
+    width = int(lens.max()) if len(lens) else 0
+    if not width:
+        return pd.DataFrame(index=index, dtype=float)
+
+    # scatter every quality string into one NaN-padded (reads x positions) array
+    flat = np.frombuffer(b"".join(qualities), dtype=np.uint8).astype(np.float32) - PHRED_OFFSET
+    rows = np.repeat(np.arange(len(lens)), lens)
+    cols = np.arange(len(flat)) - np.repeat(np.cumsum(lens) - lens, lens)
+    grid = np.full((len(lens), width), np.nan, dtype=np.float32)
+    grid[rows, cols] = flat
+
+    counts = (lens[:, None] > np.arange(width)).sum(axis=0)
+    quantiles = np.nanpercentile(grid, SUMMARY_PERCENTILES, axis=0)
+    return pd.DataFrame(np.vstack([counts, quantiles]), index=index, columns=range(1, width + 1))
+
+
+def _fastq_paths(bioproject: str, lib_layout: str, fastqs: list[str], state: AppState) -> list[str]:
+    """Local uploads are full paths; downloaded runs are names in the project's fastq dir."""
     if state.local_paths['paired'] or state.local_paths['single']:
-        fastq_list = state.local_paths[lib_layout]
-        try:
-            for fastq in fastq_list:
-                with open(f"{fastq}", 'r', encoding='utf-8') as f:
-                    f.readline() # skip header (@...)
-                    seq = f.readline().strip() # sequence
-                    if seq:
-                        lengths.append(len(seq))
-        except Exception as e:
-            print(f"An error occurred reading {fastq}: {e}")
-    else:
-        input_dir = str((APP_DIR / f"data/{bioproject}/fastq/{lib_layout}").resolve())
+        return list(state.local_paths[lib_layout])
+    input_dir = str((DATA_DIR / f"{bioproject}/fastq/{lib_layout}").resolve())
+    return [f"{input_dir}/{fastq}" for fastq in fastqs]
+
+
+def _profile_all(paths: list[str]) -> list[FastqProfile]:
+    profiles = []
+    for path in paths:
         try:
-            for fastq in fastqs:
-                with open(f"{input_dir}/{fastq}", 'r', encoding='utf-8') as f:
-                    f.readline() # skip header (@...)
-                    seq = f.readline().strip() # sequence
-                    if seq:
-                        lengths.append(len(seq))
+            profiles.append(profile_fastq(path))
         except Exception as e:
-                print(f"An error occurred reading {fastq}: {e}")
+            print(f"An error occurred reading {path}: {e}")
+    return profiles
 
+
+# lib_layout = 'paired' or 'single'
+# fastqs = list of fastq filenames
+# returns the trim length kept by (nearly) every sampled read of every file
+def get_min_run_len(bioproject: str, lib_layout: str, fastqs: list[str], state: AppState) -> int:
+
+    print('get min run length')
+    lengths = [p.min_len for p in _profile_all(_fastq_paths(bioproject, lib_layout, fastqs, state))]
     return min(lengths) if lengths else 0
 
 
-# sns = seven number summary dataframe
-# returns first base position where quality drops below threshold
+# sns = seven number summary dataframe, positions numbered from 1
+# returns first base position where quality drops below threshold,
+# or the read length when it never does
 def find_median_drop(sns, quality_threshold: int) -> int:
     
     print('find median drop')
     # convert to DataFrame if a file-like object was passed
     if not isinstance(sns, pd.DataFrame):
         sns = pd.read_csv(sns, sep='\t', index_col=0)
-    else:
-        # if the first column is the percentile label, use it as the index
-        if sns.columns[0] == 'Unnamed: 0' or sns.columns[0].startswith('Unnamed'):
-            sns = sns.set_index(sns.columns[0])
-        else:
-            sns = sns.set_index(sns.columns[0])
+    elif "50%" not in sns.index:
+        # read from a .tsv: the first column holds the percentile labels
+        sns = sns.set_index(sns.columns[0])
 
     if "50%" not in sns.index:
         raise ValueError("Missing 50% row in quality summary")
 
     median = sns.loc["50%"].astype(float)
+    if median.empty:
+        raise ValueError("Quality summary has no read positions")
     pos = median <= quality_threshold
     if pos.any():
         trunc_len = int(pos.idxmax())
@@ -71,81 +173,78 @@ def find_median_drop(sns, quality_threshold: int) -> int:
     return trunc_len
 
 
+# min_len = shortest usable read length, med_drop = first position with poor median quality
+def _trunc_len(min_len: int, med_drop: int) -> int:
+    if med_drop < 1:
+        raise ValueError(f"Invalid median quality drop position: {med_drop} (positions start at 1)")
+    if min_len / med_drop >= 2:
+        return int(min_len)
+    return min(med_drop, int(min_len))
+
+
 # lib_layout = 'paired' or 'single'
 # returns a dict of size 0, 1 or 2
 # 0 -> something weird happened
 # 1 -> single with key: 'single'
 # 2 -> paired with keys: 'forward', 'reverse' in that order
-def get_trunc(bioproject: str, lib_layout: str, state: AppState):
+# the quality summaries come from the native profiler, or from the
+# `qiime demux summarize` demux.qzv when use_qzv is set
+def get_trunc(bioproject: str, lib_layout: str, state: AppState, use_qzv: bool = False):
 
     print("get trunc")
     QUALITY_THRESHOLD = 25
 
-    APP_DIR = Path(__file__).parent
     fastq_list = []
     input_dir_fastq = ""
     if state.local_paths['paired'] or state.local_paths['single']:
         # local runs uploaded
         fastq_list = state.local_paths[lib_layout]
-        input_dir_qiime = str((APP_DIR / f"data/LOCAL_PROJECT/qiime/{lib_layout}").resolve())
+        input_dir_qiime = str((DATA_DIR / f"LOCAL_PROJECT/qiime/{lib_layout}").resolve())
     else:
-        input_dir_fastq = str((APP_DIR / f"data/{bioproject}/fastq/{lib_layout}").resolve())
-        input_dir_qiime = str((APP_DIR / f"data/{bioproject}/qiime/{lib_layout}").resolve())
+        input_dir_fastq = str((DATA_DIR / f"{bioproject}/fastq/{lib_layout}").resolve())
+        input_dir_qiime = str((DATA_DIR / f"{bioproject}/qiime/{lib_layout}").resolve())
 
-    # organize the fastq types (ignore non-.fastq files like .sra)
+    # organize the fastq types (.fastq.gz or .fastq; ignore .sra and other artefacts)
+    forward, reverse = [], []
     if fastq_list:
-        files = fastq_list
+        # local uploads: paired paths are stored forward, reverse, forward, ...
+        files = list(fastq_list)
+        if lib_layout == 'paired':
+            forward, reverse = files[0::2], files[1::2]
     else:
-        files = [f for f in os.listdir(input_dir_fastq) if f.endswith('.fastq')]
-    forward, reverse = [], []
-    if files:
-        # if single, they will all be contained in files list
-        for file in files:
-            if '_1.fastq' in file:
-                forward.append(file)
-            elif '_2.fastq' in file:
-                reverse.append(file)
-
-    # find the smallest run length
-    if forward:
-        min_trunc_forward = get_min_run_len(bioproject, 'paired', forward, state=state)
-        min_trunc_reverse = get_min_run_len(bioproject, 'paired', reverse, state=state)
+        fastqs = list_fastqs(input_dir_fastq)
+        files = [f"{input_dir_fastq}/{mates[None]}" for mates in fastqs.values() if None in mates]
+        for mates in fastqs.values():
+            if "1" in mates and "2" in mates:
+                forward.append(f"{input_dir_fastq}/{mates['1']}")
+                reverse.append(f"{input_dir_fastq}/{mates['2']}")
+
+    # one streaming pass per file gives both the read lengths and the qualities
+    reads = {'forward': forward, 'reverse': reverse} if forward else {'single': files}
+    profiles = {key: _profile_all(paths) for key, paths in reads.items()}
+    if not all(profiles.values()):
+        return []
+
+    # seven-number summaries: pooled over the sampled reads of every file,
+    # or read from demux.qzv (forward-* also holds single-end summaries)
+    summaries = {}
+    if use_qzv:
+        with zipfile.ZipFile(f"{input_dir_qiime}/demux.qzv") as z:
+            for name in z.namelist():
+                if name.endswith("-seven-number-summaries.tsv"):
+                    uuid = name.split(sep='/')[0]
+            for key in profiles:
+                tsv = 'reverse' if key == 'reverse' else 'forward'
+                with z.open(f"{uuid}/data/{tsv}-seven-number-summaries.tsv") as f:
+                    summaries[key] = pd.read_csv(f, sep='\t')
     else:
-        min_trunc_single = get_min_run_len(bioproject, 'single', files, state=state)
+        for key, file_profiles in profiles.items():
+            summaries[key] = quality_summary([q for p in file_profiles for q in p.qualities])
 
     # find first base position where median read quality drops below the threshold
-    with zipfile.ZipFile(f"{input_dir_qiime}/demux.qzv") as z:
-        for name in z.namelist():
-            if name.endswith("-seven-number-summaries.tsv"):
-                uuid = name.split(sep='/')[0]
-        if forward:
-            with z.open(f"{uuid}/data/forward-seven-number-summaries.tsv") as f:
-                f_sns = pd.read_csv(f, sep='\t')
-                med_drop_f = int(find_median_drop(f_sns, QUALITY_THRESHOLD))
-                if min_trunc_forward / med_drop_f >= 2:
-                    trunc_forward = int(min_trunc_forward)
-                else:
-                    trunc_forward = min(med_drop_f,
-                                        int(min_trunc_forward))
-            with z.open(f"{uuid}/data/reverse-seven-number-summaries.tsv") as r:
-                r_sns = pd.read_csv(r, sep='\t')
-                med_drop_r = int(find_median_drop(r_sns, QUALITY_THRESHOLD))
-                if min_trunc_reverse / med_drop_r >= 2:
-                    trunc_reverse = int(min_trunc_reverse)
-                else:
-                    trunc_reverse = min(med_drop_r,
-                                        int(min_trunc_reverse))
-            return {'forward': trunc_forward,
-                    'reverse': trunc_reverse}
-        else:
-            with z.open(f"{uuid}/data/forward-seven-number-summaries.tsv") as s:
-                s_sns = pd.read_csv(s, sep='\t')
-                med_drop_s = int(find_median_drop(s_sns, QUALITY_THRESHOLD))
-                if min_trunc_single / med_drop_s >= 2:
-                    trunc_single = int(min_trunc_single)
-                else:
-                    trunc_single = min(med_drop_s,
-                                        int(min_trunc_single))
-            return {'single': trunc_single}
-    
-    return []
+    return {
+        key: _trunc_len(min(p.min_len for p in profiles[key]),
+                        int(find_median_drop(summaries[key], QUALITY_THRESHOLD)))
+        for key in profiles
+    }
+
@@ -2,6 +2,8 @@ from io import StringIO
 from pathlib import Path
 import subprocess
 import os
+import threading
+from src.pipeline.budget import DEFAULT_SHARE, THREADS, ResourceBudget, shared_budget
 
 APP_DIR = Path(__file__).parent
 ENV_DIR = APP_DIR / "qiime_env"
@@ -9,7 +11,7 @@ MAMBA_BIN = APP_DIR / "bin" / "micromamba"
 
 
 class QiimeRunner:
-    def __init__(self):
+    def __init__(self, budget: ResourceBudget | None = None):
         self.base_cmd = [
             str(MAMBA_BIN),
             "run",
@@ -23,37 +25,75 @@ class QiimeRunner:
             "NCBI_SETTINGS": str(APP_DIR / "vdb-config/user-settings.mkfg")
         })
 
-        self._current_process = None
+        # pipeline steps on independent branches run concurrently, so more
+        # than one subprocess can be live at a time
+        self._processes = set()
+        self._queued = set()
+        self._lock = threading.Lock()
+
+        # cores / memory are shared with every other runner in the process
+        self.budget = budget or shared_budget()
 
     def cancel(self) -> None:
-        """Kill the currently running subprocess, if any."""
-        if self._current_process and self._current_process.poll() is None:
-            self._current_process.kill()
-            self._current_process = None
+        """Kill every running subprocess and drop the ones still waiting for cores."""
+        with self._lock:
+            processes, self._processes = self._processes, set()
+            queued, self._queued = self._queued, set()
+        for req in queued:
+            self.budget.cancel(req)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+    # threads = most threads the command can use (default: 1/DEFAULT_SHARE of
+    # the budget if args contain THREADS, else 1); the granted count replaces
+    # THREADS in args and the call waits while the budget cannot cover
+    # min_threads / memory_mb
+    def _allocate(self, args: list[str], threads: int | None, min_threads: int, memory_mb: int):
+        if threads is None:
+            threads = max(self.budget.cores // DEFAULT_SHARE, 1) if THREADS in args else 1
+        job = " ".join(Path(a).name for a in args[:3] if not a.startswith("-"))
+        req = self.budget.request(job, threads=threads, min_threads=min_threads, memory_mb=memory_mb)
+        with self._lock:
+            self._queued.add(req)
+        try:
+            alloc = self.budget.acquire(req)
+        finally:
+            with self._lock:
+                self._queued.discard(req)
+        return alloc, [str(alloc.threads) if a == THREADS else a for a in args]
 
     # args is the command with arguments separated into a list
-    def run(self, args: list[str], callback=None, env=None, cwd=None):
+    def run(self, args: list[str], callback=None, env=None, cwd=None,
+            threads: int | None = None, min_threads: int = 1, memory_mb: int = 0):
 
+        alloc, args = self._allocate(args, threads, min_threads, memory_mb)
         cmd = self.base_cmd + args
 
-        process = subprocess.Popen(
-            cmd,
-            cwd=cwd,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        self._current_process = process
-
-        for line in process.stdout:
-            print(line, end='', flush=True)  # always stream to VS Code terminal
-            if callback:
-                callback(line)
-
-        return_code = process.wait()
-        self._current_process = None
+        try:
+            process = subprocess.Popen(
+                cmd,
+                cwd=cwd,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
+            )
+            with self._lock:
+                self._processes.add(process)
+
+            try:
+                for line in process.stdout:
+                    print(line, end='', flush=True)  # always stream to VS Code terminal
+                    if callback:
+                        callback(line)
+                return_code = process.wait()
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+        finally:
+            self.budget.release(alloc)
         if return_code != 0:
             raise subprocess.CalledProcessError(returncode=return_code, cmd=cmd)
 
@@ -102,18 +142,31 @@ class QiimeRunner:
 
         return StringIO("".join(output))
     
-    def fq_run(self, args: list[str], env=None):
-
-        process = subprocess.Popen(
-            args,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-
-        process.wait()
+    def fq_run(self, args: list[str], env=None, threads: int | None = None):
+
+        alloc, args = self._allocate(args, threads, 1, 0)
+        try:
+            process = subprocess.Popen(
+                args,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
+            )
+            with self._lock:
+                self._processes.add(process)
+
+            # drain stdout so a chatty fasterq-dump never blocks on a full pipe
+            try:
+                for line in process.stdout:
+                    print(line, end='', flush=True)
+                process.wait()
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+        finally:
+            self.budget.release(alloc)
 
     def mv(self, file: str, dir: str):
         cmd = [
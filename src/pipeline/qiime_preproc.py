@@ -1,7 +1,11 @@
 from __future__ import annotations
+import csv
+import json
 import os
 from pathlib import Path
-from src.pipeline.qc import get_trunc
+from src.pipeline.budget import THREADS
+from src.pipeline.dag import DagExecutor, SkipBranch, Step
+from src.pipeline.qc import LENGTH_PERCENTILE, SAMPLE_READS, get_trunc
 import urllib.request
 from typing import TYPE_CHECKING
 
@@ -17,6 +21,7 @@ REF_PHYLO_LINK = "https://data.qiime2.org/2023.5/common/sepp-refs-silva-128.qza"
 SILVA_CLASSIFIER = "silva-138-99-nb-classifier.qza"
 SILVA_CLASSIFIER_DIR = "taxa_classifier"
 SILVA_CLASSIFIER_LINK = "https://data.qiime2.org/classifiers/sklearn-1.4.2/silva/silva-138-99-nb-classifier.qza"
+CLASSIFY_MEMORY_MB = 8192     # loading the SILVA classifier; reserved from the shared budget
 
 
 # lib_layout = 'paired' or 'single'
@@ -61,7 +66,10 @@ def import_samples(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
 # 0 -> something weird happened
 # 1 -> single with key: 'single'
 # 2 -> paired with keys: 'forward', 'reverse' in that order
-def qc(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None):
+# summarize=True runs `qiime demux summarize` and takes the quality summaries
+# from its demux.qzv; by default they come from profiling the FASTQ files directly
+def qc(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None,
+       summarize: bool = False):
 
     APP_DIR = Path(__file__).parent
     if state.local_paths['paired'] or state.local_paths['single']:
@@ -71,7 +79,7 @@ def qc(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, c
 
     # calculate summary statistics (skip if already done)
     qzv_path = Path(io_dir) / "demux.qzv"
-    if not qzv_path.exists():
+    if summarize and not qzv_path.exists():
         runner.run([
             'qiime', 'demux', 'summarize',
             '--i-data', f"{io_dir}/demux.qza",
@@ -79,11 +87,12 @@ def qc(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, c
         ], callback=callback)
 
     # get truncation positions for paired forward, paired reverse, and single
-    return get_trunc(bioproject, lib_layout, state)
+    return get_trunc(bioproject, lib_layout, state, use_qzv=summarize)
 
 
 # lib_layout = 'paired' or 'single'
-def dada2_denoise(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, trunc_f: int=None, trunc_r: int=None, trunc_s: int=None, callback=None):
+# rep_seqs = where to write rep-seqs.qza (default: next to table.qza)
+def dada2_denoise(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, trunc_f: int=None, trunc_r: int=None, trunc_s: int=None, callback=None, rep_seqs: str=None):
 
     APP_DIR = Path(__file__).parent
     if state.local_paths['paired'] or state.local_paths['single']:
@@ -95,9 +104,7 @@ def dada2_denoise(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
         return
 
     io_dir = str(io_dir)
-
-    cores = os.cpu_count()
-    cores = str(max(cores - 4, 1))
+    rep_seqs = rep_seqs or f"{io_dir}/rep-seqs.qza"
 
     # paired
     if trunc_f:
@@ -107,9 +114,9 @@ def dada2_denoise(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
             '--i-demultiplexed-seqs', f"{io_dir}/demux.qza",
             '--p-left-trim-len', '0',
             '--p-trim-length', str(trunc_f),
-            '--p-jobs-to-start', cores,
+            '--p-jobs-to-start', THREADS,
             '--o-table', f"{io_dir}/table.qza",
-            '--o-representative-sequences', f"{io_dir}/rep-seqs.qza",
+            '--o-representative-sequences', rep_seqs,
             '--o-stats', f"{io_dir}/stats.qza"
         ], callback=callback)
 
@@ -120,9 +127,9 @@ def dada2_denoise(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
             '--i-demultiplexed-seqs', f"{io_dir}/demux.qza",
             '--p-left-trim-len', '0',
             '--p-trim-length', str(trunc_s),
-            '--p-jobs-to-start', cores,
+            '--p-jobs-to-start', THREADS,
             '--o-table', f"{io_dir}/table.qza",
-            '--o-representative-sequences', f"{io_dir}/rep-seqs.qza",
+            '--o-representative-sequences', rep_seqs,
             '--o-stats', f"{io_dir}/stats.qza"
         ], callback=callback)
 
@@ -132,7 +139,8 @@ classifier: silva-138-99-nb-classifier.qza
 source: https://data.qiime2.org/classifiers/sklearn-1.4.2/silva/silva-138-99-nb-classifier.qza
 '''
 # lib_layout: 'paired' or 'single'
-def classify_taxa(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None):
+# rep_seqs = rep-seqs.qza to classify (default: next to table.qza)
+def classify_taxa(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None, rep_seqs: str=None):
 
     APP_DIR = Path(__file__).parent
     classifier_path = str((APP_DIR / "taxa_classifier/silva-138-99-nb-classifier.qza").resolve())
@@ -145,9 +153,9 @@ def classify_taxa(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
     runner.run([
         'qiime', 'feature-classifier', 'classify-sklearn',
         '--i-classifier', classifier_path,
-        '--i-reads', f"{io_dir}/rep-seqs.qza",
+        '--i-reads', rep_seqs or f"{io_dir}/rep-seqs.qza",
         '--o-classification', f"{io_dir}/taxonomy.qza"
-    ], callback=callback)
+    ], callback=callback, memory_mb=CLASSIFY_MEMORY_MB)
     
 
 def infer_phylogeny(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None) -> str:
@@ -170,7 +178,6 @@ def infer_phylogeny(runner: QiimeRunner, bioproject: str, lib_layout: str, state
         return nwk_file.read_text().strip()
 
     s = str(reps_tree_dir)
-    cores = str(max(os.cpu_count() - 4, 1))
 
     try:
         runner.run([
@@ -180,7 +187,7 @@ def infer_phylogeny(runner: QiimeRunner, bioproject: str, lib_layout: str, state
             '--o-masked-alignment', f"{s}/masked-aligned-rep-seqs.qza",
             '--o-tree',             f"{s}/unrooted-tree.qza",
             '--o-rooted-tree',      f"{s}/rooted-tree.qza",
-            '--p-n-threads',        cores,
+            '--p-n-threads',        THREADS,
         ], callback=callback)
 
         runner.run([
@@ -201,6 +208,56 @@ def infer_phylogeny(runner: QiimeRunner, bioproject: str, lib_layout: str, state
     return nwk_file.read_text().strip() if nwk_file.exists() else ""
 
 
+# lib_layout: 'paired' or 'single'
+# taxonomy.tsv and genus-table.tsv, from table.qza and taxonomy.qza
+def create_taxa_tables(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None):
+
+    APP_DIR = Path(__file__).parent
+    if state.local_paths['paired'] or state.local_paths['single']:
+        io_dir = str((APP_DIR / f"data/LOCAL_PROJECT/qiime/{lib_layout}").resolve())
+    else:
+        io_dir = str((APP_DIR / f"data/{bioproject}/qiime/{lib_layout}").resolve())
+
+    # asv to taxonomy map table (taxonomy.tsv)
+    runner.run([
+        'qiime', 'tools', 'export',
+        '--input-path', f"{io_dir}/taxonomy.qza",
+        '--output-path', f"{io_dir}"
+    ], callback=callback)
+
+    # genus relative abundance table (genus-table.tsv)
+    # collapse ASV table to genus level abundance
+    runner.run([
+        'qiime', 'taxa', 'collapse',
+        '--i-table', f"{io_dir}/table.qza",
+        '--i-taxonomy', f"{io_dir}/taxonomy.qza",
+        '--p-level', str(6), # 6 = genus
+        '--o-collapsed-table', f"{io_dir}/genus-table.qza"
+    ], callback=callback)
+
+    # normalize to get relative abundance
+    runner.run([
+        'qiime', 'feature-table', 'relative-frequency',
+        '--i-table', f"{io_dir}/genus-table.qza",
+        '--o-relative-frequency-table', f"{io_dir}/genus-relfreq.qza"
+    ], callback=callback)
+
+    # export to BIOM
+    runner.run([
+        'qiime', 'tools', 'export',
+        '--input-path', f"{io_dir}/genus-relfreq.qza",
+        '--output-path', f"{io_dir}/genus"
+    ], callback=callback)
+
+    # convert to tsv
+    runner.run([
+        'biom', 'convert',
+        '-i', f"{io_dir}/genus/feature-table.biom",
+        '-o', f"{io_dir}/genus-table.tsv",
+        '--to-tsv'
+    ], callback=callback)
+
+
 # lib_layout: 'paired' or 'single'
 def create_tables(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, has_taxonomy: bool = True, callback=None):
 
@@ -226,45 +283,9 @@ def create_tables(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
         '--to-tsv'
     ], callback=callback)
 
-    # asv to taxonomy map table (taxonomy.tsv)
+    # asv to taxonomy map table (taxonomy.tsv) and genus table (genus-table.tsv)
     if has_taxonomy:
-        runner.run([
-            'qiime', 'tools', 'export',
-            '--input-path', f"{io_dir}/taxonomy.qza",
-            '--output-path', f"{io_dir}"
-        ], callback=callback)
-
-        # genus relative abundance table (genus-table.tsv)
-        # collapse ASV table to genus level abundance
-        runner.run([
-            'qiime', 'taxa', 'collapse',
-            '--i-table', f"{io_dir}/table.qza",
-            '--i-taxonomy', f"{io_dir}/taxonomy.qza",
-            '--p-level', str(6), # 6 = genus
-            '--o-collapsed-table', f"{io_dir}/genus-table.qza"
-        ], callback=callback)
-
-        # normalize to get relative abundance
-        runner.run([
-            'qiime', 'feature-table', 'relative-frequency',
-            '--i-table', f"{io_dir}/genus-table.qza",
-            '--o-relative-frequency-table', f"{io_dir}/genus-relfreq.qza"
-        ], callback=callback)
-
-        # export to BIOM
-        runner.run([
-            'qiime', 'tools', 'export',
-            '--input-path', f"{io_dir}/genus-relfreq.qza",
-            '--output-path', f"{io_dir}/genus"
-        ], callback=callback)
-
-        # convert to tsv
-        runner.run([
-            'biom', 'convert',
-            '-i', f"{io_dir}/genus/feature-table.biom",
-            '-o', f"{io_dir}/genus-table.tsv",
-            '--to-tsv'
-        ], callback=callback)
+        create_taxa_tables(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
 
     # export representative sequences to FASTA (dna-sequences.fasta)
     # Always regenerate — stale FASTA from a prior cleanup causes FK violations in feature_count
@@ -286,76 +307,167 @@ def create_tables(runner: QiimeRunner, bioproject: str, lib_layout: str, state:
         runner.mv(file=f"{io_dir}/rep-seqs.qza", dir=reps_tree_dir)
 
 
-def qiime_preprocess(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None):
+def _layout_dirs(bioproject: str, lib_layout: str, state: AppState) -> tuple[Path, Path]:
+    """(qiime io dir, reps-tree dir) of a layout."""
+    APP_DIR = Path(__file__).parent
+    project = "LOCAL_PROJECT" if state.local_paths['paired'] or state.local_paths['single'] else bioproject
+    return ((APP_DIR / f"data/{project}/qiime/{lib_layout}").resolve(),
+            (APP_DIR / f"data/{project}/reps-tree/{lib_layout}").resolve())
+
+
+def _manifest_fastqs(manifest: Path) -> list[Path]:
+    """FASTQ paths listed in a QIIME manifest.tsv ([] if it is missing)."""
+    try:
+        with open(manifest, newline="") as f:
+            rows = list(csv.reader(f, delimiter='\t'))
+    except OSError:
+        return []
+    return [Path(p) for row in rows[1:] for p in row[1:] if p]
+
+
+# lib_layout = 'paired' or 'single'
+# one DAG step per stage: import -> denoise -> classify -> tables, with the
+# read-quality profile (qc) running alongside the import
+def layout_steps(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None) -> list[Step]:
 
     def _log(msg: str):
         print(msg)
         if callback:
             callback(msg)
 
+    APP_DIR = Path(__file__).parent
+    io_dir, reps_tree_dir = _layout_dirs(bioproject, lib_layout, state)
+    manifest = io_dir / "manifest.tsv"
+    fastqs = _manifest_fastqs(manifest)
+    trunc_json = io_dir / "trunc.json"
+    rep_seqs = reps_tree_dir / "rep-seqs.qza"
+    taxonomy = io_dir / "taxonomy.qza"
+    classifier = (APP_DIR / SILVA_CLASSIFIER_DIR / SILVA_CLASSIFIER).resolve()
+
+    def _import():
+        _log(f"[{lib_layout}] Importing samples…")
+        import_samples(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
+
+    def _qc():
+        _log(f"[{lib_layout}] Profiling read quality…")
+        trunc = qc(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
+        trunc_json.write_text(json.dumps(trunc))
+
+    def _denoise():
+        _log(f"[{lib_layout}] Denoising…")
+        trunc = json.loads(trunc_json.read_text()) or {}
+        reps_tree_dir.mkdir(parents=True, exist_ok=True)
+        dada2_denoise(runner, bioproject=bioproject, lib_layout=lib_layout,
+                      trunc_f=trunc.get('forward'), trunc_r=trunc.get('reverse'), trunc_s=trunc.get('single'),
+                      state=state, callback=callback, rep_seqs=str(rep_seqs))
+        # If denoising did not produce table.qza, nothing left to do
+        if not (io_dir / "table.qza").exists():
+            raise SkipBranch("Denoising did not produce output — skipping remaining steps. "
+                             "Check that the run contains 16S amplicon data.")
+
+    def _classify():
+        _log(f"[{lib_layout}] Classifying taxa…")
+        try:
+            classify_taxa(runner, bioproject=bioproject, lib_layout=lib_layout, state=state,
+                          callback=callback, rep_seqs=str(rep_seqs))
+        except Exception as e:
+            _log(f"[{lib_layout}] Taxonomy classification failed: {e}")
+            # skips the genus tables; no stamp is written, so the next run retries
+            raise SkipBranch("** WARNING: Taxonomy assignment skipped. "
+                             "Genus-level analysis will not be available. **") from e
+
+    def _tables():
+        _log(f"[{lib_layout}] Creating output tables…")
+        create_tables(runner, bioproject=bioproject, lib_layout=lib_layout,
+                      has_taxonomy=False, state=state, callback=callback)
+
+    def _taxa_tables():
+        if not taxonomy.exists():
+            raise SkipBranch("No taxonomy — skipping genus tables.")
+        _log(f"[{lib_layout}] Creating genus tables…")
+        create_taxa_tables(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
+
+    name = lambda stage: f"{lib_layout}/{stage}"
+    return [
+        Step(name("import"), _import, inputs=[manifest, *fastqs], outputs=[io_dir / "demux.qza"]),
+        Step(name("qc"), _qc, inputs=fastqs, outputs=[trunc_json],
+             params={"sample_reads": SAMPLE_READS, "length_percentile": LENGTH_PERCENTILE}),
+        Step(name("denoise"), _denoise, inputs=[io_dir / "demux.qza", trunc_json],
+             outputs=[io_dir / "table.qza", rep_seqs, io_dir / "stats.qza"],
+             params={"left_trim_len": 0}),
+        Step(name("classify"), _classify, inputs=[rep_seqs, classifier], outputs=[taxonomy]),
+        Step(name("tables"), _tables, inputs=[io_dir / "table.qza", rep_seqs],
+             outputs=[io_dir / "feature-table.tsv", reps_tree_dir / "dna-sequences.fasta"]),
+        Step(name("taxa-tables"), _taxa_tables, inputs=[io_dir / "table.qza", taxonomy],
+             outputs=[io_dir / "taxonomy.tsv", io_dir / "genus-table.tsv"],
+             params={"taxa_level": 6}),
+    ]
+
+
+def _ensure_classifier(callback=None):
+
     APP_DIR = Path(__file__).parent
 
     # ensure SILVA classifier is present
     silva_path = (APP_DIR / SILVA_CLASSIFIER_DIR / SILVA_CLASSIFIER).resolve()
     if not silva_path.exists():
-        _log("Downloading SILVA classifier (this may take a while)…")
+        print("Downloading SILVA classifier (this may take a while)…")
+        if callback:
+            callback("Downloading SILVA classifier (this may take a while)…")
         get_silva_classifier()
 
-    _log(f"[{lib_layout}] Importing samples…")
-    import_samples(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
 
-    _log(f"[{lib_layout}] Running QC / demux summary…")
-    trunc = qc(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
+def _executor(steps: list[Step], bioproject: str, state: AppState, callback=None) -> DagExecutor:
 
-    _log(f"[{lib_layout}] Denoising…")
-    if lib_layout == 'paired':
-        dada2_denoise(runner, bioproject=bioproject, lib_layout=lib_layout,
-                      trunc_f=trunc['forward'], trunc_r=trunc['reverse'], 
-                      state=state, callback=callback)
-    elif lib_layout == 'single':
-        dada2_denoise(runner, bioproject=bioproject, lib_layout=lib_layout,
-                      trunc_s=trunc['single'], state=state, callback=callback)
+    def _log(msg: str):
+        print(msg)
+        if callback:
+            callback(msg)
 
-    if state.local_paths['paired'] or state.local_paths['single']:
-        io_dir = APP_DIR / f"data/LOCAL_PROJECT/qiime/{lib_layout}"
-        reps_tree_dir = APP_DIR / f"data/LOCAL_PROJECT/reps-tree/{lib_layout}"
-    else:
-        io_dir = APP_DIR / f"data/{bioproject}/qiime/{lib_layout}"
-        reps_tree_dir = APP_DIR / f"data/{bioproject}/reps-tree/{lib_layout}"
+    APP_DIR = Path(__file__).parent
+    project = "LOCAL_PROJECT" if state.local_paths['paired'] or state.local_paths['single'] else bioproject
+    return DagExecutor(steps, stamp_dir=APP_DIR / f"data/{project}/.steps", log=_log)
 
-    # If denoising did not produce table.qza, nothing left to do
-    if not (io_dir / "table.qza").exists():
-        _log(f"[{lib_layout}] Denoising did not produce output — skipping remaining steps. "
-             "Check that the run contains 16S amplicon data.")
-        return
 
-    # Taxonomy — skip if already done (rep-seqs.qza may have been moved on a re-run)
-    _log(f"[{lib_layout}] Classifying taxa…")
-    if (io_dir / "taxonomy.qza").exists():
-        _log(f"[{lib_layout}] Taxonomy already classified — skipping.")
-        has_taxonomy = True
-    elif not (io_dir / "rep-seqs.qza").exists() and (reps_tree_dir / "rep-seqs.qza").exists():
-        _log(f"[{lib_layout}] rep-seqs.qza already moved to reps-tree — skipping taxonomy re-run.")
-        has_taxonomy = False
-    else:
-        try:
-            classify_taxa(runner, bioproject=bioproject, lib_layout=lib_layout, state=state, callback=callback)
-            has_taxonomy = True
-        except Exception as e:
-            _log(f"[{lib_layout}] Taxonomy classification failed: {e}")
-            _log(f"[{lib_layout}] ** WARNING: Taxonomy assignment skipped. Genus-level analysis will not be available. **")
-            has_taxonomy = False
+def qiime_preprocess(runner: QiimeRunner, bioproject: str, lib_layout: str, state: AppState, callback=None):
 
-    # Create output tables — skip if already done
-    _log(f"[{lib_layout}] Creating output tables…")
-    if (io_dir / "feature-table.tsv").exists():
-        _log(f"[{lib_layout}] Output tables already exist — skipping.")
-    else:
-        create_tables(runner, bioproject=bioproject, lib_layout=lib_layout,
-                      has_taxonomy=has_taxonomy, state=state, callback=callback)
+    _ensure_classifier(callback)
+    _executor(layout_steps(runner, bioproject, lib_layout, state, callback),
+              bioproject, state, callback).run()
+    if callback:
+        callback(f"[{lib_layout}] Preprocessing complete.")
+
+
+# preprocess every layout that has runs, then build the project's tree from the
+# single-end rep-seqs (else paired); layouts run concurrently, and the tree is
+# built alongside taxonomy classification
+# returns the Newick string ('' if no tree could be inferred)
+def run_preprocessing(runner: QiimeRunner, bioproject: str, state: AppState, callback=None) -> str:
+
+    _ensure_classifier(callback)
+    layouts = [layout for layout, runs in (('paired', state.paired_runs), ('single', state.single_runs)) if runs]
+    if not layouts:
+        return ""
+    steps = [step for layout in layouts for step in layout_steps(runner, bioproject, layout, state, callback)]
+
+    tree_layout = 'single' if state.single_runs else 'paired'
+    _, reps_tree_dir = _layout_dirs(bioproject, tree_layout, state)
+
+    def _phylogeny():
+        if callback:
+            callback("[phylogeny] Building phylogenetic tree…")
+        infer_phylogeny(runner, bioproject=bioproject, lib_layout=tree_layout, state=state, callback=callback)
+
+    steps.append(Step("phylogeny", _phylogeny, inputs=[reps_tree_dir / "rep-seqs.qza"],
+                      outputs=[reps_tree_dir / "tree.nwk"]))
+    _executor(steps, bioproject, state, callback).run()
+    if callback:
+        for layout in layouts:
+            callback(f"[{layout}] Preprocessing complete.")
+
+    nwk_file = reps_tree_dir / "tree.nwk"
+    return nwk_file.read_text().strip() if nwk_file.exists() else ""
 
-    _log(f"[{lib_layout}] Preprocessing complete.")
-    
 
 def download_classifier(classifier_url: str):
 
@@ -0,0 +1,155 @@
+# src/services/analysis_cache.py
+#
+# Content-addressed on-disk cache for derived analysis arrays (distance
+# matrices, PCoA axes, flattened trees) under data/cache/.
+# An entry is addressed by a SHA-256 of everything its arrays were computed
+# from (count matrix, Newick string, metric, ANALYSIS_VERSION), so stale
+# entries are simply never looked up again. Each entry is a directory of
+# .npy files that load as read-only memory maps; entries are evicted least
+# recently used first once the cache grows past its size cap.
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = _PROJECT_ROOT / "data" / "cache"
+MAX_BYTES = 512 * 1024 * 1024
+# Bump when a kernel's output changes, so entries written by older code are ignored
+ANALYSIS_VERSION = "1"
+
+
+def content_key(*parts) -> str:
+    """
+    SHA-256 over parts (ndarrays, str, bytes, numbers, None), each framed
+    with its type, dtype and shape, so ("ab", "c") and ("a", "bc") differ.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            if part.dtype == object:
+                part = part.astype(str)
+            h.update(f"nd|{part.dtype.str}|{part.shape}|".encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, bytes):
+            h.update(b"b|%d|" % len(part) + part)
+        else:
+            data = ("" if part is None else str(part)).encode()
+            h.update(f"{type(part).__name__}|{len(data)}|".encode() + data)
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    root/p<project_id>/<name>-<key>/<array>.npy
+
+    Entries live under their project so a project's entries can be dropped
+    at once (invalidate) when its runs are re-ingested or deleted. Every
+    write and read refreshes the entry's mtime, which orders LRU eviction.
+    """
+
+    def __init__(self, root: str | os.PathLike = CACHE_DIR, max_bytes: int = MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _entry(self, project_id: int, name: str, key: str) -> Path:
+        return self.root / f"p{project_id}" / f"{name}-{key}"
+
+    def load(self, project_id: int, name: str, key: str) -> dict[str, np.ndarray] | None:
+        """The stored arrays as read-only memory maps, or None on a miss."""
+        entry = self._entry(project_id, name, key)
+        try:
+            arrays = {f.stem: np.load(f, mmap_mode="r") for f in entry.glob("*.npy")}
+            if not arrays:
+                return None
+            now = time.time()
+            os.utime(entry, (now, now))
+            return arrays
+        except (OSError, ValueError):
+            return None
+
+    def store(self, project_id: int, name: str, key: str, arrays: dict[str, np.ndarray]) -> None:
+        """Write an entry atomically (temp dir + rename), then enforce the size cap."""
+        entry = self._entry(project_id, name, key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=".tmp-"))
+        try:
+            for array_name, arr in arrays.items():
+                arr = np.asarray(arr)
+                np.save(tmp / f"{array_name}.npy", arr.astype(str) if arr.dtype == object else arr,
+                        allow_pickle=False)
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        out = []
+        for entry in self.root.glob("p*/*"):
+            if entry.name.startswith(".tmp-") or not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            out.append((entry.stat().st_mtime, size, entry))
+        return out
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, project_id: int) -> None:
+        """Drop every entry of a project."""
+        shutil.rmtree(self.root / f"p{project_id}", ignore_errors=True)
+
+
+def beta_key(counts_digest: str, metric: str, newick: str | None = None) -> str:
+    """Key of a beta-diversity entry: the counts it came from, plus the tree for UniFrac."""
+    return content_key(ANALYSIS_VERSION, "beta", metric, counts_digest, newick)
+
+
+def tree_key(newick: str) -> str:
+    return content_key(ANALYSIS_VERSION, "tree", newick)
+
+
+def reindex_square(matrix: np.ndarray, stored_ids, run_ids) -> np.ndarray:
+    """matrix (rows/cols in stored_ids order) for run_ids; unknown ids get zero rows."""
+    pos = {int(r): i for i, r in enumerate(stored_ids)}
+    idx = np.array([pos.get(int(r), -1) for r in run_ids], dtype=np.int64)
+    found = idx >= 0
+    out = np.zeros((len(idx), len(idx)))
+    out[np.ix_(found, found)] = matrix[np.ix_(idx[found], idx[found])]
+    return out
+
+
+_default: AnalysisCache | None = None
+
+
+def default_cache() -> AnalysisCache:
+    global _default
+    if _default is None:
+        _default = AnalysisCache()
+    return _default
+
+
+def invalidate_project(project_id: int) -> None:
+    """Called whenever a project's counts change (ingest, re-parenting, delete)."""
+    default_cache().invalidate(project_id)
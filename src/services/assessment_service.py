@@ -5,11 +5,15 @@
 # All functions return plain Python dicts, no SQLAlchemy objects leave this module.
 from __future__ import annotations
 
+from pathlib import Path
 from typing import Callable
 
+import numpy as np
+
 from src.db.key_vault import user_exists, unlock, create_entry
 from src.db.database import init_engine, get_master_key, SessionLocal
 from src.db.init_db import init_db
+from src.services.analysis_cache import invalidate_project
 from src.db.repository import (
     get_user,
     get_user_by_username,
@@ -17,27 +21,51 @@ from src.db.repository import (
     create_project as repo_create_project,
     create_run as repo_create_run,
     get_project,
+    bump_ingest_version,
     get_run,
     get_run_by_srr,
     list_projects_for_user,
+    list_projects_with_runs_for_user,
+    get_project_run_summaries,
+    get_project_distinct_counts,
     list_runs_for_project,
     create_genus_bulk,
+    bulk_insert_genus,
     get_genus_for_run,
     get_run_exists_genus_table,
     create_feature,
+    upsert_project_features,
+    list_feature_ids_for_project,
     list_features_for_run,
+    move_run_features,
     create_feature_count_bulk,
+    bulk_insert_feature_counts,
     get_feature_counts_for_run,
+    get_feature_counts_with_taxonomy,
+    get_project_feature_taxonomy_map,
     get_run_exists_feature_table,
     get_run_exists_feature_count_table,
     create_tree,
     get_tree_for_project,
     create_alpha_diversity,
+    bulk_insert_alpha,
+    delete_alpha_for_runs,
     get_alpha_diversity_for_run,
     get_run_exists_alpha_table,
+    upsert_rarefaction_bulk,
+    delete_rarefaction_for_runs,
+    get_rarefaction_for_project,
     create_beta_diversity as repo_create_beta_diversity,
     get_beta_diversity,
+    get_beta_diversity_for_project,
     get_run_exists_beta_table,
+    upsert_beta_diversity_bulk,
+    count_beta_pairs_among,
+    count_runs_in_project,
+    count_existing_runs,
+    mark_run_ingested,
+    get_dirty_run_ids,
+    mark_runs_analysed as repo_mark_runs_analysed,
     update_run_risk,
     RepositoryError,
     NotFoundError,
@@ -45,11 +73,15 @@ from src.db.repository import (
     verify_password,
     username_exists,
     create_pcoa,
+    upsert_pcoa_bulk,
     get_pcoa_for_project,
+    replace_pcoa_axes,
+    get_pcoa_axes_for_project,
     create_simulation as repo_create_simulation,
     get_simulations_for_run as repo_get_simulations_for_run,
     delete_features_for_run,
     delete_genus_for_run,
+    delete_project_cascade,
 )
 
 
@@ -108,6 +140,7 @@ def login_user(username: str, password: str) -> dict:
     except ValueError as e:
         raise ServiceError(str(e))
     init_engine(master_key)
+    init_db()   # create any new tables and migrate older axisad.db layouts
     session = SessionLocal()
     try:
         user = get_user_by_username(session, username)
@@ -205,38 +238,28 @@ def get_project_overview(project_id: int) -> dict:
 
     Counts total runs, unique ASVs across all runs, unique genere across all
     runs, and how many runs have data uploaded vs still pending.
+    Runs in three queries however many runs the project has.
     """
     session = SessionLocal()
     try:
         project = get_project(session, project_id)
-        runs = list_runs_for_project(session, project_id)
-
-        uploaded_count = 0
-        total_asvs = 0
-        all_genera: set[str] = set()
-
-        for run in runs:
-            features = list_features_for_run(session, run.run_id)
-            genera = get_genus_for_run(session, run.run_id)
-
-            # A run is "uploaded" if it has any data associated with it
-            if features or genera:
-                uploaded_count += 1
+        runs = get_project_run_summaries(session, project_id)
+        total_asvs, total_genera = get_project_distinct_counts(session, project_id)
 
-            total_asvs += len(features)
-            all_genera.update(g.genus for g in genera)
+        # A run is "uploaded" if it has any data associated with it
+        uploaded_count = sum(1 for _, _, has_data in runs if has_data)
 
         return {
             "project_id": project.project_id,
             "name": project.name,
             # Use the first run's accession as the project-level accession (ncbi projects)
-            "bio_proj_accession": runs[0].bio_proj_accession if runs else None,
+            "bio_proj_accession": runs[0][1] if runs else None,
             "total_runs": len(runs),
             "uploaded_runs": uploaded_count,
             "pending_runs": len(runs) - uploaded_count,
             "total_asvs": total_asvs,
-            "total_genera": len(all_genera),
-            "run_ids": [r.run_id for r in runs],
+            "total_genera": total_genera,
+            "run_ids": [run_id for run_id, _, _ in runs],
         }
     except RepositoryError as e:
         raise ServiceError(str(e)) from e
@@ -245,21 +268,48 @@ def get_project_overview(project_id: int) -> dict:
 
 
 # ==== Run data ingestion ====
+def ingest_project_features(
+        project_id: int,
+        features: list[dict],                # [{"feature_id": ..., "sequence": ..., "taxonomy": ...}]
+) -> dict:
+    """
+    Upsert ASVs into a project's feature dictionary in one transaction.
+    Call once per QIIME2 layout, then ingest_run_data(features=None) per run,
+    so each sequence / taxonomy string is stored once per project.
+    """
+    session = SessionLocal()
+    try:
+        get_project(session, project_id)    # verify project exists first
+        upsert_project_features(session, project_id=project_id, features=features)
+        session.commit()
+        return {"project_id": project_id, "features_upserted": len(features)}
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
 def ingest_run_data(
         run_id: int,                         # integer DB ID returned by create_run(), NOT the SRR accession string
         genus_rows: list[tuple[str, float]], # [(genus_name, relative_abundance), ...] parsed from genus-table.tsv
-        features: list[dict],                # [{"feature_id": ..., "sequence": ..., "taxonomy": ...}]
+        features: list[dict] | None,         # [{"feature_id": ..., "sequence": ..., "taxonomy": ...}], or None if already in the project dictionary
         feature_counts: dict[str, int],      # {feature_id: raw_count}
         newick_path: str | None = None,      # path to .nwk file on disk, if available
 ) -> dict:
     """
     Bulk-insert all QIIME2 output for a run in a single transaction.
-    Stores genus abundances, ASV features and feature counts. 
+    Stores genus abundances and the run's non-zero feature counts with Core
+    executemany batches, so the number of round-trips is bounded by
+    rows / BULK_BATCH_SIZE rather than one flush per ASV.
+    ASV sequences and taxonomy go into the project-wide feature dictionary;
+    pass features=None when ingest_project_features() already stored them.
     If anything fails, everything rolls back.
     """
     session = SessionLocal()
     try:
         run = get_run(session, run_id)
+        project_id = run.project_id
 
         # Convert list of tuples to dict for the repository layer
         genus_abundances = dict(genus_rows)
@@ -267,34 +317,33 @@ def ingest_run_data(
         # Replace genus-level relative abundances (delete stale, re-insert fresh)
         if get_run_exists_genus_table(session, run_id):
             delete_genus_for_run(session, run_id)
-        create_genus_bulk(session, run=run, genus_abundances=genus_abundances)
+        bulk_insert_genus(session, run_id=run_id, genus_abundances=genus_abundances)
+
+        # Project feature dictionary — one row per ASV hash, shared across runs
+        if features is not None:
+            upsert_project_features(session, project_id=project_id, features=features)
+            known_ids = {f["feature_id"] for f in features}
+        else:
+            known_ids = list_feature_ids_for_project(session, project_id)
 
-        # Replace ASV features and counts (cascade delete handles FeatureCount FK)
-        if get_run_exists_feature_table(session, run_id):
+        # Replace this run's counts
+        if get_run_exists_feature_count_table(session, run_id):
             delete_features_for_run(session, run_id)
-            session.flush()
-        for f in features:
-            create_feature(
-                session,
-                run=run,
-                feature_id=f["feature_id"],
-                sequence=f.get("sequence"),
-                taxonomy=f.get("taxonomy"),
-            )
 
-        # Flush features before inserting counts — feature_count has a FK to feature
-        session.flush()
-        # Only insert counts whose feature_id was actually inserted (guards against stale FASTA)
-        inserted_ids = {f["feature_id"] for f in features}
-        safe_counts = {fid: cnt for fid, cnt in feature_counts.items() if fid in inserted_ids}
-        create_feature_count_bulk(session, run_id=run_id, counts=safe_counts)
+        # Only insert counts whose feature_id is in the dictionary (guards against stale FASTA)
+        safe_counts = {fid: cnt for fid, cnt in feature_counts.items() if fid in known_ids}
+        inserted = bulk_insert_feature_counts(session, run_id=run_id, project_id=project_id,
+                                              counts=safe_counts)
+        bump_ingest_version(session, project_id)
+        mark_run_ingested(session, run_id)
 
         session.commit()
+        invalidate_project(project_id)      # cached matrices / axes were derived from the old counts
         return {
             "run_id": run_id,
             "genera_inserted": len(genus_abundances),
-            "features_inserted": len(features),
-            "feature_counts_inserted": len(feature_counts),
+            "features_inserted": len(features) if features is not None else 0,
+            "feature_counts_inserted": inserted,
         }
     except RepositoryError as e:
         session.rollback()
@@ -355,15 +404,11 @@ def get_feature_counts(run_id: int) -> list[dict]:
     """
     session = SessionLocal()
     try:
-        counts = get_feature_counts_for_run(session, run_id)
+        # taxonomy is joined in from the project feature dictionary in the same SELECT
+        rows = get_feature_counts_with_taxonomy(session, run_id)
         return [
-            {
-                "feature_id": fc.feature_id,
-                "abundance": fc.abundance,
-                # fc.feature is the related Feature row — access taxonomy via relationship
-                "taxonomy": fc.feature.taxonomy if fc.feature else None,
-            }
-            for fc in counts
+            {"feature_id": fid, "abundance": abundance, "taxonomy": taxonomy}
+            for fid, abundance, taxonomy in rows
         ]
     except RepositoryError as e:
         raise ServiceError(str(e)) from e
@@ -411,6 +456,17 @@ def get_is_run_in_feature_count(run_id: int) -> bool:
         session.close()
 
 # ==== Tree ====
+def resolve_newick(newick_path: str) -> str:
+    """
+    The Newick string behind a Tree.newick_path value: the column holds the
+    string itself, or, for imported projects, the path of a .nwk file.
+    """
+    if newick_path.rstrip().endswith(";"):
+        return newick_path
+    path = Path(newick_path)
+    return path.read_text().strip() if path.is_file() else newick_path
+
+
 def get_tree(project_id: int) -> dict:
     """
     Return the phylogenetic tree for a project.
@@ -425,7 +481,7 @@ def get_tree(project_id: int) -> dict:
             "tree_id":       tree.tree_id,
             "project_id":    tree.project_id,
             "newick_path":   tree.newick_path,
-            "newick_string": tree.newick_path,   # newick_path column stores the Newick string
+            "newick_string": resolve_newick(tree.newick_path),
             "created_at":    tree.created_at.isoformat(),
         }
     except RepositoryError as e:
@@ -440,17 +496,13 @@ def store_alpha_diversities(run_id: int, metrics: dict[str, float]) -> list[dict
     Store (or replace) one or more alpha diversity metrics for a run.
     metrics: {"shannon": 2.45, "simpson": 0.88, ...}
     """
-    from sqlalchemy import delete as _delete
-    from src.db.db_models import AlphaDiversity as _AlphaDiversity
     session = SessionLocal()
     try:
-        run = get_run(session, run_id)
+        get_run(session, run_id)
         # Delete any stale rows so re-runs produce fresh values
-        session.execute(_delete(_AlphaDiversity).where(_AlphaDiversity.run_id == run_id))
-        rows = []
-        for metric, value in metrics.items():
-            alpha = create_alpha_diversity(session, run=run, metric=metric, value=value)
-            rows.append({"run_id": run_id, "metric": alpha.metric, "value": alpha.value})
+        delete_alpha_for_runs(session, [run_id])
+        rows = [{"run_id": run_id, "metric": m, "value": v} for m, v in metrics.items()]
+        bulk_insert_alpha(session, rows=rows)
         session.commit()
         return rows
     except RepositoryError as e:
@@ -460,6 +512,38 @@ def store_alpha_diversities(run_id: int, metrics: dict[str, float]) -> list[dict
         session.close()
 
 
+def store_alpha_diversities_bulk(
+        metrics_by_run: dict[int, dict[str, float]],
+        metrics: list[str] | None = None,
+) -> int:
+    """
+    Replace alpha diversity metrics for many runs in one transaction.
+    metrics_by_run: {run_id: {"shannon": 2.45, "simpson": 0.88}, ...}
+    metrics limits the replacement to those metric keys (other stored
+    metrics of the runs are kept); by default every metric is replaced.
+    NaN values (metric undefined for that run) are not stored.
+    Costs one DELETE and one executemany however many runs are passed.
+    Returns the number of rows written.
+    """
+    rows = [
+        {"run_id": run_id, "metric": metric, "value": float(value)}
+        for run_id, values in metrics_by_run.items()
+        for metric, value in values.items()
+        if value == value       # NaN != NaN
+    ]
+    session = SessionLocal()
+    try:
+        delete_alpha_for_runs(session, list(metrics_by_run), metrics)
+        bulk_insert_alpha(session, rows=rows)
+        session.commit()
+        return len(rows)
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
 def get_alpha_diversities(run_id: int) -> list[dict]:
     """
     Return all stored alpha diversity metrics for a run.
@@ -474,6 +558,78 @@ def get_alpha_diversities(run_id: int) -> list[dict]:
         session.close()
 
 
+# ==== Rarefaction ====
+def store_rarefaction_bulk(run_ids: list[int], rows: list[dict]) -> int:
+    """
+    Replace the rarefaction summaries of run_ids with rows (as produced by
+    services.rarefaction.rarefy_project) in one transaction.
+    Returns the number of rows written.
+    """
+    session = SessionLocal()
+    try:
+        delete_rarefaction_for_runs(session, run_ids)
+        upsert_rarefaction_bulk(session, rows=rows)
+        session.commit()
+        return len(rows)
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def get_rarefaction_curves(project_id: int, metric: str) -> dict[int, list[dict]]:
+    """
+    Return {run_id: [{"depth", "n_iter", "mean", "minimum", "q1", "median",
+    "q3", "maximum"}, ...]} for one metric, each run's rows in depth order.
+    """
+    session = SessionLocal()
+    try:
+        rows = get_rarefaction_for_project(session, project_id, metric)
+        curves: dict[int, list[dict]] = {}
+        for r in rows:
+            curves.setdefault(r.run_id, []).append({
+                "depth": r.depth, "n_iter": r.n_iter, "mean": r.mean,
+                "minimum": r.minimum, "q1": r.q1, "median": r.median,
+                "q3": r.q3, "maximum": r.maximum,
+            })
+        return curves
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+# ==== Incremental recomputation ====
+def get_dirty_runs(project_id: int, analysis: str, since=None) -> list[int]:
+    """
+    Run ids of a project that analysis ("alpha", "bray_curtis", "unifrac")
+    has not covered since they were last ingested, or since `since`
+    (a datetime, e.g. the tree's created_at).
+    """
+    session = SessionLocal()
+    try:
+        return get_dirty_run_ids(session, project_id, analysis, since=since)
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def mark_runs_analysed(run_ids: list[int], analysis: str) -> int:
+    """Record that analysis is now up to date for run_ids."""
+    session = SessionLocal()
+    try:
+        n = repo_mark_runs_analysed(session, run_ids, analysis)
+        session.commit()
+        return n
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
 # ==== Beta diversity ====
 def store_beta_diversity(
         run_id_1: int,
@@ -514,36 +670,111 @@ def store_beta_diversity(
         session.close()
 
 
-def get_beta_diversity_matrix(project_id: int, metric: str) -> list[dict]:
+def store_beta_diversity_matrix(
+        project_id: int,
+        metric: str,
+        labels: dict[str, int],     # {label: run_id}, in the matrix's row order
+        matrix,                     # n x n symmetric distances (ndarray or nested lists)
+) -> int:
+    """
+    Store (or replace) a whole pairwise distance matrix in one transaction.
+    Upserts the upper triangle with executemany batches, one row per pair
+    (lower run_id first). Returns the number of pairs written.
+    Raises ServiceError if any run is not part of the project.
+    """
+    run_ids = list(labels.values())
+    rows = []
+    for i, id_a in enumerate(run_ids):
+        for j in range(i + 1, len(run_ids)):
+            id_lo, id_hi = sorted((id_a, run_ids[j]))
+            rows.append({"run_id_1": id_lo, "run_id_2": id_hi,
+                         "metric": metric, "value": float(matrix[i][j])})
+    return _store_beta_rows(project_id, run_ids, rows)
+
+
+def store_beta_diversity_rows(
+        project_id: int,
+        metric: str,
+        row_run_ids: list[int],     # runs along the block's rows (e.g. newly ingested)
+        col_run_ids: list[int],     # runs along its columns (e.g. the whole project)
+        block,                      # len(row_run_ids) x len(col_run_ids) distances
+) -> int:
+    """
+    Store (or replace) a rectangular block of distances, as produced by
+    incremental recomputation of new-vs-all pairs. Self-pairs are skipped and
+    a pair present twice (two new runs) is written once. Returns pairs written.
+    """
+    pairs: dict[tuple[int, int], float] = {}
+    for i, id_a in enumerate(row_run_ids):
+        for j, id_b in enumerate(col_run_ids):
+            if id_a != id_b:
+                pairs[tuple(sorted((id_a, id_b)))] = float(block[i][j])
+    rows = [{"run_id_1": lo, "run_id_2": hi, "metric": metric, "value": v}
+            for (lo, hi), v in pairs.items()]
+    return _store_beta_rows(project_id, list(row_run_ids) + list(col_run_ids), rows)
+
+
+def _store_beta_rows(project_id: int, run_ids: list[int], rows: list[dict]) -> int:
+    session = SessionLocal()
+    try:
+        if count_runs_in_project(session, project_id, run_ids) != len(set(run_ids)):
+            raise NotFoundError(f"Not every run belongs to project_id={project_id}")
+        upsert_beta_diversity_bulk(session, rows=rows)
+        session.commit()
+        return len(rows)
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def count_beta_pairs(run_ids: list[int], metric: str) -> int:
+    """Stored pairs for metric between runs in run_ids (complete = n(n-1)/2)."""
+    session = SessionLocal()
+    try:
+        return count_beta_pairs_among(session, run_ids, metric)
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def get_beta_diversity_matrix(
+        project_id: int,
+        metric: str,
+        run_ids: list[int] | None = None,
+) -> tuple[np.ndarray, list[int]]:
     """
-    Return all pairwise beta diversity values for a project as a flat list.
+    Return a project's pairwise distances for one metric as a dense,
+    symmetric n x n matrix plus its run_id index, from a single SELECT.
 
-    Queries only the upper triangle of the matrix (run_id_1 < run_id_2)
-    to avoid duplicate pairs.
-    Returns: [{"run_id_1": 1, "run_id_2": 2, "metric": "bray_curtis", "value": 0.32}, ...]
+    run_ids fixes the row order; ids with no stored pairs get zero rows.
+    When omitted, every run with stored pairs is included, sorted by id.
+    Returns an empty (0, 0) matrix and [] when nothing has been computed yet.
     """
     session = SessionLocal()
     try:
-        runs = list_runs_for_project(session, project_id)
-        results = []
-        for i, r1 in enumerate(runs):
-            for r2 in runs[i + 1:]:  # upper triangle only — avoids (R1,R2) and (R2,R1) duplicates
-                # Normalize order to match how the row was stored (lower ID first)
-                id_a, id_b = sorted([r1.run_id, r2.run_id])
-                betas = get_beta_diversity(session, id_a, id_b, metric=metric)
-                for b in betas:
-                    results.append({
-                        "run_id_1": b.run_id_1,
-                        "run_id_2": b.run_id_2,
-                        "metric": b.metric,
-                        "value": b.value,
-                    })
-        return results
+        rows = get_beta_diversity_for_project(session, project_id, metric)
     except RepositoryError as e:
         raise ServiceError(str(e)) from e
     finally:
         session.close()
 
+    if not rows:
+        return np.zeros((0, 0)), []
+    if run_ids is None:
+        run_ids = sorted({r[0] for r in rows} | {r[1] for r in rows})
+    matrix = np.zeros((len(run_ids), len(run_ids)), dtype=float)
+    index = {run_id: i for i, run_id in enumerate(run_ids)}
+    ia = np.array([index.get(r[0], -1) for r in rows])
+    ib = np.array([index.get(r[1], -1) for r in rows])
+    values = np.array([r[2] for r in rows], dtype=float)
+    keep = (ia >= 0) & (ib >= 0)
+    matrix[ia[keep], ib[keep]] = values[keep]
+    matrix[ib[keep], ia[keep]] = values[keep]
+    return matrix, list(run_ids)
+
 
 def store_pcoa(run_id: int, metric: str, pc1: float, pc2: float) -> dict:
     """
@@ -569,10 +800,73 @@ def store_pcoa(run_id: int, metric: str, pc1: float, pc2: float) -> dict:
         session.close()
  
  
+def _pcoa_rows(metric: str, coords: dict) -> list[dict]:
+    rows = []
+    for run_id, axes in coords.items():
+        axes = [float(v) for v in axes]
+        axes += [0.0] * (2 - len(axes))         # fewer than two axes for two runs
+        rows.append({"run_id": run_id, "metric": metric, "pc1": axes[0], "pc2": axes[1],
+                     "coords": axes if len(axes) > 2 else None})
+    return rows
+
+
+def store_pcoa_bulk(metric: str, coords: dict[int, tuple[float, ...]]) -> int:
+    """
+    Persist PCoA coordinates for many runs in one transaction.
+    coords: {run_id: (pc1, pc2, ...)}; axes past the second are kept in
+    the coords column. Upserts, like store_pcoa().
+    Raises ServiceError if any run does not exist.
+    """
+    rows = _pcoa_rows(metric, coords)
+    session = SessionLocal()
+    try:
+        if count_existing_runs(session, list(coords)) != len(coords):
+            raise NotFoundError("Not every run_id in coords exists")
+        upsert_pcoa_bulk(session, rows=rows)
+        session.commit()
+        return len(rows)
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+ 
+ 
+def store_pcoa_ordination(
+        project_id: int,
+        metric: str,
+        coords: dict[int, tuple[float, ...]],   # {run_id: (pc1, ..., pck)}
+        eigenvalues,                            # k eigenvalues, descending
+        proportion_explained,                   # k fractions of total variance
+) -> int:
+    """
+    Persist a whole k-axis ordination in one transaction: every run's
+    coordinates plus the project's per-axis eigenvalues for metric.
+    Raises ServiceError if any run is not part of the project.
+    """
+    axes = [
+        {"axis": i + 1, "eigenvalue": float(ev), "proportion_explained": float(pe)}
+        for i, (ev, pe) in enumerate(zip(eigenvalues, proportion_explained))
+    ]
+    session = SessionLocal()
+    try:
+        if count_runs_in_project(session, project_id, list(coords)) != len(coords):
+            raise NotFoundError(f"Not every run belongs to project_id={project_id}")
+        upsert_pcoa_bulk(session, rows=_pcoa_rows(metric, coords))
+        replace_pcoa_axes(session, project_id, metric, axes)
+        session.commit()
+        return len(coords)
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
 def get_pcoa(project_id: int, metric: str) -> list[dict]:
     """
     Return PCoA coordinates for all runs in a project for a given metric.
-    Returns [{"run_id": int, "pc1": float, "pc2": float}, ...]
+    Returns [{"run_id": int, "pc1": float, "pc2": float, "coords": [pc1, pc2, ...]}, ...]
     Returns [] if no coordinates have been computed yet (e.g. UniFrac was
     skipped because no phylogenetic tree was available).
     """
@@ -580,7 +874,7 @@ def get_pcoa(project_id: int, metric: str) -> list[dict]:
     try:
         rows = get_pcoa_for_project(session, project_id, metric)
         return [
-            {"run_id": r.run_id, "pc1": r.pc1, "pc2": r.pc2}
+            {"run_id": r.run_id, "pc1": r.pc1, "pc2": r.pc2, "coords": r.coords or [r.pc1, r.pc2]}
             for r in rows
         ]
     except RepositoryError as e:
@@ -589,6 +883,24 @@ def get_pcoa(project_id: int, metric: str) -> list[dict]:
         session.close()
 
 
+def get_pcoa_axes(project_id: int, metric: str) -> list[dict]:
+    """
+    Per-axis eigenvalues of a project's ordination for metric:
+    [{"axis": 1, "eigenvalue": float, "proportion_explained": float}, ...]
+    Returns [] for ordinations stored before eigenvalues were kept.
+    """
+    session = SessionLocal()
+    try:
+        return [
+            {"axis": a.axis, "eigenvalue": a.eigenvalue, "proportion_explained": a.proportion_explained}
+            for a in get_pcoa_axes_for_project(session, project_id, metric)
+        ]
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
 # ==== AD Risk prediction ====
 def compute_risk(
         run_id: int,
@@ -645,13 +957,16 @@ def list_user_projects(user_id: int) -> list[dict]:
     """
     Return all projects for a user with run summaries, newest first.
     Each project dict includes a 'runs' list with risk scores.
+    Runs are eager-loaded with selectinload, so this is two queries total.
     """
     session = SessionLocal()
     try:
-        projects = list_projects_for_user(session, user_id)
+        projects = list_projects_with_runs_for_user(session, user_id)
         result = []
         for p in projects:
-            runs = list_runs_for_project(session, p.project_id)
+            # newest first, matching list_runs_for_project()
+            runs = sorted(p.runs, key=lambda r: (r.created_at is not None, r.created_at, r.run_id),
+                          reverse=True)
             result.append({
                 "project_id": p.project_id,
                 "name": p.name,
@@ -690,6 +1005,7 @@ def save_ncbi_project(
     on srr_accession).  Safe to call multiple times for the same project.
     """
     session = SessionLocal()
+    moved_from: set[int] = set()
     try:
         user = get_user(session, user_id)
         project = repo_create_project(session, user=user, name=title or bio_proj_accession)
@@ -703,6 +1019,11 @@ def save_ncbi_project(
                 existing = get_run_by_srr(session, srr)
                 # Re-parent to the new project so all project-scoped queries
                 # (beta diversity, PCoA) use the correct project_id.
+                # Its counts follow it into the new project's feature dictionary.
+                move_run_features(session, run=existing, project_id=project.project_id)
+                bump_ingest_version(session, existing.project_id)
+                bump_ingest_version(session, project.project_id)
+                moved_from.add(existing.project_id)
                 existing.project_id = project.project_id
                 session.flush()
             except NotFoundError:
@@ -716,6 +1037,8 @@ def save_ncbi_project(
                 )
 
         session.commit()
+        for old_project_id in moved_from:
+            invalidate_project(old_project_id)
         return {
             "project_id": project.project_id,
             "user_id":    project.user_id,
@@ -732,16 +1055,18 @@ def save_ncbi_project(
 def delete_project(project_id: int) -> None:
     """
     Permanently delete a project and all its runs, genus data, features,
-    trees, and diversity records (cascade delete via ORM).
+    trees, and diversity records.
+    Issues one set-based DELETE per table (children first) instead of
+    loading the whole ORM cascade into memory.
     """
     from src.db.db_models import Project
     session = SessionLocal()
     try:
-        proj = session.get(Project, project_id)
-        if proj is None:
+        if session.get(Project, project_id) is None:
             return   # already gone — treat as success
-        session.delete(proj)
+        delete_project_cascade(session, project_id)
         session.commit()
+        invalidate_project(project_id)
     except Exception as e:
         session.rollback()
         raise ServiceError(str(e)) from e
@@ -814,16 +1139,10 @@ def get_simulation_genus(simulation_id: int) -> list[dict]:
 
 
 def get_project_feature_taxonomy(project_id: int) -> dict[str, str]:
-    """Return {feature_id: taxonomy_string} for every run in a project."""
+    """Return {feature_id: taxonomy_string} from the project's feature dictionary."""
     session = SessionLocal()
     try:
-        runs = list_runs_for_project(session, project_id)
-        result: dict[str, str] = {}
-        for run in runs:
-            for feat in list_features_for_run(session, run.run_id):
-                if feat.taxonomy:
-                    result[feat.feature_id] = feat.taxonomy
-        return result
+        return get_project_feature_taxonomy_map(session, project_id)
     except RepositoryError as e:
         raise ServiceError(str(e)) from e
     finally:
@@ -0,0 +1,161 @@
+# src/services/count_matrix.py
+#
+# Project-wide sample x feature count matrix shared by the diversity workers.
+# Built from a single SELECT over feature_count; rows are runs, columns are
+# the union of ASVs observed anywhere in the project. The copy kept on the
+# AppState is CSR with int32 counts: a run sees a small fraction of the
+# project's ASVs, so the dense layout is mostly zeros.
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+from scipy import sparse as sp
+
+from src.db.database import SessionLocal
+from src.db.repository import (
+    get_project_ingest_version as repo_get_project_ingest_version,
+    get_project_count_triplets,
+    RepositoryError,
+)
+from src.services.analysis_cache import content_key
+from src.services.assessment_service import ServiceError
+
+
+@dataclass(frozen=True)
+class CountMatrix:
+    """
+    counts[i, j] is the raw count of feature_ids[j] in run_ids[i].
+    counts is a dense int64 ndarray or a scipy.sparse CSR matrix of int32.
+    version is the project's ingest_version at load time.
+    """
+    project_id:  int
+    version:     int
+    run_ids:     np.ndarray     # int64, sorted
+    feature_ids: np.ndarray     # object (str), sorted
+    counts:      np.ndarray | sp.csr_matrix
+
+    @property
+    def is_sparse(self) -> bool:
+        return sp.issparse(self.counts)
+
+    def dense(self) -> np.ndarray:
+        return self.counts.toarray() if self.is_sparse else self.counts
+
+    @cached_property
+    def digest(self) -> str:
+        """Content hash of the matrix (ids and counts), for services/analysis_cache.py."""
+        csr = self.counts if self.is_sparse else sp.csr_matrix(self.counts)
+        return content_key(self.run_ids, self.feature_ids, csr.indptr, csr.indices, csr.data.astype(np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of counts (data plus CSR index arrays)."""
+        if self.is_sparse:
+            return self.counts.data.nbytes + self.counts.indices.nbytes + self.counts.indptr.nbytes
+        return self.counts.nbytes
+
+    def _locate(self, run_ids) -> tuple[np.ndarray, np.ndarray]:
+        run_ids = np.asarray(run_ids, dtype=np.int64)
+        idx = np.searchsorted(self.run_ids, run_ids)
+        idx = np.clip(idx, 0, max(len(self.run_ids) - 1, 0))
+        found = (self.run_ids[idx] == run_ids) if len(self.run_ids) else np.zeros(len(run_ids), bool)
+        return idx, found
+
+    def rows_for(self, run_ids: list[int], *, sparse: bool = False) -> np.ndarray | sp.csr_matrix:
+        """
+        Counts for run_ids in the given order. Runs with no stored counts get
+        an all-zero row, so the result always has len(run_ids) rows.
+        sparse=True returns CSR rows without ever densifying the matrix.
+        """
+        idx, found = self._locate(run_ids)
+        shape = (len(idx), len(self.feature_ids))
+        if sparse:
+            csr = sp.csr_matrix(self.counts) if not self.is_sparse else self.counts
+            # selection matrix: row r picks stored row idx[r], or nothing
+            pick = sp.csr_matrix((np.ones(found.sum(), dtype=csr.dtype),
+                                  (np.flatnonzero(found), idx[found])), shape=(len(idx), csr.shape[0]))
+            return (pick @ csr).tocsr() if csr.shape[0] else sp.csr_matrix(shape, dtype=csr.dtype)
+        out = np.zeros(shape, dtype=np.int64)
+        if found.any():
+            rows = self.counts[idx[found]]
+            out[found] = rows.toarray() if self.is_sparse else rows
+        return out
+
+    def run_counts(self, run_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """(feature_ids, counts) of one run's non-zero entries; empty for unknown runs."""
+        idx, found = self._locate([run_id])
+        if not found[0]:
+            return np.array([], dtype=object), np.array([], dtype=np.int64)
+        if self.is_sparse:
+            lo, hi = self.counts.indptr[idx[0]], self.counts.indptr[idx[0] + 1]
+            return self.feature_ids[self.counts.indices[lo:hi]], self.counts.data[lo:hi].astype(np.int64)
+        row = self.counts[idx[0]]
+        nz = np.flatnonzero(row)
+        return self.feature_ids[nz], row[nz]
+
+
+def _build(project_id: int, version: int, triplets: list[tuple[int, str, int]], as_sparse: bool) -> CountMatrix:
+    if not triplets:
+        empty = sp.csr_matrix((0, 0), dtype=np.int32) if as_sparse else np.zeros((0, 0), dtype=np.int64)
+        return CountMatrix(project_id, version, np.array([], dtype=np.int64),
+                           np.array([], dtype=object), empty)
+
+    run_col, feat_col, abund_col = zip(*triplets)
+    run_ids, row_idx = np.unique(np.asarray(run_col, dtype=np.int64), return_inverse=True)
+    feature_ids, col_idx = np.unique(np.asarray(feat_col, dtype=object), return_inverse=True)
+    values = np.asarray(abund_col, dtype=np.int64)
+    shape = (len(run_ids), len(feature_ids))
+
+    if as_sparse:
+        # int32 halves the data array; a single ASV count never nears 2**31
+        counts = sp.csr_matrix((values.astype(np.int32), (row_idx, col_idx)), shape=shape, dtype=np.int32)
+    else:
+        counts = np.zeros(shape, dtype=np.int64)
+        counts[row_idx, col_idx] = values   # (run_id, feature_id) is the PK, so no duplicates
+    return CountMatrix(project_id, version, run_ids, feature_ids, counts)
+
+
+def get_project_ingest_version(project_id: int) -> int:
+    """Cheap check used to decide whether a cached CountMatrix is still current."""
+    session = SessionLocal()
+    try:
+        return repo_get_project_ingest_version(session, project_id)
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def load_count_matrix(project_id: int, *, as_sparse: bool = False) -> CountMatrix:
+    """
+    Load a project's run x feature count matrix from one SELECT over
+    feature_count (plus the ingest_version lookup, in the same transaction).
+    """
+    session = SessionLocal()
+    try:
+        version = repo_get_project_ingest_version(session, project_id)
+        triplets = get_project_count_triplets(session, project_id)
+        return _build(project_id, version, triplets, as_sparse)
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+
+def get_cached_count_matrix(cache: dict, project_id: int, *, as_sparse: bool = False) -> CountMatrix:
+    """
+    Return the project's CountMatrix from cache, reloading only when the
+    project's ingest_version has moved on. cache is keyed by
+    (project_id, ingest_version, as_sparse); stale versions are evicted.
+    """
+    version = get_project_ingest_version(project_id)
+    key = (project_id, version, as_sparse)
+    cm = cache.get(key)
+    if cm is None:
+        for stale in [k for k in cache if k[0] == project_id and k[1] != version]:
+            del cache[stale]
+        cm = load_count_matrix(project_id, as_sparse=as_sparse)
+        cache[(project_id, cm.version, as_sparse)] = cm
+    return cm
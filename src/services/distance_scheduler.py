@@ -0,0 +1,232 @@
+# src/services/distance_scheduler.py
+#
+# Multiprocess pairwise-distance scheduler.
+# The upper triangle of an n x n distance matrix is split into square tiles
+# that run on a ProcessPoolExecutor. Input arrays and the output matrix live
+# in multiprocessing.shared_memory blocks: each worker process attaches once
+# in its initializer, so a task is just four integers, never a pickled array.
+from __future__ import annotations
+
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+# Rows per tile edge; a tile computes at most TILE_SIZE**2 pairs
+TILE_SIZE = 64
+# Below this many rows, spawning worker processes (~1-2 s) costs more than it saves
+PARALLEL_MIN_ROWS = 256
+# Upper bound on the broadcast temporary of the generalized kernel, in bytes
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+# ── Tile kernels ──────────────────────────────────────────────────────────────
+# kernel(arrays, i0, i1, j0, j1, **params) -> (i1-i0, j1-j0) block of distances
+
+def _braycurtis(arrays, i0, i1, j0, j1) -> np.ndarray:
+    x = arrays["x"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        block = cdist(x[i0:i1], x[j0:j1], "braycurtis")
+    return np.nan_to_num(block, nan=0.0)     # 0/0 for a pair of empty runs
+
+
+def _cityblock(arrays, i0, i1, j0, j1) -> np.ndarray:
+    x = arrays["x"]
+    return cdist(x[i0:i1], x[j0:j1], "cityblock")
+
+
+def _generalized_unifrac(arrays, i0, i1, j0, j1, alpha: float = 0.5,
+                         block_bytes: int = BLOCK_BYTES) -> tuple:
+    """Numerator and denominator blocks of generalized UniFrac (see services/unifrac.py)."""
+    p, l = arrays["p"], arrays["l"]
+    num = np.zeros((i1 - i0, j1 - j0))
+    den = np.zeros((i1 - i0, j1 - j0))
+    k = p.shape[1]
+    # about four (rows, tile, k) float64 temporaries are live at once
+    step = max(1, block_bytes // (4 * 8 * max(j1 - j0, 1) * max(k, 1)))
+    for r0 in range(i0, i1, step):
+        r1 = min(r0 + step, i1)
+        a, b = p[r0:r1, None, :], p[None, j0:j1, :]
+        total = a + b
+        weight = l * np.power(total, alpha, out=np.zeros_like(total), where=total > 0)
+        frac = np.divide(np.abs(a - b), total, out=np.zeros_like(total), where=total > 0)
+        den[r0 - i0:r1 - i0] = weight.sum(axis=2)
+        num[r0 - i0:r1 - i0] = (weight * frac).sum(axis=2)
+    return num, den
+
+
+# kernel name -> (function, number of output matrices)
+KERNELS: dict[str, tuple[Callable, int]] = {
+    "braycurtis":          (_braycurtis, 1),
+    "cityblock":           (_cityblock, 1),
+    "generalized_unifrac": (_generalized_unifrac, 2),
+}
+
+
+# ── Worker-process side ───────────────────────────────────────────────────────
+_attached: dict[str, np.ndarray] = {}
+_segments: list[shared_memory.SharedMemory] = []
+
+
+def _attach(descs: dict[str, tuple[str, tuple, str]]) -> dict[str, np.ndarray]:
+    arrays = {}
+    for key, (name, shape, dtype) in descs.items():
+        # spawned workers share the parent's resource tracker, and the parent
+        # unlinks every block once the pool has shut down
+        shm = shared_memory.SharedMemory(name=name)
+        _segments.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return arrays
+
+
+def _init_worker(descs: dict[str, tuple[str, tuple, str]]) -> None:
+    _attached.update(_attach(descs))
+
+
+def _run_tile(kernel: str, i0: int, i1: int, j0: int, j1: int, params: dict, col_offset: int = 0) -> int:
+    fn, n_out = KERNELS[kernel]
+    blocks = fn(_attached, i0, i1, j0, j1, **params)
+    if n_out == 1:
+        blocks = (blocks,)
+    for k, block in enumerate(blocks):
+        _attached[f"out{k}"][i0:i1, j0 - col_offset:j1 - col_offset] = block
+    return (i1 - i0) * (j1 - j0)
+
+
+# ── Parent side ───────────────────────────────────────────────────────────────
+def upper_tiles(n: int, tile: int) -> list[tuple[int, int, int, int]]:
+    """(i0, i1, j0, j1) tiles covering the upper triangle, diagonal tiles included."""
+    edges = list(range(0, n, tile)) + [n]
+    return [
+        (edges[a], edges[a + 1], edges[b], edges[b + 1])
+        for a in range(len(edges) - 1)
+        for b in range(a, len(edges) - 1)
+    ]
+
+
+def _mirror(upper_tiled: np.ndarray, tile: int) -> np.ndarray:
+    """Copy tile-wise upper-triangle results into a full symmetric matrix."""
+    n = upper_tiled.shape[0]
+    full = upper_tiled.copy()
+    for i0, i1, j0, j1 in upper_tiles(n, tile):
+        if i0 != j0:
+            full[j0:j1, i0:i1] = upper_tiled[i0:i1, j0:j1].T
+    return full
+
+
+class DistanceScheduler:
+    """
+    Runs a tile kernel over every row pair of the given arrays (pairwise),
+    or over the pairs between some rows and all rows (pairwise_rows).
+
+    progress(done_pairs, total_pairs) is called from the calling thread after
+    each finished tile, so a QThread worker can forward it to its progress
+    signal. max_workers=1, or fewer than min_rows rows, runs the same tiles
+    in-process without starting a pool.
+    """
+
+    def __init__(
+            self,
+            max_workers: int | None = None,
+            tile_size: int = TILE_SIZE,
+            progress: Callable[[int, int], None] | None = None,
+            min_rows: int = PARALLEL_MIN_ROWS,
+    ) -> None:
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.tile_size = tile_size
+        self.progress = progress
+        self.min_rows = min_rows
+
+    def uses_pool(self, n: int) -> bool:
+        """Whether an n-row pairwise() call would run on worker processes."""
+        return self._pool_for(n * (n - 1) // 2)
+
+    def _pool_for(self, pairs: int) -> bool:
+        return self.max_workers > 1 and pairs >= self.min_rows * (self.min_rows - 1) // 2
+
+    def pairwise(self, kernel: str, arrays: dict[str, np.ndarray], **params) -> np.ndarray | tuple:
+        """
+        Return the n x n matrix (or matrices, for multi-output kernels) of
+        kernel over the rows of arrays. All 2-d arrays must share n rows;
+        1-d arrays (per-column weights such as "l") are passed through whole.
+        """
+        arrays = {k: np.ascontiguousarray(v, dtype=np.float64) for k, v in arrays.items()}
+        n = max(a.shape[0] for a in arrays.values() if a.ndim == 2)
+        tiles = upper_tiles(n, self.tile_size)
+        outs = self._run(kernel, arrays, (n, n), 0, tiles, self.uses_pool(n), params)
+        outs = [_mirror(out, self.tile_size) for out in outs]
+        return outs[0] if len(outs) == 1 else tuple(outs)
+
+    def pairwise_rows(self, kernel: str, arrays: dict[str, np.ndarray], rows, **params) -> np.ndarray | tuple:
+        """
+        Return the len(rows) x n block of kernel between the given rows and
+        every row, e.g. newly ingested runs against the whole project, without
+        touching the other pairs. The selected rows are stacked on top of the
+        2-d arrays so the same contiguous-range tile kernels apply.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        arrays = {k: np.ascontiguousarray(v, dtype=np.float64) for k, v in arrays.items()}
+        n = max(a.shape[0] for a in arrays.values() if a.ndim == 2)
+        m = len(rows)
+        stacked = {k: (np.vstack([v[rows], v]) if v.ndim == 2 else v) for k, v in arrays.items()}
+        r_edges = list(range(0, m, self.tile_size)) + [m]
+        c_edges = list(range(m, m + n, self.tile_size)) + [m + n]
+        tiles = [(r_edges[a], r_edges[a + 1], c_edges[b], c_edges[b + 1])
+                 for a in range(len(r_edges) - 1) for b in range(len(c_edges) - 1)]
+        outs = self._run(kernel, stacked, (m, n), m, tiles, self._pool_for(m * n), params)
+        return outs[0] if len(outs) == 1 else tuple(outs)
+
+    def _run(self, kernel, arrays, shape, col_offset, tiles, use_pool, params) -> list[np.ndarray]:
+        fn, n_out = KERNELS[kernel]
+        total = sum((i1 - i0) * (j1 - j0) for i0, i1, j0, j1 in tiles)
+        if use_pool:
+            return self._run_pool(kernel, arrays, shape, col_offset, n_out, tiles, total, params)
+
+        outs = [np.zeros(shape) for _ in range(n_out)]
+        done = 0
+        for i0, i1, j0, j1 in tiles:
+            blocks = fn(arrays, i0, i1, j0, j1, **params)
+            for out, block in zip(outs, (blocks,) if n_out == 1 else blocks):
+                out[i0:i1, j0 - col_offset:j1 - col_offset] = block
+            done += (i1 - i0) * (j1 - j0)
+            if self.progress:
+                self.progress(done, total)
+        return outs
+
+    def _run_pool(self, kernel, arrays, shape, col_offset, n_out, tiles, total, params) -> list[np.ndarray]:
+        segments: list[shared_memory.SharedMemory] = []
+        descs: dict[str, tuple[str, tuple, str]] = {}
+        try:
+            for key, arr in arrays.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                segments.append(shm)
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                descs[key] = (shm.name, arr.shape, arr.dtype.str)
+            outs = []
+            for k in range(n_out):
+                shm = shared_memory.SharedMemory(create=True, size=max(8 * shape[0] * shape[1], 1))
+                segments.append(shm)
+                out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+                out[...] = 0.0
+                outs.append(out)
+                descs[f"out{k}"] = (shm.name, shape, out.dtype.str)
+
+            # spawn, not fork: the GUI process is multi-threaded (Qt)
+            ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx,
+                                     initializer=_init_worker, initargs=(descs,)) as pool:
+                futures = [pool.submit(_run_tile, kernel, *t, params, col_offset) for t in tiles]
+                done = 0
+                for fut in as_completed(futures):
+                    done += fut.result()
+                    if self.progress:
+                        self.progress(done, total)
+            return [out.copy() for out in outs]
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
@@ -0,0 +1,233 @@
+# src/services/diversity.py
+#
+# Numeric diversity kernels shared by the analysis workers.
+# Inputs are run x feature count matrices (see services/count_matrix.py),
+# dense ndarrays or scipy CSR; outputs are plain ndarrays.
+from __future__ import annotations
+
+import numpy as np
+from scipy import sparse as sp
+
+from src.services.distance_scheduler import DistanceScheduler
+
+# Upper bound on the broadcast temporary in braycurtis_matrix(), in bytes.
+# Peak extra memory is roughly this plus one dense n x FEATURE_CHUNK slice.
+BLOCK_BYTES = 64 * 1024 * 1024
+FEATURE_CHUNK = 1024
+# Features present in at most this fraction of runs are scattered pair-by-pair
+# over their non-zero rows only; denser features go through the broadcast path.
+SPARSE_FEATURE_FRACTION = 1 / 3
+
+
+def _sum_of_minima(
+        counts: np.ndarray | sp.spmatrix,
+        block_bytes: int,
+        feature_chunk: int,
+) -> np.ndarray:
+    """Symmetric n x n matrix of sum_k min(x_ik, x_jk)."""
+    csc = sp.csc_matrix(counts, dtype=np.float64)
+    n, f = csc.shape
+    nnz = np.diff(csc.indptr)
+    # Small inputs fit in a single broadcast block; skip the per-feature loop
+    sparse_limit = -1 if 8 * n * n * f <= block_bytes else n * SPARSE_FEATURE_FRACTION
+    mins = np.zeros(n * n, dtype=np.float64)
+
+    # Rare features: only pairs of runs that both contain the ASV contribute.
+    for j in np.flatnonzero((nnz >= 2) & (nnz <= sparse_limit)):
+        lo, hi = csc.indptr[j], csc.indptr[j + 1]
+        rows, vals = csc.indices[lo:hi], csc.data[lo:hi]
+        np.add.at(mins, (rows[:, None] * n + rows[None, :]).ravel(),
+                  np.minimum.outer(vals, vals).ravel())
+    mins = mins.reshape(n, n)
+
+    # Common features: blocked broadcast over the upper triangle.
+    dense_cols = np.flatnonzero(nnz > max(sparse_limit, 1))
+    upper = np.zeros((n, n), dtype=np.float64)
+    for c0 in range(0, len(dense_cols), feature_chunk):
+        x = csc[:, dense_cols[c0:c0 + feature_chunk]].toarray()
+        width = x.shape[1]
+        # rows per block so that the (rows, n, width) temporary fits in block_bytes
+        step = max(1, block_bytes // (8 * n * width))
+        for r0 in range(0, n, step):
+            r1 = min(r0 + step, n)
+            # only columns >= r0 are needed; the lower triangle is mirrored below
+            upper[r0:r1, r0:] += np.minimum(x[r0:r1, None, :], x[None, r0:, :]).sum(axis=2)
+    upper = np.triu(upper)
+    return mins + upper + np.triu(upper, 1).T
+
+
+def braycurtis_matrix(
+        counts: np.ndarray | sp.spmatrix,
+        *,
+        block_bytes: int = BLOCK_BYTES,
+        feature_chunk: int = FEATURE_CHUNK,
+        scheduler: DistanceScheduler | None = None,
+) -> np.ndarray:
+    """
+    Pairwise Bray-Curtis dissimilarity between the rows of a count matrix.
+
+    Uses BC(u,v) = 1 - 2 * sum(min(u, v)) / (sum(u) + sum(v)), which equals
+    sum|u-v| / sum(u+v) for non-negative counts. Rare ASVs only touch the
+    pairs of runs they occur in; common ones are accumulated in feature
+    chunks and row blocks of the upper triangle, so memory stays bounded by
+    block_bytes however many runs or ASVs there are. 0/0 pairs are 0.
+
+    When the scheduler would use its process pool, the dense rows are shared
+    with the workers and each tile of the upper triangle is a scipy cdist
+    call instead; otherwise the in-process kernel above is faster.
+    """
+    n = counts.shape[0]
+    totals = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+    if n == 0:
+        return np.zeros((0, 0))
+    if scheduler is not None and scheduler.uses_pool(n):
+        dense = counts.toarray() if sp.issparse(counts) else counts
+        bc = scheduler.pairwise("braycurtis", {"x": dense})
+        np.clip(bc, 0.0, 1.0, out=bc)
+        np.fill_diagonal(bc, 0.0)
+        return bc
+    mins = _sum_of_minima(counts, block_bytes, feature_chunk)
+
+    den = totals[:, None] + totals[None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bc = np.where(den > 0, 1.0 - 2.0 * mins / den, 0.0)
+    np.clip(bc, 0.0, 1.0, out=bc)
+    np.fill_diagonal(bc, 0.0)
+    return bc
+
+
+def _row_minima(counts: np.ndarray | sp.spmatrix, rows: np.ndarray) -> np.ndarray:
+    """len(rows) x n matrix of sum_k min(x_rk, x_jk), touching only the features each row has."""
+    csr = sp.csr_matrix(counts, dtype=np.float64)
+    csc = csr.tocsc()
+    mins = np.zeros((len(rows), csr.shape[0]), dtype=np.float64)
+    for i, r in enumerate(rows):
+        lo, hi = csr.indptr[r], csr.indptr[r + 1]
+        cols, vals = csr.indices[lo:hi], csr.data[lo:hi]
+        # every run's counts of this row's features, capped at this row's counts
+        sub = csc[:, cols]
+        sub.data = np.minimum(sub.data, np.repeat(vals, np.diff(sub.indptr)))
+        mins[i] = np.asarray(sub.sum(axis=1)).ravel()
+    return mins
+
+
+def braycurtis_rows(
+        counts: np.ndarray | sp.spmatrix,
+        rows,
+        *,
+        scheduler: DistanceScheduler | None = None,
+) -> np.ndarray:
+    """
+    len(rows) x n Bray-Curtis block between the given rows and every row,
+    so adding m runs to an n-run project costs m x n pairs, not n².
+
+    Sparse input stays sparse: each new row only visits the non-zeros of the
+    features it contains. Dense input goes through the scheduler's tiles.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if sp.issparse(counts):
+        totals = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+        den = totals[rows, None] + totals[None, :]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bc = np.where(den > 0, 1.0 - 2.0 * _row_minima(counts, rows) / den, 0.0)
+    else:
+        scheduler = scheduler or DistanceScheduler(max_workers=1)
+        bc = scheduler.pairwise_rows("braycurtis", {"x": np.asarray(counts)}, rows)
+    np.clip(bc, 0.0, 1.0, out=bc)
+    bc[np.arange(len(rows)), rows] = 0.0
+    return bc
+
+# alpha_div metric keys
+OBSERVED = "observed_features"
+SHANNON = "shannon"                 # log2
+SIMPSON = "simpson"                 # 1 - Σ p²
+CHAO1 = "chao1"
+ACE = "ace"
+PIELOU = "pielou_evenness"
+GOODS_COVERAGE = "goods_coverage"
+FAITH_PD = "faith_pd"
+ALPHA_METRICS = (OBSERVED, SHANNON, SIMPSON, CHAO1, ACE, PIELOU, GOODS_COVERAGE)
+
+# ACE treats features seen at most this many times as rare (Chao & Lee 1992)
+ACE_RARE_THRESHOLD = 10
+
+
+def alpha_diversity(
+        counts: np.ndarray | sp.spmatrix,
+        *,
+        tree=None,
+        tip_index: np.ndarray | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Every alpha metric for every row of a run x feature count matrix (dense
+    or CSR), {metric: (n_runs,) float array}. Rows are never looped over in
+    Python and zeros are never touched: per-run sums are bincounts over the
+    CSR non-zeros, and the abundance frequency counts F1..F10 behind Chao1,
+    ACE and Good's coverage come from one more bincount.
+
+      observed_features   S = number of features with a non-zero count
+      shannon             -Σ p·log2 p
+      simpson             1 - Σ p²
+      chao1               S + F1(F1-1) / (2(F2+1))       (bias-corrected)
+      ace                 abundance-based coverage estimator, rare <= 10
+      pielou_evenness     shannon / log2 S
+      goods_coverage      1 - F1 / N
+      faith_pd            Σ branch lengths spanned by the run's features;
+                          only when tree (services.unifrac.TreeArrays) and
+                          tip_index (feature -> tree node) are given
+
+    Undefined values (empty runs, Pielou with S <= 1, ACE with only
+    singletons among the rare features) are NaN.
+    """
+    # everything below works on the CSR non-zeros; dense input is converted once
+    x = sp.csr_matrix(counts, dtype=np.int64)
+    x.eliminate_zeros()
+    n = x.shape[0]
+    s_obs = np.diff(x.indptr).astype(np.float64)
+    row = np.repeat(np.arange(n), np.diff(x.indptr))
+    data = x.data
+    totals = np.bincount(row, weights=data, minlength=n)
+
+    p = data / totals[row]
+    shannon = 0.0 - np.bincount(row, weights=p * np.log2(p), minlength=n)
+    simpson = 1.0 - np.bincount(row, weights=p ** 2, minlength=n)
+
+    # freq[r, k] = number of features seen exactly k times in run r (k <= threshold)
+    k_max = ACE_RARE_THRESHOLD
+    rare = data <= k_max
+    freq = np.bincount(row[rare] * (k_max + 1) + data[rare],
+                       minlength=n * (k_max + 1)).reshape(n, k_max + 1).astype(np.float64)
+    f1, f2 = freq[:, 1], freq[:, 2]
+
+    chao1 = s_obs + f1 * (f1 - 1) / (2.0 * (f2 + 1))
+
+    k = np.arange(k_max + 1)
+    s_rare = freq.sum(axis=1)
+    n_rare = freq @ k
+    s_abund = s_obs - s_rare
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c_ace = 1.0 - f1 / n_rare
+        gamma = s_rare / c_ace * (freq @ (k * (k - 1))) / (n_rare * (n_rare - 1)) - 1.0
+        ace = np.where(c_ace > 0, s_abund + s_rare / c_ace + f1 / c_ace * np.maximum(gamma, 0.0), np.nan)
+        ace = np.where(s_rare == 0, s_abund, ace)           # nothing rare: ACE is S
+        pielou = np.where(s_obs > 1, shannon / np.log2(s_obs), np.nan)
+        goods = 1.0 - f1 / totals
+
+    empty = totals == 0
+    out = {
+        OBSERVED: s_obs,
+        SHANNON: shannon,
+        SIMPSON: simpson,
+        CHAO1: chao1,
+        ACE: ace,
+        PIELOU: pielou,
+        GOODS_COVERAGE: goods,
+    }
+    if tree is not None and tip_index is not None:
+        from src.services.unifrac import node_proportions
+        reached = node_proportions(tree, x, tip_index) > 0        # nodes x runs
+        out[FAITH_PD] = tree.length @ reached
+    for metric, values in out.items():
+        if metric != OBSERVED:
+            values[empty] = np.nan
+    return out
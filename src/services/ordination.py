@@ -0,0 +1,81 @@
+# src/services/ordination.py
+#
+# Principal coordinates analysis (classical MDS) of a distance matrix.
+# The Gower-centred matrix B = -½ H D² H is built in place from row means,
+# never materialising the centering matrix H, and only the top k eigenpairs
+# are solved for: a subset dense solve for small matrices, Lanczos (eigsh)
+# for large ones. The eigenvalues are kept so each axis can report the
+# proportion of variance it explains.
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.linalg import eigh
+from scipy.sparse.linalg import eigsh
+
+N_AXES = 5          # axes stored per run and metric
+# Above this many runs the top-k Lanczos solver beats LAPACK's subset solve
+LANCZOS_MIN_N = 500
+SEED = 42
+
+
+@dataclass
+class PCoAResult:
+    coords: np.ndarray                 # (n, k) run coordinates
+    eigenvalues: np.ndarray            # (k,) descending
+    proportion_explained: np.ndarray   # (k,) eigenvalue / total variance
+
+
+def double_centre(matrix: np.ndarray) -> np.ndarray:
+    """
+    B = -½ H D² H for H = I - 11ᵀ/n, from the row and grand means of D²
+    (D is symmetric, so column means equal row means). One n x n array.
+    """
+    b = np.square(matrix, dtype=np.float64)
+    row_means = b.mean(axis=1)
+    grand_mean = row_means.mean()
+    b -= row_means[:, None]
+    b -= row_means[None, :]
+    b += grand_mean
+    b *= -0.5
+    return b
+
+
+def pcoa(matrix: np.ndarray, k: int = N_AXES, *, method: str = "auto") -> PCoAResult:
+    """
+    Top-k principal coordinates of a symmetric n x n distance matrix.
+    method is "dense" (LAPACK subset solve), "eigsh" (Lanczos) or "auto".
+
+    Negative eigenvalues (non-Euclidean distances) give zero-length axes.
+    Proportions are over the trace of B, the sum of all n eigenvalues, so no
+    full decomposition is needed. Each axis is signed so its largest-magnitude
+    coordinate is positive, keeping plots stable across recomputation.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n = matrix.shape[0]
+    k = max(0, min(k, n - 1))
+    if k == 0:
+        return PCoAResult(np.zeros((n, 0)), np.zeros(0), np.zeros(0))
+
+    b = double_centre(matrix)
+    total = float(np.trace(b))
+
+    if method == "auto":
+        method = "eigsh" if n >= LANCZOS_MIN_N else "dense"
+    if method == "eigsh":
+        v0 = np.random.default_rng(SEED).standard_normal(n)
+        eigenvalues, eigenvectors = eigsh(b, k=k, which="LA", v0=v0)
+    elif method == "dense":
+        eigenvalues, eigenvectors = eigh(b, subset_by_index=[n - k, n - 1], overwrite_a=True)
+    else:
+        raise ValueError(f"Unknown PCoA method: {method!r}")
+
+    order = np.argsort(eigenvalues)[::-1]         # descending
+    eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+
+    pivot = np.abs(eigenvectors).argmax(axis=0)
+    eigenvectors *= np.sign(eigenvectors[pivot, np.arange(k)])
+    coords = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+    proportion = eigenvalues / total if total > 0 else np.zeros(k)
+    return PCoAResult(coords, eigenvalues, proportion)
@@ -0,0 +1,249 @@
+# src/services/project_export.py
+#
+# Columnar export / import of a project's results.
+# Each table (runs, genus, features, feature_counts, alpha, beta, pcoa,
+# pcoa_axes, analysis_stamps, tree) is read with one SELECT and written as
+# one Arrow IPC (.arrow) or Parquet (.parquet) file in a project directory.
+# Arrow files reload as zero-copy memory maps, for notebooks as much as for
+# import; importing creates a new project and bulk-inserts every table with
+# Core executemany batches, with run ids remapped to the new database.
+# The tree travels as Newick text and is written back to a .nwk file under
+# the new project's data directory; ingest times and analysis stamps are
+# kept, so the imported results are not recomputed.
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from src.db.database import SessionLocal
+from src.db.db_models import (
+    AlphaDiversity, AnalysisStamp, BetaDiversity, Feature, FeatureCount, Genus, PCoA, PCoAAxis, Run, Tree,
+)
+from src.db.repository import (
+    EXPORT_TABLES,
+    RepositoryError,
+    bulk_insert_rows,
+    bump_ingest_version,
+    create_project as repo_create_project,
+    get_existing_srr,
+    get_project,
+    get_project_table_columns,
+    get_run_ids_by_srr,
+    get_user,
+)
+from src.services.assessment_service import ServiceError, resolve_newick
+
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+EXPORT_VERSION = "1"
+MANIFEST = "manifest.json"
+IMPORT_DATA_DIR = Path(__file__).resolve().parent.parent / "pipeline" / "data" / "imported"
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401  (registers pa.ipc)
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ServiceError(
+            "pyarrow is required for Parquet / Arrow export.\n"
+            "Install it with:  pip install pyarrow"
+        ) from exc
+    return pa, pq
+
+
+def _pcoa_long(cols: dict[str, list]) -> dict[str, list]:
+    """pcoa rows → one (run_id, metric, axis, value) row per stored axis."""
+    out = {"run_id": [], "metric": [], "axis": [], "value": []}
+    for run_id, metric, pc1, pc2, coords in zip(cols["run_id"], cols["metric"], cols["pc1"],
+                                               cols["pc2"], cols["coords"]):
+        for axis, value in enumerate(coords or [pc1, pc2], start=1):
+            out["run_id"].append(run_id)
+            out["metric"].append(metric)
+            out["axis"].append(axis)
+            out["value"].append(value)
+    return out
+
+
+_SCHEMAS = {
+    "runs": [("run_id", "int64"), ("srr_accession", "string"), ("bio_proj_accession", "string"),
+             ("library_layout", "string"), ("source", "string"), ("risk_score", "float64"),
+             ("risk_label", "string"), ("confidence", "float64"), ("ingested_at", "timestamp")],
+    "genus": [("run_id", "int64"), ("genus", "string"), ("relative_abundance", "float64")],
+    "features": [("feature_id", "string"), ("sequence", "string"), ("taxonomy", "string")],
+    "feature_counts": [("run_id", "int64"), ("feature_id", "string"), ("abundance", "int32")],
+    "alpha": [("run_id", "int64"), ("metric", "string"), ("value", "float64")],
+    "beta": [("run_id_1", "int64"), ("run_id_2", "int64"), ("metric", "string"), ("value", "float64")],
+    "pcoa": [("run_id", "int64"), ("metric", "string"), ("axis", "int16"), ("value", "float64")],
+    "pcoa_axes": [("metric", "string"), ("axis", "int16"), ("eigenvalue", "float64"),
+                  ("proportion_explained", "float64")],
+    "analysis_stamps": [("run_id", "int64"), ("analysis", "string"), ("computed_at", "timestamp")],
+    "tree": [("newick", "string"), ("created_at", "timestamp")],
+}
+
+
+def _arrow_type(pa, typ: str):
+    return pa.timestamp("us", tz="UTC") if typ == "timestamp" else getattr(pa, typ)()
+
+
+def _to_table(pa, name: str, cols: dict[str, list]):
+    schema = pa.schema([(col, _arrow_type(pa, typ)) for col, typ in _SCHEMAS[name]])
+    return pa.table({col: pa.array(cols[col], type=schema.field(col).type) for col in schema.names},
+                    schema=schema)
+
+
+def export_project(project_id: int, out_dir: str | Path, fmt: str = "arrow") -> Path:
+    """
+    Write every export table of a project into out_dir (created if needed),
+    one file per table plus manifest.json. Returns out_dir.
+    fmt is "arrow" (IPC file, memory-mappable) or "parquet" (compressed).
+    """
+    if fmt not in FORMATS:
+        raise ServiceError(f"Unknown export format: {fmt!r}")
+    pa, pq = _arrow()
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    session = SessionLocal()
+    try:
+        project = get_project(session, project_id)
+        name = project.name
+        tables = {t: get_project_table_columns(session, project_id, t) for t in EXPORT_TABLES}
+    except RepositoryError as e:
+        raise ServiceError(str(e)) from e
+    finally:
+        session.close()
+
+    tables["pcoa"] = _pcoa_long(tables["pcoa"])
+    tables["tree"]["newick"] = [resolve_newick(v) for v in tables["tree"]["newick"]]
+    rows = {}
+    for table, cols in tables.items():
+        arrow_table = _to_table(pa, table, cols)
+        path = out / f"{table}{FORMATS[fmt]}"
+        if fmt == "arrow":
+            with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        else:
+            pq.write_table(arrow_table, path)
+        rows[table] = arrow_table.num_rows
+
+    (out / MANIFEST).write_text(json.dumps({
+        "version": EXPORT_VERSION, "format": fmt, "project_name": name, "rows": rows,
+    }, indent=2))
+    return out
+
+
+def load_project_tables(path: str | Path) -> dict:
+    """
+    {table: pyarrow.Table} of an exported project. Arrow IPC files are
+    memory-mapped, so columns are zero-copy views of the files; Parquet
+    files are decoded (from a memory-mapped read).
+    """
+    pa, pq = _arrow()
+    path = Path(path)
+    fmt = json.loads((path / MANIFEST).read_text())["format"]
+    tables = {}
+    for table in EXPORT_TABLES:
+        file = path / f"{table}{FORMATS[fmt]}"
+        if fmt == "arrow":
+            tables[table] = pa.ipc.open_file(pa.memory_map(str(file), "r")).read_all()
+        else:
+            tables[table] = pq.read_table(file, memory_map=True)
+    return tables
+
+
+def _records(table, remap: dict | None = None) -> list[dict]:
+    """Rows of an Arrow table as dicts, with run_id columns mapped through remap."""
+    cols = table.to_pydict()
+    if remap is not None:
+        for col in [c for c in cols if c.startswith("run_id")]:
+            cols[col] = [remap[r] for r in cols[col]]
+    keys = list(cols)
+    return [dict(zip(keys, values)) for values in zip(*cols.values())]
+
+
+def _unknown_run_ids(tables: dict, run_ids: set) -> list:
+    """run ids referenced by a child table but missing from the exported runs table."""
+    seen = set()
+    for table in tables.values():
+        for col in table.column_names:
+            if col.startswith("run_id"):
+                seen.update(table.column(col).to_pylist())
+    return sorted(seen - run_ids)
+
+
+def _write_tree(project_id: int, newick: str) -> str:
+    """Save an imported tree as data/imported/<project_id>/tree.nwk; returns its path."""
+    path = IMPORT_DATA_DIR / str(project_id) / "tree.nwk"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(newick)
+    return str(path)
+
+
+def import_project(path: str | Path, user_id: int, name: str | None = None) -> dict:
+    """
+    Create a new project for user_id from an export directory, in one
+    transaction. Runs get new ids; every child table is remapped to them.
+    Raises ServiceError if any of the runs already exists in this database,
+    or if a table references a run that is not in the export.
+    """
+    tables = load_project_tables(path)
+    manifest = json.loads((Path(path) / MANIFEST).read_text())
+    runs = tables["runs"].to_pydict()
+    unknown = _unknown_run_ids({t: tables[t] for t in EXPORT_TABLES if t != "runs"}, set(runs["run_id"]))
+    if unknown:
+        raise ServiceError(f"Export references runs that are not in its runs table: "
+                           f"{', '.join(map(str, unknown))}")
+
+    session = SessionLocal()
+    try:
+        clash = get_existing_srr(session, runs["srr_accession"])
+        if clash:
+            raise ServiceError(f"Runs already in the database: {', '.join(sorted(clash))}")
+
+        user = get_user(session, user_id)
+        project = repo_create_project(session, user=user, name=name or manifest["project_name"])
+        session.flush()
+        pid = project.project_id
+
+        bulk_insert_rows(session, Run, [
+            {**{k: v for k, v in r.items() if k != "run_id"}, "project_id": pid}
+            for r in _records(tables["runs"])
+        ])
+        by_srr = get_run_ids_by_srr(session, pid)
+        remap = {old: by_srr[srr] for old, srr in zip(runs["run_id"], runs["srr_accession"])}
+
+        bulk_insert_rows(session, Feature, [{**r, "project_id": pid} for r in _records(tables["features"])])
+        bulk_insert_rows(session, FeatureCount,
+                         [{**r, "project_id": pid} for r in _records(tables["feature_counts"], remap)])
+        bulk_insert_rows(session, Genus, _records(tables["genus"], remap))
+        bulk_insert_rows(session, AlphaDiversity, _records(tables["alpha"], remap))
+        bulk_insert_rows(session, BetaDiversity, _records(tables["beta"], remap))
+
+        pcoa = tables["pcoa"].to_pydict()
+        coords: dict[tuple[int, str], list[float]] = {}
+        for run_id, metric, axis, value in zip(pcoa["run_id"], pcoa["metric"], pcoa["axis"], pcoa["value"]):
+            coords.setdefault((remap[run_id], metric), []).append((axis, value))
+        bulk_insert_rows(session, PCoA, [
+            {"run_id": run_id, "metric": metric, "pc1": vals[0], "pc2": vals[1] if len(vals) > 1 else 0.0,
+             "coords": vals if len(vals) > 2 else None}
+            for (run_id, metric), axes in coords.items()
+            for vals in [[v for _, v in sorted(axes)]]
+        ])
+        bulk_insert_rows(session, PCoAAxis, [{**r, "project_id": pid} for r in _records(tables["pcoa_axes"])])
+        bulk_insert_rows(session, AnalysisStamp, _records(tables["analysis_stamps"], remap))
+        bulk_insert_rows(session, Tree, [
+            {"project_id": pid, "newick_path": _write_tree(pid, r["newick"]), "created_at": r["created_at"]}
+            for r in _records(tables["tree"])
+        ])
+        bump_ingest_version(session, pid)
+        session.commit()
+    except RepositoryError as e:
+        session.rollback()
+        raise ServiceError(str(e)) from e
+    except ServiceError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return {"project_id": pid, "runs": len(remap), **{t: tables[t].num_rows for t in EXPORT_TABLES}}
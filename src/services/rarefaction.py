@@ -0,0 +1,135 @@
+# src/services/rarefaction.py
+#
+# Rarefaction: repeated subsampling without replacement of each run's reads
+# at a grid of depths, with alpha diversity computed on every subsample.
+# Each (run, depth) draws all of its subsamples in one vectorised call to
+# numpy's multivariate hypergeometric sampler; metrics are then computed for
+# every subsample at once. Results are five-number summaries per depth, the
+# shape BoxPlotWidget draws and rarefaction curves are plotted from.
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse as sp
+
+from src.services.diversity import OBSERVED, SHANNON, SIMPSON
+
+RAREFACTION_METRICS = (OBSERVED, SHANNON, SIMPSON)
+
+N_DEPTHS = 10       # evenly spaced depths up to the deepest run
+N_ITER = 20         # subsamples per run per depth
+SEED = 42
+# Below this many runs the pool's start-up costs more than it saves
+PARALLEL_MIN_RUNS = 64
+
+
+def rarefaction_depths(totals: np.ndarray, n_depths: int = N_DEPTHS) -> np.ndarray:
+    """
+    Sorted depths: n_depths evenly spaced steps up to the largest run total,
+    plus the smallest non-zero total so every run shares at least one depth.
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    positive = totals[totals > 0]
+    if not len(positive):
+        return np.array([], dtype=np.int64)
+    grid = np.linspace(positive.max() / n_depths, positive.max(), n_depths).astype(np.int64)
+    return np.unique(np.append(grid[grid > 0], positive.min()))
+
+
+def _subsample_metrics(sub: np.ndarray, depth: int) -> dict[str, np.ndarray]:
+    """Alpha metrics for every row of an (n_iter, features) subsample matrix."""
+    p = sub / depth
+    logp = np.log2(p, out=np.zeros_like(p), where=p > 0)
+    return {
+        OBSERVED: (sub > 0).sum(axis=1).astype(np.float64),
+        SHANNON: -(p * logp).sum(axis=1),
+        SIMPSON: 1.0 - (p ** 2).sum(axis=1),
+    }
+
+
+def rarefy_run(
+        counts: np.ndarray,
+        depths: np.ndarray,
+        n_iter: int = N_ITER,
+        rng: np.random.Generator | None = None,
+) -> dict[int, dict[str, np.ndarray]]:
+    """
+    {depth: {metric: values over n_iter subsamples}} for one run's counts.
+    Depths above the run's total read count are skipped.
+    """
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    observed = np.asarray(counts, dtype=np.int64)
+    observed = observed[observed > 0]          # absent features are never drawn
+    total = int(observed.sum())
+    out = {}
+    for depth in depths:
+        depth = int(depth)
+        if depth <= 0 or depth > total:
+            continue
+        sub = rng.multivariate_hypergeometric(observed, depth, size=n_iter)
+        out[depth] = _subsample_metrics(sub, depth)
+    return out
+
+
+def summarise(values: np.ndarray) -> dict[str, float]:
+    """Mean plus the (min, q1, median, q3, max) five-number summary."""
+    lo, q1, med, q3, hi = np.percentile(values, [0, 25, 50, 75, 100])
+    return {"mean": float(np.mean(values)), "minimum": float(lo), "q1": float(q1),
+            "median": float(med), "q3": float(q3), "maximum": float(hi)}
+
+
+def _rarefy_rows(run_id: int, counts: np.ndarray, depths: np.ndarray, n_iter: int, seed: int) -> list[dict]:
+    # seeded on (seed, run_id): a run's draws do not depend on which other
+    # runs are present, their order, or which process handles the run
+    rng = np.random.default_rng([seed, run_id])
+    return [
+        {"run_id": run_id, "metric": metric, "depth": depth, "n_iter": n_iter, **summarise(values)}
+        for depth, metrics in rarefy_run(counts, depths, n_iter, rng).items()
+        for metric, values in metrics.items()
+    ]
+
+
+def rarefy_project(
+        matrix: np.ndarray | sp.spmatrix,
+        run_ids: list[int],
+        *,
+        depths: np.ndarray | None = None,
+        n_iter: int = N_ITER,
+        seed: int = SEED,
+        max_workers: int | None = 1,
+) -> list[dict]:
+    """
+    Rarefaction summary rows for every run (row of matrix, dense or CSR),
+    ready for store_rarefaction_bulk. depths defaults to rarefaction_depths() of the
+    run totals. max_workers=None uses all but one CPU; runs are spread over
+    a process pool only when there are at least PARALLEL_MIN_RUNS of them.
+    """
+    # only each run's non-zero counts are ever sampled from
+    csr = sp.csr_matrix(matrix, dtype=np.int64)
+    csr.eliminate_zeros()
+    observed = np.split(csr.data, csr.indptr[1:-1])
+    if depths is None:
+        depths = rarefaction_depths(np.asarray(csr.sum(axis=1)).ravel())
+    workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+
+    if workers == 1 or len(run_ids) < PARALLEL_MIN_RUNS:
+        per_run = [_rarefy_rows(r, row, depths, n_iter, seed) for r, row in zip(run_ids, observed)]
+    else:
+        # spawn, not fork: the GUI process is multi-threaded (Qt)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            n = len(run_ids)
+            per_run = list(pool.map(_rarefy_rows, run_ids, observed, [depths] * n, [n_iter] * n, [seed] * n,
+                                    chunksize=max(1, n // (4 * workers))))
+    return [row for rows in per_run for row in rows]
+
+
+def common_depth(curves: dict[int, list[dict]]) -> int | None:
+    """Deepest depth reached by every run in {run_id: [row, ...]}, or None."""
+    shared = None
+    for rows in curves.values():
+        depths = {r["depth"] for r in rows}
+        shared = depths if shared is None else shared & depths
+    return max(shared) if shared else None
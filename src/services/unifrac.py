@@ -0,0 +1,262 @@
+# src/services/unifrac.py
+#
+# UniFrac engine on flat tree arrays.
+# A tree (any node object with .name / .length / .children, e.g. ui.pages._TreeNode)
+# is converted once into postorder parent / branch-length arrays. Per-sample
+# subtree proportions for every node are then accumulated for all samples at
+# once, level by level, and pairwise distances come from whole-matrix numpy /
+# scipy operations instead of a Python walk per pair.
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse as sp
+from scipy.spatial.distance import pdist, squareform
+
+from src.services.distance_scheduler import DistanceScheduler
+
+
+@dataclass(frozen=True)
+class TreeArrays:
+    """
+    Nodes are numbered in postorder, so every child index is smaller than
+    its parent's and the root is the last node.
+    parent[root] == -1 and length[root] == 0.
+    levels[h] holds the non-root nodes whose height (edges to their deepest
+    tip) is h; accumulating level by level visits children before parents.
+    """
+    parent:    np.ndarray     # int64, (n_nodes,)
+    length:    np.ndarray     # float64, (n_nodes,) branch length above each node
+    tip_nodes: np.ndarray     # int64, node index of every named tip
+    tip_names: np.ndarray     # object, tip name aligned with tip_nodes
+    levels:    tuple
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.parent)
+
+    @classmethod
+    def from_tree(cls, root) -> "TreeArrays":
+        """Flatten a node tree once (iterative — safe for deep trees)."""
+        order = []
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                order.append(node)
+            else:
+                stack.append((node, True))
+                for c in reversed(node.children):
+                    stack.append((c, False))
+
+        index = {id(node): i for i, node in enumerate(order)}
+        n = len(order)
+        parent = np.full(n, -1, dtype=np.int64)
+        length = np.zeros(n, dtype=np.float64)
+        height = np.zeros(n, dtype=np.int64)
+        tip_nodes, tip_names = [], []
+        for i, node in enumerate(order):
+            for c in node.children:
+                ci = index[id(c)]
+                parent[ci] = i
+                height[i] = max(height[i], height[ci] + 1)   # children already visited
+            if node is not root:
+                length[i] = node.length or 0.0
+            if not node.children and node.name:
+                tip_nodes.append(i)
+                tip_names.append(node.name)
+
+        non_root = np.flatnonzero(parent >= 0)
+        by_height = np.argsort(height[non_root], kind="stable")
+        sorted_nodes = non_root[by_height]
+        bounds = np.searchsorted(height[sorted_nodes], np.arange(height.max() + 2 if n else 1))
+        levels = tuple(sorted_nodes[bounds[h]:bounds[h + 1]] for h in range(len(bounds) - 1)
+                       if bounds[h] < bounds[h + 1])
+        return cls(parent, length, np.asarray(tip_nodes, dtype=np.int64),
+                   np.asarray(tip_names, dtype=object), levels)
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Plain, pickle-free arrays for services/analysis_cache.py (levels flattened)."""
+        sizes = [len(level) for level in self.levels]
+        return {
+            "parent": self.parent,
+            "length": self.length,
+            "tip_nodes": self.tip_nodes,
+            "tip_names": self.tip_names.astype(str),
+            "level_nodes": np.concatenate(self.levels) if self.levels else np.zeros(0, dtype=np.int64),
+            "level_bounds": np.cumsum([0] + sizes).astype(np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> "TreeArrays":
+        """Inverse of to_arrays(); arrays may be read-only memory maps."""
+        nodes, bounds = arrays["level_nodes"], arrays["level_bounds"]
+        levels = tuple(nodes[bounds[h]:bounds[h + 1]] for h in range(len(bounds) - 1))
+        return cls(arrays["parent"], arrays["length"], arrays["tip_nodes"],
+                   np.asarray(arrays["tip_names"], dtype=object), levels)
+
+    def tip_index(self, feature_ids) -> np.ndarray:
+        """Node index for each feature id, -1 where the feature is not a tip of the tree."""
+        lookup = dict(zip(self.tip_names.tolist(), self.tip_nodes.tolist()))
+        return np.array([lookup.get(f, -1) for f in feature_ids], dtype=np.int64)
+
+
+def node_proportions(
+        tree: TreeArrays,
+        counts: np.ndarray | sp.spmatrix,
+        tip_index: np.ndarray,
+) -> np.ndarray:
+    """
+    nodes x samples matrix of each node's subtree share of each sample.
+    counts is samples x features (dense or CSR); tip_index maps features to
+    tree nodes. Proportions are relative to the sample's total count, so
+    reads from features that are not on the tree still count towards the total.
+    """
+    counts = sp.csr_matrix(counts, dtype=np.float64)
+    totals = np.asarray(counts.sum(axis=1)).ravel()
+    scale = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    props = sp.diags(scale) @ counts
+
+    # tips: one sparse product (nodes x features) @ (features x samples)
+    on_tree = np.flatnonzero(tip_index >= 0)
+    assign = sp.csr_matrix((np.ones(len(on_tree)), (tip_index[on_tree], on_tree)),
+                           shape=(tree.n_nodes, counts.shape[1]))
+    node_p = np.ascontiguousarray((assign @ props.T).toarray())
+    # children are always finished before their level pushes into parents
+    for nodes in tree.levels:
+        np.add.at(node_p, tree.parent[nodes], node_p[nodes])
+    return node_p
+
+
+def _branches(tree: TreeArrays, node_p: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Drop the root, zero-length branches and branches no sample reaches."""
+    keep = (tree.parent >= 0) & (tree.length > 0) & node_p.any(axis=1)
+    return node_p[keep].T, tree.length[keep]
+
+
+# beta_div / pcoa metric keys, one per variant
+UNWEIGHTED = "unweighted_unifrac"
+WEIGHTED = "weighted_unifrac"                        # Σ l·|pA − pB|
+WEIGHTED_NORMALIZED = "weighted_normalized_unifrac"  # ... / Σ l·(pA + pB)
+GENERALIZED = "generalized_unifrac"
+UNIFRAC_METRICS = (UNWEIGHTED, WEIGHTED, WEIGHTED_NORMALIZED, GENERALIZED)
+
+# Chen et al. (2012) recommend alpha = 0.5 as a balance between the
+# unweighted (alpha -> 0) and weighted (alpha = 1) extremes.
+GENERALIZED_ALPHA = 0.5
+
+# Upper bound on the broadcast temporary in generalized UniFrac, in bytes.
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _pair_sums(values: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+    left = values if rows is None else values[rows]
+    return left[:, None] + values[None, :]
+
+
+def _safe_divide(num: np.ndarray, den: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+    out = np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+    if rows is None:
+        np.fill_diagonal(out, 0.0)
+    else:
+        out[np.arange(len(rows)), rows] = 0.0      # each selected run against itself
+    return out
+
+
+def _generalized(p: np.ndarray, l: np.ndarray, alpha: float, block_bytes: int,
+                 scheduler: DistanceScheduler | None = None) -> np.ndarray:
+    """
+    Σ l·(pA+pB)^α·|pA−pB|/(pA+pB)  /  Σ l·(pA+pB)^α, over row blocks of the
+    upper triangle so the (rows, n, branches) temporary fits in block_bytes.
+    """
+    if scheduler is not None:
+        num, den = scheduler.pairwise("generalized_unifrac", {"p": p, "l": l},
+                                      alpha=alpha, block_bytes=block_bytes)
+        return _safe_divide(num, den)
+    n, k = p.shape
+    num = np.zeros((n, n))
+    den = np.zeros((n, n))
+    # about four (rows, n, k) float64 temporaries are live at once
+    step = max(1, block_bytes // (4 * 8 * max(n, 1) * max(k, 1)))
+    for r0 in range(0, n, step):
+        r1 = min(r0 + step, n)
+        a, b = p[r0:r1, None, :], p[None, r0:, :]
+        total = a + b
+        weight = l * np.power(total, alpha, out=np.zeros_like(total), where=total > 0)
+        den[r0:r1, r0:] = weight.sum(axis=2)
+        frac = np.divide(np.abs(a - b), total, out=np.zeros_like(total), where=total > 0)
+        num[r0:r1, r0:] = (weight * frac).sum(axis=2)
+    num = np.triu(num) + np.triu(num, 1).T
+    den = np.triu(den) + np.triu(den, 1).T
+    return _safe_divide(num, den)
+
+
+def unifrac_matrices(
+        tree: TreeArrays,
+        counts: np.ndarray,
+        tip_index: np.ndarray,
+        metrics: tuple = UNIFRAC_METRICS,
+        *,
+        alpha: float = GENERALIZED_ALPHA,
+        block_bytes: int = BLOCK_BYTES,
+        scheduler: DistanceScheduler | None = None,
+        rows: np.ndarray | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Pairwise UniFrac distances for every requested variant, keyed by metric.
+    The postorder accumulation (node_proportions) runs once and is shared:
+      unweighted            Σ l·[pA>0 xor pB>0] / Σ l·[pA>0 or pB>0]
+      weighted              Σ l·|pA − pB|
+      weighted_normalized   Σ l·|pA − pB| / Σ l·(pA + pB)
+      generalized (alpha)   Σ l·(pA+pB)^α·|pA−pB|/(pA+pB) / Σ l·(pA+pB)^α
+    With a scheduler, the pairwise sums run as tiles on its process pool over
+    the shared runs x branches matrix; otherwise everything runs in-process.
+    With rows, only the len(rows) x n block of those runs against every run
+    is computed (incremental recomputation after new runs are ingested).
+    """
+    p, l = _branches(tree, node_proportions(tree, counts, tip_index))
+    n = p.shape[0]
+    if rows is not None:
+        rows = np.asarray(rows, dtype=np.int64)
+        # rectangular blocks always go through tiles; in-process unless a pool pays off
+        scheduler = scheduler or DistanceScheduler(max_workers=1)
+    if n < 2:
+        return {m: np.zeros((n if rows is None else len(rows), n)) for m in metrics}
+
+    def cityblock(x: np.ndarray) -> np.ndarray:
+        if rows is not None:
+            return scheduler.pairwise_rows("cityblock", {"x": x}, rows)
+        if scheduler is not None:
+            return scheduler.pairwise("cityblock", {"x": x})
+        return squareform(pdist(x, "cityblock"))
+
+    out: dict[str, np.ndarray] = {}
+    if WEIGHTED in metrics or WEIGHTED_NORMALIZED in metrics:
+        lp = p * l
+        num = cityblock(lp)
+        if WEIGHTED in metrics:
+            out[WEIGHTED] = num
+        if WEIGHTED_NORMALIZED in metrics:
+            out[WEIGHTED_NORMALIZED] = _safe_divide(num, _pair_sums(lp.sum(axis=1), rows), rows)
+    if UNWEIGHTED in metrics:
+        present = (p > 0) * l
+        unique = cityblock(present)                                       # branches in exactly one
+        union = (_pair_sums(present.sum(axis=1), rows) + unique) / 2.0     # |A ∪ B| = (|A|+|B|+|A△B|)/2
+        out[UNWEIGHTED] = _safe_divide(unique, union, rows)
+    if GENERALIZED in metrics:
+        if rows is not None:
+            num, den = scheduler.pairwise_rows("generalized_unifrac", {"p": p, "l": l}, rows,
+                                               alpha=alpha, block_bytes=block_bytes)
+            out[GENERALIZED] = _safe_divide(num, den, rows)
+        else:
+            out[GENERALIZED] = _generalized(p, l, alpha, block_bytes, scheduler)
+    return {m: out[m] for m in metrics}
+
+
+def weighted_normalized_unifrac(tree: TreeArrays, counts: np.ndarray, tip_index: np.ndarray) -> np.ndarray:
+    """
+    Pairwise normalised weighted UniFrac:  Σ l·|pA − pB| / Σ l·(pA + pB).
+    Matches the per-pair implementation previously in _UnifracWorker.
+    """
+    return unifrac_matrices(tree, counts, tip_index, (WEIGHTED_NORMALIZED,))[WEIGHTED_NORMALIZED]
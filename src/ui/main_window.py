@@ -13,6 +13,7 @@ Start-up flow:
 
 from __future__ import annotations
 import os
+from datetime import datetime
 
 from pathlib import Path
 
@@ -23,6 +24,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, QObject, pyqtSignal
 
 import numpy as np
+from scipy import sparse as sp
 
 from src.services.assessment_service import ServiceError
 
@@ -39,10 +41,12 @@ from ui.export_page import ExportPage
 from ui.auth_page import AuthPage
 from ui.profile_page import ProfilePage
 
+from src.pipeline.budget import describe as describe_budget
 from src.pipeline.qiime2_runner import QiimeRunner
-from src.pipeline.qiime_preproc import download_classifier, qiime_preprocess, infer_phylogeny
+from src.pipeline.qiime_preproc import download_classifier, run_preprocessing, infer_phylogeny
 from src.pipeline.fetch_data import (fetch_runs, download_runs, 
                                      write_manifest, cleanup)
+from src.pipeline.fastq_io import find_fastq, validate_fastq_header
 from src.pipeline.db_import import (parse_feat_tax_seqs, parse_feature_counts,
                                     parse_genus_table)
 
@@ -51,13 +55,23 @@ from src.risk.run_assess import run_assess
 from src.simulation.simulate_gmb import simulate, plot_sim_results, get_abundance_shift_stats
 
 from src.services.assessment_service import (save_ncbi_project, get_genus_dict, 
-                                             create_run,ingest_run_data, 
-                                             get_run_id_by_srr, get_feature_counts,
-                                             get_tree, store_alpha_diversities,
-                                             store_beta_diversity, ServiceError,
-                                             get_beta_diversity_matrix, store_pcoa,
-                                             create_tree_instance, get_run_feature_ids,
+                                             create_run,ingest_run_data, ingest_project_features,
+                                             get_run_id_by_srr,
+                                             get_tree, store_alpha_diversities_bulk,
+                                             store_beta_diversity_matrix, ServiceError,
+                                             get_beta_diversity_matrix, store_pcoa_ordination,
+                                             store_rarefaction_bulk, get_rarefaction_curves,
+                                             store_beta_diversity_rows, count_beta_pairs,
+                                             get_dirty_runs, mark_runs_analysed,
+                                             create_tree_instance,
                                              create_simulation, ingest_simulation_genus)
+from src.services.analysis_cache import beta_key, default_cache, tree_key
+from src.services.count_matrix import CountMatrix, get_cached_count_matrix
+from src.services.diversity import alpha_diversity, braycurtis_matrix, braycurtis_rows, SHANNON
+from src.services.distance_scheduler import DistanceScheduler
+from src.services.ordination import pcoa, N_AXES
+from src.services.rarefaction import rarefy_project, rarefaction_depths
+from src.services.unifrac import TreeArrays, unifrac_matrices, UNIFRAC_METRICS
 
 # ── Sidebar nav ───────────────────────────────────────────────────────────────
 
@@ -138,35 +152,37 @@ class _DownloadWorkerReal(QObject):
             if self._state.single_runs:
                 fastq_dir = APP_DIR / f"data/{self._state.bioproject_id}/fastq/single"
                 for srr in self._state.single_runs:
-                    if (fastq_dir / f"{srr}.fastq").exists():
+                    if find_fastq(fastq_dir, srr):
                         self.progress.emit(f"✓ {srr} — already on disk, skipping")
                         skipped += 1
                     else:
                         self.progress.emit(f"Downloading {srr} (single-end)… [{ok+skipped+1}/{total}]")
                 download_runs(runner=self._runner, bioproject=self._state.bioproject_id,
-                              lib_layout='single', runs=self._state.single_runs, state=self._state)
+                              lib_layout='single', runs=self._state.single_runs, state=self._state,
+                              callback=self.progress.emit)
                 write_manifest(self._state.bioproject_id, lib_layout='single', state=self._state)
                 for srr in self._state.single_runs:
                     if self._state.runs.get(srr, {}).get('uploaded'):
                         ok += 1
-                    elif not (fastq_dir / f"{srr}.fastq").exists():
+                    elif not find_fastq(fastq_dir, srr):
                         failed_srrs.append(srr)
 
             if self._state.paired_runs:
                 fastq_dir = APP_DIR / f"data/{self._state.bioproject_id}/fastq/paired"
                 for srr in self._state.paired_runs:
-                    if (fastq_dir / f"{srr}_1.fastq").exists():
+                    if find_fastq(fastq_dir, f"{srr}_1"):
                         self.progress.emit(f"✓ {srr} — already on disk, skipping")
                         skipped += 1
                     else:
                         self.progress.emit(f"Downloading {srr} (paired-end)… [{ok+skipped+1}/{total}]")
                 download_runs(runner=self._runner, bioproject=self._state.bioproject_id,
-                              lib_layout='paired', runs=self._state.paired_runs, state=self._state)
+                              lib_layout='paired', runs=self._state.paired_runs, state=self._state,
+                              callback=self.progress.emit)
                 write_manifest(self._state.bioproject_id, lib_layout='paired', state=self._state)
                 for srr in self._state.paired_runs:
                     if self._state.runs.get(srr, {}).get('uploaded'):
                         ok += 1
-                    elif not (fastq_dir / f"{srr}_1.fastq").exists():
+                    elif not find_fastq(fastq_dir, f"{srr}_1"):
                         failed_srrs.append(srr)
 
             # Emit a summary for the topbar badge only (not status panel)
@@ -222,6 +238,7 @@ class _PipelineWorkerReal(QObject):
     finished = pyqtSignal(object)   # emits updated AppState
     errored  = pyqtSignal(str)
     progress = pyqtSignal(str)
+    resources = pyqtSignal(str)     # running / queued subprocesses ('' when idle)
 
     def __init__(self, runner: QiimeRunner, bioproject: str, state: AppState) -> None:
         super().__init__()
@@ -276,31 +293,26 @@ class _PipelineWorkerReal(QObject):
             if msg:
                 self.progress.emit(msg)
 
-        try:
-            # preprocess the paired end fastq files
-            if self._state.paired_runs:
-                qiime_preprocess(runner=self._runner, bioproject=self._bioproject,
-                                    lib_layout='paired', state=self._state, callback=cb)
+        # budget listeners fire on the pipeline's threads; the signal queues
+        # each update onto the UI thread
+        def on_budget(snapshot):
+            self.resources.emit(describe_budget(snapshot))
 
-            # preprocess the single end fastq files
-            if self._state.single_runs:
-                qiime_preprocess(runner=self._runner, bioproject=self._bioproject,
-                                    lib_layout='single', state=self._state, callback=cb)
-
-            # Infer phylogenetic tree (one per project — prefer single layout)
-            self.progress.emit("[phylogeny] Building phylogenetic tree…")
-            nwk = ""
-            if self._state.single_runs:
-                nwk = infer_phylogeny(runner=self._runner, bioproject=self._bioproject,
-                                      lib_layout='single', state=self._state, callback=cb)
-            elif self._state.paired_runs:
-                nwk = infer_phylogeny(runner=self._runner, bioproject=self._bioproject,
-                                      lib_layout='paired', state=self._state, callback=cb)
+        self._runner.budget.add_listener(on_budget)
+        try:
+            # preprocess both layouts concurrently and build the phylogenetic
+            # tree (one per project — prefers the single layout); steps whose
+            # inputs are unchanged since the last run are skipped
+            nwk = run_preprocessing(runner=self._runner, bioproject=self._bioproject,
+                                    state=self._state, callback=cb)
             self._state._nwk_string = nwk
 
             self.finished.emit(self._state)
         except Exception as exc:
             self.errored.emit(str(exc))
+        finally:
+            self._runner.budget.remove_listener(on_budget)
+            self.resources.emit("")
 
 
 class _ParseWorkerReal(QObject):
@@ -330,6 +342,8 @@ class _ParseWorkerReal(QObject):
                                                    seqs=f"{self._data_dir}/reps-tree/paired/dna-sequences.fasta")
                 feature_counts = parse_feature_counts(feat=f"{self._data_dir}/qiime/paired/feature-table.tsv")
                 all_feature_seqs.extend(feature_seqs)
+                # ASV sequences / taxonomy are stored once per project, not once per run
+                ingest_project_features(self._state.db_project_id, feature_seqs)
                 for row in abundances.values():
                     all_genera.update(g for g, _ in row)
 
@@ -347,7 +361,7 @@ class _ParseWorkerReal(QObject):
                         run_id = db_run['run_id']
                         label = self._state.runs[run]['label']
                         self._state.lbs[label] = run_id
-                    ingest_run_data(run_id=run_id, genus_rows=row, features=feature_seqs,
+                    ingest_run_data(run_id=run_id, genus_rows=row, features=None,
                                     feature_counts=feature_counts.get(run, {}))
 
             # parse the single end tables
@@ -357,6 +371,8 @@ class _ParseWorkerReal(QObject):
                                                    seqs=f"{self._data_dir}/reps-tree/single/dna-sequences.fasta")
                 feature_counts = parse_feature_counts(feat=f"{self._data_dir}/qiime/single/feature-table.tsv")
                 all_feature_seqs.extend(feature_seqs)
+                # ASV sequences / taxonomy are stored once per project, not once per run
+                ingest_project_features(self._state.db_project_id, feature_seqs)
                 for row in abundances.values():
                     all_genera.update(g for g, _ in row)
 
@@ -374,7 +390,7 @@ class _ParseWorkerReal(QObject):
                         run_id = db_run['run_id']
                         label = self._state.runs[run]['label']
                         self._state.lbs[label] = run_id
-                    ingest_run_data(run_id=run_id, genus_rows=row, features=feature_seqs,
+                    ingest_run_data(run_id=run_id, genus_rows=row, features=None,
                                     feature_counts=feature_counts.get(run, {}))
 
             self._state.asv_count   = len(all_feature_seqs)
@@ -417,6 +433,18 @@ class _ParseWorkerReal(QObject):
                 pass
 
 
+def _pair_progress(signal, what: str):
+    """DistanceScheduler progress callback that emits '<what>… N%' in 10% steps."""
+    last = [-1]
+
+    def report(done: int, total: int) -> None:
+        pct = 100 * done // max(total, 1)
+        if pct // 10 != last[0]:
+            last[0] = pct // 10
+            signal.emit(f"{what}… {pct}%")
+    return report
+
+
 class _AnalysisWorkerReal(QObject):
 
     finished = pyqtSignal(object)   # emits updated AppState
@@ -428,211 +456,232 @@ class _AnalysisWorkerReal(QObject):
         self._state = state
 
     def run(self):
+        # Incremental: only runs ingested since their last analysis are
+        # recomputed (alpha for those runs, beta for their pairs with every
+        # run); a fresh project has every run dirty and takes the full path.
         try:
-            self.progress.emit("Computing alpha diversity")
-            self._fill_alpha(self._state.lbs)
-
-            if self._state.run_count > 1:    
-                self.progress.emit("Computing Bray-Curtis beta diversity")
-                self._fill_bray_curtis(self._state, self._state.lbs)
-                
-                self.progress.emit("Computing PCoA…")
-                self._fill_pcoa(self._state, self._state.lbs, "bray_curtis")
-            
+            labels = self._state.lbs
+            dirty = self._dirty_labels(self._state, labels, "alpha")
+            if dirty:
+                self.progress.emit(f"Computing alpha diversity ({len(dirty)} run(s))")
+                if self._fill_alpha(self._state, dirty):
+                    self.progress.emit("Computing rarefaction curves…")
+                    self._fill_rarefaction(self._state, labels, dirty)
+                    self._mark_analysed(dirty, "alpha")
+
+            if self._state.run_count > 1:
+                dirty = self._dirty_labels(self._state, labels, "bray_curtis")
+                if dirty:
+                    self.progress.emit("Computing Bray-Curtis beta diversity")
+                    scheduler = DistanceScheduler(
+                        progress=_pair_progress(self.progress, "Computing Bray-Curtis beta diversity"))
+                    if self._fill_bray_curtis(self._state, labels, scheduler, dirty=dirty):
+                        self.progress.emit("Computing PCoA…")
+                        self._fill_pcoa(self._state, labels, "bray_curtis")
+                        self._mark_analysed(dirty, "bray_curtis")
+
             self.finished.emit(self._state)
         except Exception as exc:
             self.errored.emit(str(exc))
 
     @staticmethod
-    def _shannon(counts: np.ndarray) -> float:
-        total = counts.sum()
-        if total == 0:
-            return 0.0
-        p = counts[counts > 0] / total
-        return float(-np.sum(p * np.log2(p)))
+    def _dirty_labels(state: AppState, labels: dict, analysis: str, since=None) -> dict:
+        """
+        The subset of labels whose runs analysis has not covered since they
+        were ingested (or since `since`). All labels when that is unknown.
+        """
+        try:
+            dirty = set(get_dirty_runs(state.db_project_id, analysis, since=since))
+        except ServiceError:
+            return dict(labels)
+        return {lbl: run_id for lbl, run_id in labels.items() if run_id in dirty}
 
     @staticmethod
-    def _simpson(counts: np.ndarray) -> float:
-        total = counts.sum()
-        if total == 0:
-            return 0.0
-        p = counts / total
-        return float(1.0 - np.sum(p ** 2))
+    def _mark_analysed(labels: dict, analysis: str) -> None:
+        try:
+            mark_runs_analysed(list(labels.values()), analysis)
+        except ServiceError:
+            pass
 
     @staticmethod
-    def _fill_alpha(labels: dict) -> None:
-        for run_id in labels.values():
-            try:
-                rows = get_feature_counts(run_id)
-            except ServiceError:
-                continue
-
-            if not rows:
-                continue
+    def _incremental_rows(labels: dict, dirty: dict | None, metric: str) -> list[int] | None:
+        """
+        Row positions (in labels order) of the dirty runs when only their
+        pairs need computing, or None for a full recomputation: when every
+        run is dirty, or the pairs among the clean runs are not all stored
+        (e.g. runs re-parented from different projects).
+        """
+        if dirty is None or len(dirty) >= len(labels):
+            return None
+        clean = [run_id for lbl, run_id in labels.items() if lbl not in dirty]
+        try:
+            stored = count_beta_pairs(clean, metric)
+        except ServiceError:
+            return None
+        if stored != len(clean) * (len(clean) - 1) // 2:
+            return None
+        return [i for i, lbl in enumerate(labels) if lbl in dirty]
 
-            counts = np.array([r["abundance"] for r in rows], dtype=int)
+    @staticmethod
+    def _project_counts(state: AppState, labels: dict) -> tuple[CountMatrix, sp.csr_matrix] | None:
+        """
+        CSR rows of the shared project count matrix for labels' runs, in labels
+        order. The int32 CSR matrix is loaded once per ingest_version and
+        cached on the AppState; the diversity kernels take it as is.
+        """
+        try:
+            cm = get_cached_count_matrix(state.count_matrices, state.db_project_id, as_sparse=True)
+        except ServiceError:
+            return None
+        return cm, cm.rows_for(list(labels.values()), sparse=True)
 
-            sh = _AnalysisWorkerReal._shannon(counts)
-            si = _AnalysisWorkerReal._simpson(counts)
+    @staticmethod
+    def _fill_alpha(state: AppState, labels: dict, tree: TreeArrays | None = None) -> bool:
+        """
+        Every alpha metric for every run in labels in one vectorised pass over
+        the project count matrix (services/diversity.py). Faith's PD is added
+        when the project's tree is available. Runs are independent, so labels
+        may be just the dirty runs. Returns False when nothing could be stored.
+        """
+        loaded = _AnalysisWorkerReal._project_counts(state, labels)
+        if loaded is None:
+            return False
+        cm, matrix = loaded
+        if tree is None:
+            tree = _UnifracWorker._load_tree_arrays(state.db_project_id)
+        tips = tree.tip_index(cm.feature_ids) if tree is not None else None
+        values = alpha_diversity(matrix, tree=tree, tip_index=tips)
+
+        ingested = matrix.getnnz(axis=1) > 0        # runs with nothing ingested are skipped
+        metrics_by_run: dict[int, dict[str, float]] = {
+            run_id: {metric: column[i] for metric, column in values.items()}
+            for i, run_id in enumerate(labels.values()) if ingested[i]
+        }
 
+        # one DELETE + one executemany for every run instead of a transaction per run
+        if metrics_by_run:
             try:
-                store_alpha_diversities(run_id, {"shannon": sh, "simpson": si})
+                store_alpha_diversities_bulk(metrics_by_run, list(values))
             except ServiceError:
-                continue
+                return False
+        return True
 
     @staticmethod
-    def _fill_bray_curtis(state: AppState, labels: dict) -> None:
-        # Bray-Curtis: BC(u,v) = sum|u-v| / sum(u+v); 0/0 → 0
-        def _braycurtis(mat: np.ndarray) -> np.ndarray:
-            n = mat.shape[0]
-            bc = np.zeros((n, n))
-            for _i in range(n):
-                for _j in range(_i + 1, n):
-                    num = np.abs(mat[_i] - mat[_j]).sum()
-                    den = (mat[_i] + mat[_j]).sum()
-                    v   = num / den if den > 0 else 0.0
-                    bc[_i, _j] = bc[_j, _i] = v
-            return bc
-
-        run_ids = list(labels.values())
-        run_labels = list(labels.keys())
-
-        # ASV counts of all feature ids per run
-        counts_per_run: dict[int, dict[str, int]] = {}
-
-        try:
-            first_run_id = list(labels.values())[0]
-            feature_ids = get_run_feature_ids(first_run_id)
-        except (ServiceError, IndexError, Exception):
+    def _fill_rarefaction(state: AppState, labels: dict, dirty: dict | None = None) -> None:
+        """
+        Seeded, vectorised subsampling of each run at a shared grid of depths
+        (services/rarefaction.py); five-number summaries go to the rarefaction
+        table. Only dirty runs are redrawn, plus any stored run whose depths
+        no longer match the grid (a new run changed the deepest or shallowest total).
+        """
+        loaded = _AnalysisWorkerReal._project_counts(state, labels)
+        if loaded is None:
             return
-
-        if not feature_ids:
+        _, matrix = loaded
+        totals = np.asarray(matrix.sum(axis=1)).ravel()
+        if not totals.any():
             return
+        depths = rarefaction_depths(totals)
+        run_ids = list(labels.values())
 
-        for run_id in run_ids:
+        todo = set(run_ids if dirty is None else dirty.values())
+        if len(todo) < len(run_ids):
             try:
-                rows = get_feature_counts(run_id)
-                counts_per_run[run_id] = {r['feature_id']: int(r['abundance']) for r in rows}
+                stored = get_rarefaction_curves(state.db_project_id, SHANNON)
             except ServiceError:
-                counts_per_run[run_id] = {}
-
-        # rows = samples (runs), columns = OTUs (features)
-        # missing features for a run get count 0
-        count_matrix = np.array(
-            [
-                [counts_per_run[run_id].get(fid, 0) for fid in feature_ids]
-                for run_id in run_ids
-            ],
-            dtype=float,
-        )
-
-        bc_matrix = _braycurtis(count_matrix)
-
-        for i, label_a in enumerate(run_labels):
-            for j, label_b in enumerate(run_labels):
-                if j <= i:
-                    continue
-                value = float(bc_matrix[i, j])
-                id_a  = labels[label_a]
-                id_b  = labels[label_b]
-                id_lo, id_hi = sorted([id_a, id_b])
-                try:
-                    store_beta_diversity(id_lo, id_hi, "bray_curtis", value)
-                except ServiceError:
-                    continue
-        
-        state.count_matrix = count_matrix # will be used later for unifrac
+                stored = {}
+            for run_id, total in zip(run_ids, totals):
+                expected = {int(d) for d in depths if d <= total}
+                if {r["depth"] for r in stored.get(run_id, [])} != expected:
+                    todo.add(run_id)
+
+        sel = [i for i, run_id in enumerate(run_ids) if run_id in todo and totals[i] > 0]
+        if not sel:
+            return
+        sel_ids = [run_ids[i] for i in sel]
+        rows = rarefy_project(matrix[sel], sel_ids, depths=depths, max_workers=None)
+        try:
+            store_rarefaction_bulk(sel_ids, rows)
+        except ServiceError:
+            pass
 
     @staticmethod
-    def _build_dissimilarity_matrix(
-        labels: list[str],
-        flat: list[dict],
-        run_id_map: dict[str, int],
-    ) -> np.ndarray:
-        """
-        Reconstruct a symmetric nxn dissimilarity matrix from the flat
-        upper-triangle rows returned by get_beta_diversity_matrix().
-    
-        flat rows: {"run_id_1": int, "run_id_2": int, "metric": str, "value": float}
-        Diagonal is 0.0 (a sample is identical to itself).
-        """
-        n         = len(labels)
-        mat       = np.zeros((n, n), dtype=float)
-        id_to_idx = {
-            run_id_map[lbl]: i
-            for i, lbl in enumerate(labels)
-            if lbl in run_id_map
-        }
-        for row in flat:
-            i = id_to_idx.get(row["run_id_1"])
-            j = id_to_idx.get(row["run_id_2"])
-            if i is not None and j is not None:
-                val       = float(row["value"])
-                mat[i, j] = val
-                mat[j, i] = val
-        return mat
-    
-    @staticmethod
-    def _pcoa_from_matrix(
-        labels: list[str],
-        matrix: np.ndarray,
-    ) -> dict[str, tuple[float, float]]:
-        """
-        Classical MDS via numpy.linalg.eigh on a symmetric dissimilarity matrix.
-        Returns {label: (pc1, pc2)}.
-    
-        eigh solves the full eigenproblem exactly for symmetric matrices and
-        returns eigenvalues in ascending order — we reverse to get descending.
-        Negative eigenvalues (numerical artefacts from non-Euclidean distances)
-        are clamped to zero before taking the square root.
-        """
-        from numpy.linalg import eigh
+    def _fill_bray_curtis(state: AppState, labels: dict,
+                          scheduler: DistanceScheduler | None = None,
+                          dirty: dict | None = None) -> bool:
+        # Bray-Curtis: BC(u,v) = sum|u-v| / sum(u+v); 0/0 → 0
+        # rows = samples (runs), columns = union of the project's features
+        loaded = _AnalysisWorkerReal._project_counts(state, labels)
+        if loaded is None or loaded[1].shape[1] == 0:
+            return False
+        matrix = loaded[1]
+
+        rows = _AnalysisWorkerReal._incremental_rows(labels, dirty, "bray_curtis")
+        try:
+            if rows is not None:
+                # new runs against every run: m x n pairs instead of n²
+                block = braycurtis_rows(matrix, rows, scheduler=scheduler)
+                run_ids = list(labels.values())
+                store_beta_diversity_rows(state.db_project_id, "bray_curtis",
+                                          [run_ids[i] for i in rows], run_ids, block)
+            else:
+                # blocked, vectorised kernel — bounded memory for hundreds of runs;
+                # with a scheduler, tiles of the upper triangle run on a process pool
+                bc_matrix = braycurtis_matrix(matrix, scheduler=scheduler)
+                # whole upper triangle in one transaction
+                store_beta_diversity_matrix(state.db_project_id, "bray_curtis", labels, bc_matrix)
+        except ServiceError:
+            return False
+        return True
 
-        n = len(labels)
-        if n < 2:
-            return {lbl: (0.0, 0.0) for lbl in labels}
-    
-        # Double-centre: B = -0.5 * H D² H,  H = I - (1/n) 11ᵀ
-        d2  = matrix ** 2
-        H   = np.eye(n) - np.ones((n, n)) / n
-        B   = -0.5 * H @ d2 @ H
-    
-        eigenvalues, eigenvectors = eigh(B)
-        eigenvalues  = eigenvalues[::-1]      # descending
-        eigenvectors = eigenvectors[:, ::-1]
-    
-        pc1 = eigenvectors[:, 0] * np.sqrt(max(eigenvalues[0], 0.0))
-        pc2 = eigenvectors[:, 1] * np.sqrt(max(eigenvalues[1], 0.0))
-    
-        return {
-            labels[i]: (round(float(pc1[i]), 4), round(float(pc2[i]), 4))
-            for i in range(n)
-        }
-    
     @staticmethod
     def _fill_pcoa(state: AppState, labels: dict[str, int], metric: str) -> None:
         """
-        Derive and store PCoA coordinates from the already-computed beta matrix.
+        Derive and store PCoA coordinates from the already-computed beta matrix:
+        the top N_AXES axes per run plus each axis's eigenvalue and share of
+        variance (services/ordination.py).
         """
+        # Only use run labels that were actually ingested (present in lbs)
+        run_labels = [lbl for lbl in state.run_labels if lbl in labels]
+        if not run_labels:
+            return
         try:
-            flat = get_beta_diversity_matrix(state.db_project_id, metric)
+            matrix, _ = get_beta_diversity_matrix(
+                state.db_project_id, metric, [labels[lbl] for lbl in run_labels]
+            )
         except ServiceError:
             return
 
-        if flat:
-            # Only use run labels that were actually ingested (present in lbs)
-            run_labels = [lbl for lbl in state.run_labels if lbl in labels]
-            if not run_labels:
-                return
-            matrix = _AnalysisWorkerReal._build_dissimilarity_matrix(run_labels, flat, labels)
-            coords = _AnalysisWorkerReal._pcoa_from_matrix(run_labels, matrix)
+        if not matrix.size:
+            return
+        result = pcoa(matrix, N_AXES)
+        coords = {labels[lbl]: result.coords[i] for i, lbl in enumerate(run_labels)}
+        try:
+            store_pcoa_ordination(state.db_project_id, metric, coords,
+                                  result.eigenvalues, result.proportion_explained)
+        except ServiceError:
+            return
+        _AnalysisWorkerReal._cache_beta(state, metric, list(coords), matrix, result)
 
-            for label, (pc1, pc2) in coords.items():
-                run_id = labels[label]
-                try:
-                    store_pcoa(run_id, metric, pc1, pc2)
-                except ServiceError:
-                    continue
+    @staticmethod
+    def _cache_beta(state: AppState, metric: str, run_ids: list[int], matrix: np.ndarray, result) -> None:
+        """
+        Write the matrix and its ordination to the on-disk analysis cache,
+        keyed by the counts (and tree) they came from, so reopening the
+        project memory-maps them instead of rebuilding them from the DB.
+        """
+        try:
+            cm = get_cached_count_matrix(state.count_matrices, state.db_project_id, as_sparse=True)
+            newick = get_tree(state.db_project_id)["newick_string"] if metric.endswith("unifrac") else None
+            default_cache().store(state.db_project_id, f"beta-{metric}", beta_key(cm.digest, metric, newick), {
+                "run_ids": np.asarray(run_ids, dtype=np.int64),
+                "matrix": matrix,
+                "coords": result.coords,
+                "eigenvalues": result.eigenvalues,
+                "proportion_explained": result.proportion_explained,
+            })
+        except (ServiceError, OSError) as exc:
+            print(f"Analysis cache write skipped: {exc}")
 
 
 class _PhylogenyWorker(QObject):
@@ -677,6 +726,7 @@ class _UnifracWorker(QObject):
     """
     finished = pyqtSignal(object)   # emits updated AppState
     errored  = pyqtSignal(str)
+    progress = pyqtSignal(str)      # status message
 
     def __init__(self, state: AppState) -> None:
         super().__init__()
@@ -686,135 +736,114 @@ class _UnifracWorker(QObject):
     def run(self):
         try:
             if self._state.run_count > 1:
-                self._fill_unifrac(
-                    state=self._state,
-                    project_id=self._project_id,
-                    labels=self._state.lbs,
-                )
+                labels = self._state.lbs
+                # a rebuilt tree invalidates every run's UniFrac and Faith's PD
+                try:
+                    since = datetime.fromisoformat(get_tree(self._project_id)["created_at"])
+                except ServiceError:
+                    since = None
+                dirty = _AnalysisWorkerReal._dirty_labels(self._state, labels, "unifrac", since=since)
+                if dirty and self._fill_unifrac(
+                        state=self._state,
+                        project_id=self._project_id,
+                        labels=labels,
+                        scheduler=DistanceScheduler(
+                            progress=_pair_progress(self.progress, "Computing UniFrac")),
+                        dirty=dirty,
+                ):
+                    _AnalysisWorkerReal._mark_analysed(dirty, "unifrac")
             self.finished.emit(self._state)
         except Exception as exc:
             self.errored.emit(str(exc))
 
     @staticmethod
-    def _fill_unifrac(state: AppState, project_id: int, labels: dict) -> None:
+    def _fill_unifrac(state: AppState, project_id: int, labels: dict,
+                      scheduler: DistanceScheduler | None = None,
+                      dirty: dict | None = None) -> bool:
         """
-        Weighted UniFrac using _TreeNode (no skbio).
+        UniFrac variants using _TreeNode (no skbio).
 
         Algorithm:
-          1. Load Newick from DB; prune to sample tips.
-          2. Iterative postorder: accumulate per-sample subtree proportions.
-          3. WUniFrac(A,B) = Σ(l·|pA−pB|) / Σ(l·(pA+pB))  over all branches.
-          4. Store pairwise distances and derive PCoA coordinates.
+          1. Load Newick from DB and flatten it once into postorder arrays.
+          2. Accumulate subtree proportions for every run at once (nodes x runs).
+          3. Derive unweighted, weighted, normalised weighted and generalised
+             UniFrac from that shared matrix (services/unifrac.py): every pair,
+             or only the dirty runs against every run for each variant whose
+             other pairs are already stored.
+          4. Store each variant under its own metric key, with its own PCoA.
+          5. Refresh the alpha metrics, adding Faith's PD from the same arrays.
         """
+        # ── Load, parse & flatten tree ────────────────────────────────────
+        tree = _UnifracWorker._load_tree_arrays(project_id)
+        if tree is None:
+            return False
+
+        # ── Feature counts per run ────────────────────────────────────────
+        loaded = _AnalysisWorkerReal._project_counts(state, labels)
+        if loaded is None:
+            return False
+        cm, matrix = loaded
+        if not matrix.nnz:
+            return False
+
+        # ── Pairwise UniFrac, all variants ────────────────────────────────
+        # a variant is updated incrementally only when its own stored pairs
+        # are complete: an earlier run may have stored some variants only
+        plans: dict[tuple | None, list[str]] = {}
+        for metric in UNIFRAC_METRICS:
+            rows = _AnalysisWorkerReal._incremental_rows(labels, dirty, metric)
+            plans.setdefault(None if rows is None else tuple(rows), []).append(metric)
+        tip_index = tree.tip_index(cm.feature_ids)
+        run_ids = list(labels.values())
+        for rows, metrics in plans.items():
+            matrices = unifrac_matrices(tree, matrix, tip_index, tuple(metrics),
+                                        scheduler=scheduler, rows=rows)
+            for metric, uf_matrix in matrices.items():
+                try:
+                    if rows is not None:
+                        store_beta_diversity_rows(project_id, metric, [run_ids[i] for i in rows],
+                                                  run_ids, uf_matrix)
+                    else:
+                        store_beta_diversity_matrix(project_id, metric, labels, uf_matrix)
+                except ServiceError:
+                    continue
+                # ── UniFrac PCoA ──────────────────────────────────────────
+                _AnalysisWorkerReal._fill_pcoa(state=state, labels=labels, metric=metric)
+
+        # ── Alpha metrics again, now with Faith's PD from the same tree ──
+        _AnalysisWorkerReal._fill_alpha(state, labels if dirty is None else dirty, tree=tree)
+        return True
+
+    @staticmethod
+    def _load_tree_arrays(project_id: int) -> TreeArrays | None:
+        """The project's stored Newick tree flattened into TreeArrays, or None."""
         import io as _io
         from ui.pages import _TreeNode
 
-        # ── Load tree ─────────────────────────────────────────────────────
         try:
             tree_info = get_tree(project_id=project_id)
         except ServiceError:
-            print("UniFrac: no tree in DB — skipping")
-            return
+            print("No tree in DB — skipping phylogenetic metrics")
+            return None
         nwk = tree_info.get("newick_string", "")
         if not nwk:
-            print("UniFrac: empty newick string — skipping")
-            return
-
-        # ── Feature counts per run ────────────────────────────────────────
-        run_ids = list(labels.values())
-        try:
-            feature_ids = get_run_feature_ids(run_ids[0])
-        except Exception:
-            return
-        if not feature_ids:
-            return
-
-        counts_per_run: dict[int, dict[str, int]] = {}
-        for run_id in run_ids:
-            try:
-                rows = get_feature_counts(run_id)
-                counts_per_run[run_id] = {
-                    r["feature_id"]: int(r["abundance"]) for r in rows
-                }
-            except ServiceError:
-                counts_per_run[run_id] = {}
-
-        # Tips present in any sample with count > 0
-        all_sample_tips: set[str] = set()
-        for cnt in counts_per_run.values():
-            all_sample_tips.update(k for k, v in cnt.items() if v > 0)
-        if not all_sample_tips:
-            return
-
-        # ── Parse & prune tree to sample tips ─────────────────────────────
+            print("Empty newick string — skipping phylogenetic metrics")
+            return None
+        # parsing a large Newick string dominates; flattened arrays are cached on disk
+        cache, key = default_cache(), tree_key(nwk)
+        cached = cache.load(project_id, "tree", key)
+        if cached is not None:
+            return TreeArrays.from_arrays(cached)
         try:
-            tree = _TreeNode.read(_io.StringIO(nwk))
-            tree.shear(all_sample_tips)
+            tree = TreeArrays.from_tree(_TreeNode.read(_io.StringIO(nwk)))
         except Exception as exc:
-            print(f"UniFrac: tree parse/prune error: {exc}")
-            return
-
-        # Build postorder list once; reused for every pair
-        postorder_nodes = list(tree.postorder())
-
-        def _wunifrac(counts_a: dict, counts_b: dict) -> float:
-            total_a = sum(counts_a.values())
-            total_b = sum(counts_b.values())
-            if total_a == 0 and total_b == 0:
-                return 0.0
-            prop_a = ({k: v / total_a for k, v in counts_a.items()}
-                      if total_a else {})
-            prop_b = ({k: v / total_b for k, v in counts_b.items()}
-                      if total_b else {})
-
-            # Iterative postorder: accumulate subtree proportion sums
-            sub_a: dict[int, float] = {}
-            sub_b: dict[int, float] = {}
-            for node in postorder_nodes:
-                nid = id(node)
-                if not node.children:          # leaf
-                    sub_a[nid] = prop_a.get(node.name or "", 0.0)
-                    sub_b[nid] = prop_b.get(node.name or "", 0.0)
-                else:
-                    sub_a[nid] = sum(sub_a[id(c)] for c in node.children)
-                    sub_b[nid] = sum(sub_b[id(c)] for c in node.children)
-
-            numerator = denominator = 0.0
-            for node in postorder_nodes:
-                if node.parent is None:        # root — no branch above
-                    continue
-                bl = node.length or 0.0
-                if bl == 0.0:
-                    continue
-                nid = id(node)
-                sa, sb = sub_a[nid], sub_b[nid]
-                numerator   += bl * abs(sa - sb)
-                denominator += bl * (sa + sb)
-
-            return numerator / denominator if denominator > 0 else 0.0
-
-        # ── Pairwise weighted UniFrac ──────────────────────────────────────
-        run_labels = list(labels.keys())
-        for i, label_a in enumerate(run_labels):
-            for j, label_b in enumerate(run_labels):
-                if j <= i:
-                    continue
-                id_a = labels[label_a]
-                id_b = labels[label_b]
-                u_val = _wunifrac(
-                    counts_per_run.get(id_a, {}),
-                    counts_per_run.get(id_b, {}),
-                )
-                id_lo, id_hi = sorted([id_a, id_b])
-                try:
-                    store_beta_diversity(id_lo, id_hi, "unifrac", u_val)
-                except ServiceError:
-                    continue
-
-        # ── UniFrac PCoA ──────────────────────────────────────────────────
-        _AnalysisWorkerReal._fill_pcoa(
-            state=state, labels=labels, metric="unifrac"
-        )
+            print(f"Tree parse error: {exc}")
+            return None
+        try:
+            cache.store(project_id, "tree", key, tree.to_arrays())
+        except OSError as exc:
+            print(f"Analysis cache write skipped: {exc}")
+        return tree
     
 
 class _RiskPredictionWorker(QObject):
@@ -1448,6 +1477,7 @@ class MainWindow(QMainWindow):
         self._unifrac_thread.started.connect(self._unifrac_worker.run)
         self._unifrac_worker.finished.connect(self._on_unifrac_complete)
         self._unifrac_worker.errored.connect(self._on_unifrac_error)
+        self._unifrac_worker.progress.connect(self._on_analysis_progress)
         self._unifrac_worker.finished.connect(self._unifrac_thread.quit)
         self._unifrac_worker.errored.connect(self._unifrac_thread.quit)
         self._unifrac_thread.start()
@@ -1573,11 +1603,7 @@ class MainWindow(QMainWindow):
             return
 
         # Validate FASTQ header
-        try:
-            from src.pipeline.qc import _validate_fastq_header
-            valid, error = _validate_fastq_header(path)
-        except (ImportError, AttributeError):
-            valid, error = True, ""
+        valid, error = validate_fastq_header(path)
 
         if not valid:
             self._upload_page.update_run_status(run_label, False, error)
@@ -1617,6 +1643,13 @@ class MainWindow(QMainWindow):
         if self._state is None:
             return
 
+        # Local files go into the QIIME manifest as they are, gzipped or not
+        for path in (fwd_path, rev_path) if layout == 'PAIRED' else (fwd_path,):
+            valid, error = validate_fastq_header(path)
+            if not valid:
+                self._upload_page.update_pipeline_status(f"{Path(path).name}: {error}", "err")
+                return
+
         # Generate unique accession and label
         local_n = sum(1 for k in self._state.runs if k.startswith("LOCAL")) + 1
         accession = f"LOCAL{local_n}"
@@ -1840,6 +1873,7 @@ class MainWindow(QMainWindow):
         self._pipeline_thread_real.started.connect(self._pipeline_worker_real.run)
         self._pipeline_worker_real.progress.connect(self._on_analysis_progress)
         self._pipeline_worker_real.progress.connect(self._upload_page.append_terminal_output)
+        self._pipeline_worker_real.resources.connect(self._upload_page.show_resources)
         self._pipeline_worker_real.finished.connect(self._on_pipeline_complete)
         self._pipeline_worker_real.errored.connect(self._on_pipeline_error)
         self._pipeline_worker_real.finished.connect(self._pipeline_thread_real.quit)
@@ -39,8 +39,36 @@ from ui.helpers import (
 
 from src.services.assessment_service import (ServiceError, get_feature_counts,
                                              get_genus_data, get_alpha_diversities,
-                                             get_beta_diversity_matrix, get_pcoa,
-                                             get_simulations_for_run)
+                                             get_beta_diversity_matrix, get_pcoa, get_pcoa_axes,
+                                             get_project_feature_taxonomy, get_tree,
+                                             get_simulations_for_run,
+                                             get_rarefaction_curves)
+from src.services.analysis_cache import beta_key, default_cache, reindex_square
+from src.services.count_matrix import get_cached_count_matrix
+from src.services.rarefaction import common_depth, RAREFACTION_METRICS
+from src.pipeline.fastq_io import find_fastq
+
+# Alpha diversity pill label → (metric key in alpha_div, y-axis label)
+_ALPHA_METRICS = {
+    "Shannon":   ("shannon",           "Shannon entropy (bits)"),
+    "Simpson":   ("simpson",           "Simpson index (0–1)"),
+    "Observed":  ("observed_features", "Observed features"),
+    "Chao1":     ("chao1",             "Chao1 richness"),
+    "ACE":       ("ace",               "ACE richness"),
+    "Pielou":    ("pielou_evenness",   "Pielou evenness (0–1)"),
+    "Coverage":  ("goods_coverage",    "Good's coverage (0–1)"),
+    "Faith PD":  ("faith_pd",          "Faith's phylogenetic diversity"),
+}
+_ALPHA_AXIS = {key: axis for key, axis in _ALPHA_METRICS.values()}
+
+# Beta diversity pill label → metric key in beta_div / pcoa
+_BETA_METRICS = {
+    "Bray-Curtis":         "bray_curtis",
+    "Weighted UniFrac":    "weighted_normalized_unifrac",
+    "Unweighted UniFrac":  "unweighted_unifrac",
+    "Generalized UniFrac": "generalized_unifrac",
+}
+_BETA_LABELS = {v: k for k, v in _BETA_METRICS.items()}
 
 # ── helpers ───────────────────────────────────────────────────────────────────
 
@@ -469,10 +497,10 @@ class UploadRunsPage(QWidget):
         pw.setContentsMargins(0, 4, 0, 0); pw.setSpacing(8)
         self._local_fwd_path = QLineEdit()
         self._local_fwd_path.setReadOnly(True)
-        self._local_fwd_path.setPlaceholderText("Forward reads  (_1.fastq / _R1.fastq)")
+        self._local_fwd_path.setPlaceholderText("Forward reads  (_1.fastq[.gz] / _R1.fastq[.gz])")
         self._local_rev_path = QLineEdit()
         self._local_rev_path.setReadOnly(True)
-        self._local_rev_path.setPlaceholderText("Reverse reads  (_2.fastq / _R2.fastq)")
+        self._local_rev_path.setPlaceholderText("Reverse reads  (_2.fastq[.gz] / _R2.fastq[.gz])")
         for path_edit, row_lbl, tip in [
             (self._local_fwd_path, "Forward (_1)", "Select forward / R1 FASTQ file"),
             (self._local_rev_path, "Reverse (_2)", "Select reverse / R2 FASTQ file"),
@@ -546,6 +574,13 @@ class UploadRunsPage(QWidget):
         log_hdr.addWidget(self._status_step_lbl)
         log_card.layout().addLayout(log_hdr)
 
+        # cores held by running QIIME2 steps, and how many wait for some
+        self._resources_lbl = QLabel("")
+        self._resources_lbl.setStyleSheet("font-size:11px; color:#6B7280;")
+        self._resources_lbl.setWordWrap(True)
+        self._resources_lbl.hide()
+        log_card.layout().addWidget(self._resources_lbl)
+
         self._terminal = QPlainTextEdit()
         self._terminal.setReadOnly(True)
         mono = QFont("Menlo")
@@ -616,12 +651,13 @@ class UploadRunsPage(QWidget):
             if is_paired:
                 stored_fwd = run.get('fastq_forward', '')
                 stored_rev = run.get('fastq_reverse', '')
-                disk_f1 = _pipeline_dir / state.bioproject_id / "fastq" / "paired" / f"{srr}_1.fastq"
-                disk_f2 = _pipeline_dir / state.bioproject_id / "fastq" / "paired" / f"{srr}_2.fastq"
-                fwd_ok   = bool(stored_fwd) or disk_f1.exists()
-                rev_ok   = bool(stored_rev) or disk_f2.exists()
-                fwd_name = _Path(stored_fwd).name if stored_fwd else (f"{srr}_1.fastq" if disk_f1.exists() else f"{srr}_1.fastq")
-                rev_name = _Path(stored_rev).name if stored_rev else (f"{srr}_2.fastq" if disk_f2.exists() else f"{srr}_2.fastq")
+                paired_dir = _pipeline_dir / state.bioproject_id / "fastq" / "paired"
+                disk_f1 = find_fastq(paired_dir, f"{srr}_1")
+                disk_f2 = find_fastq(paired_dir, f"{srr}_2")
+                fwd_ok   = bool(stored_fwd) or disk_f1 is not None
+                rev_ok   = bool(stored_rev) or disk_f2 is not None
+                fwd_name = _Path(stored_fwd).name if stored_fwd else (disk_f1.name if disk_f1 else f"{srr}_1.fastq.gz")
+                rev_name = _Path(stored_rev).name if stored_rev else (disk_f2.name if disk_f2 else f"{srr}_2.fastq.gz")
                 files_ok = fwd_ok and rev_ok
                 files_text = (
                     f"{'✓' if fwd_ok else '○'}  {fwd_name}    "
@@ -629,9 +665,9 @@ class UploadRunsPage(QWidget):
                 )
             else:
                 stored_s  = run.get('fastq_path', '')
-                disk_f1   = _pipeline_dir / state.bioproject_id / "fastq" / "single" / f"{srr}.fastq"
-                files_ok  = bool(stored_s) or disk_f1.exists()
-                file_name = _Path(stored_s).name if stored_s else f"{srr}.fastq"
+                disk_f1   = find_fastq(_pipeline_dir / state.bioproject_id / "fastq" / "single", srr)
+                files_ok  = bool(stored_s) or disk_f1 is not None
+                file_name = _Path(stored_s).name if stored_s else (disk_f1.name if disk_f1 else f"{srr}.fastq.gz")
                 files_text = f"{'✓' if files_ok else '○'}  {file_name}"
             files_lbl = QLabel(files_text)
             files_lbl.setStyleSheet(
@@ -651,8 +687,8 @@ class UploadRunsPage(QWidget):
             if not uploaded and not is_local:
                 if is_paired:
                     for slot, lbl_txt, tip in [
-                        ('forward', 'Browse _1', 'Forward reads (SRR_1.fastq)'),
-                        ('reverse', 'Browse _2', 'Reverse reads (SRR_2.fastq)'),
+                        ('forward', 'Browse _1', 'Forward reads (SRR_1.fastq.gz)'),
+                        ('reverse', 'Browse _2', 'Reverse reads (SRR_2.fastq.gz)'),
                     ]:
                         b = btn_outline(lbl_txt)
                         b.setFixedWidth(82); b.setToolTip(tip)
@@ -801,6 +837,10 @@ class UploadRunsPage(QWidget):
         self._status_step_lbl.setText(message)
         self._log(message, kind)
 
+    def show_resources(self, text: str) -> None:
+        self._resources_lbl.setText(text)
+        self._resources_lbl.setVisible(bool(text))
+
     def _log(self, text: str, kind: str = "info") -> None:
         prefixes = {"ok": "✓", "warn": "⚠", "err": "✗", "run": "▶", "info": "ℹ"}
         prefix = prefixes.get(kind, "ℹ")
@@ -841,6 +881,9 @@ class DiversityPage(QWidget):
         self._feat_cache:  dict[int, int]                                   = {}
         self._beta_cache:  dict[str, list[list[float]] | None]              = {}
         self._pcoa_cache:  dict[str, dict[str, tuple[float, float]] | None] = {}
+        self._pcoa_var:    dict[str, list[float]]                           = {}
+        self._disk_beta:   dict[str, dict | None]                           = {}
+        self._rare_cache:  dict[str, dict[int, list[dict]]]                 = {}
         self._build()
  
     # ── Layout ────────────────────────────────────────────────────────────────
@@ -888,7 +931,7 @@ class DiversityPage(QWidget):
         ah.addWidget(section_title("Alpha diversity — per run"))
         ah.addWidget(label_hint("Within-sample species richness and evenness"))
         ah.addStretch()
-        self._alpha_sw = PillSwitcher(["Shannon", "Simpson"], obj_name="metric_pill")
+        self._alpha_sw = PillSwitcher(list(_ALPHA_METRICS), obj_name="metric_pill")
         self._alpha_sw.on_changed(self._on_alpha_metric)
         ah.addWidget(self._alpha_sw)
         alpha_card.layout().addLayout(ah)
@@ -903,11 +946,41 @@ class DiversityPage(QWidget):
         alpha_card.layout().addWidget(self._alpha_placeholder)
         self._alpha_canvas.hide()
 
+        # ── Rarefaction card ──────────────────────────────────────────────
+        rare_card = card()
+        root.addWidget(rare_card)
+        rh = QHBoxLayout()
+        rh.addWidget(section_title("Rarefaction"))
+        rh.addWidget(label_hint("Alpha diversity of repeated subsamples — flat curves mean enough reads"))
+        rh.addStretch()
+        rare_card.layout().addLayout(rh)
+
+        self._rare_w = QWidget()
+        rare_row = QHBoxLayout(self._rare_w)
+        rare_row.setContentsMargins(0, 0, 0, 0)
+        rare_row.setSpacing(16)
+        self._rare_fig, self._rare_ax = plt.subplots(1, 1, figsize=(6, 3), facecolor="none")
+        self._rare_canvas = FigureCanvasQTAgg(self._rare_fig)
+        self._rare_canvas.setMinimumHeight(220)
+        rare_row.addWidget(self._rare_canvas, 3)
+        box_col = QVBoxLayout()
+        self._rare_box_hint = label_hint("")
+        box_col.addWidget(self._rare_box_hint)
+        self._rare_box = BoxPlotWidget({}, ["#6366F1"])
+        box_col.addWidget(self._rare_box)
+        rare_row.addLayout(box_col, 2)
+        rare_card.layout().addWidget(self._rare_w)
+        self._rare_placeholder = _placeholder(
+            "Run the QIIME2 pipeline to compute rarefaction curves."
+        )
+        rare_card.layout().addWidget(self._rare_placeholder)
+        self._rare_w.hide()
+
         # ── Beta section ──────────────────────────────────────────────────
         beta_hdr = QHBoxLayout()
         beta_hdr.addWidget(section_title("Beta diversity — between runs"))
         beta_hdr.addStretch()
-        self._beta_sw = PillSwitcher(["Bray-Curtis", "UniFrac"], obj_name="metric_pill")
+        self._beta_sw = PillSwitcher(list(_BETA_METRICS), obj_name="metric_pill")
         self._beta_sw.on_changed(self._on_beta_metric)
         beta_hdr.addWidget(QLabel("Metric:"))
         beta_hdr.addWidget(self._beta_sw)
@@ -996,6 +1069,9 @@ class DiversityPage(QWidget):
         self._feat_cache.clear()
         self._beta_cache.clear()
         self._pcoa_cache.clear()
+        self._pcoa_var.clear()
+        self._disk_beta.clear()
+        self._rare_cache.clear()
 
         if not state.pipeline_complete:
             self._reset_to_pending()
@@ -1003,6 +1079,7 @@ class DiversityPage(QWidget):
 
         self._refresh_stats()
         self._refresh_alpha()
+        self._refresh_rarefaction()
         self._refresh_beta()
 
     def _reset_to_pending(self) -> None:
@@ -1011,6 +1088,8 @@ class DiversityPage(QWidget):
         self._alpha_canvas.hide()
         self._alpha_placeholder.setText("Run the QIIME2 pipeline to compute diversity metrics.")
         self._alpha_placeholder.show()
+        self._rare_w.hide()
+        self._rare_placeholder.show()
         self._pcoa_canvas.hide()
         self._pcoa_placeholder.setText("Run the QIIME2 pipeline to compute beta diversity.")
         self._pcoa_placeholder.show()
@@ -1031,16 +1110,22 @@ class DiversityPage(QWidget):
         shannon_vals: list[float] = []
         simpson_vals: list[float] = []
 
+        # ASV counts of runs not seen yet, from one lookup of the project's matrix
+        missing = [run_id for label in self._state.run_labels
+                   if (run_id := self._state.lbs.get(label)) is not None and run_id not in self._feat_cache]
+        if missing:
+            try:
+                cm = get_cached_count_matrix(self._state.count_matrices,
+                                             self._state.db_project_id, as_sparse=True)
+                nnz = cm.rows_for(missing, sparse=True).getnnz(axis=1)
+            except ServiceError:
+                nnz = [0] * len(missing)
+            self._feat_cache.update(zip(missing, (int(n) for n in nnz)))
+
         for label in self._state.run_labels:
             run_id = self._state.lbs.get(label)
             if run_id is None:
                 continue
-            if run_id not in self._feat_cache:
-                try:
-                    rows = get_feature_counts(run_id)
-                    self._feat_cache[run_id] = len(rows)
-                except ServiceError:
-                    self._feat_cache[run_id] = 0
             total_asvs += self._feat_cache[run_id]
 
             alpha = self._fetch_alpha(run_id)
@@ -1107,10 +1192,7 @@ class DiversityPage(QWidget):
         ax.bar_label(b, fmt="%.3f", padding=3, fontsize=9)
         ax.set_xticks(xs)
         ax.set_xticklabels(labels_ax, fontsize=10)
-        ylabel = ("Shannon entropy (bits)"
-                  if self._alpha_metric == "shannon"
-                  else "Simpson index (0–1)")
-        ax.set_ylabel(ylabel, fontsize=9)
+        ax.set_ylabel(_ALPHA_AXIS[self._alpha_metric], fontsize=9)
         ax.tick_params(axis="y", labelsize=8)
         ax.spines[["top", "right"]].set_visible(False)
         ax.set_facecolor("none")
@@ -1120,35 +1202,114 @@ class DiversityPage(QWidget):
         self._alpha_canvas.show()
         self._alpha_placeholder.hide()
 
+    # ── Rarefaction ───────────────────────────────────────────────────────────
+
+    def _fetch_rarefaction(self, metric: str) -> dict[int, list[dict]]:
+        if metric in self._rare_cache:
+            return self._rare_cache[metric]
+        try:
+            curves = get_rarefaction_curves(self._state.db_project_id, metric)
+        except ServiceError:
+            curves = {}
+        self._rare_cache[metric] = curves
+        return curves
+
+    def _refresh_rarefaction(self) -> None:
+        if not self._state or not self._state.lbs or not self._state.db_project_id:
+            self._rare_w.hide()
+            self._rare_placeholder.show()
+            return
+
+        if self._alpha_metric not in RAREFACTION_METRICS:
+            self._rare_w.hide()
+            self._rare_placeholder.setText("Rarefaction curves cover Shannon, Simpson and observed features.")
+            self._rare_placeholder.show()
+            return
+        curves = self._fetch_rarefaction(self._alpha_metric)
+        run_colors = self._state.run_colors()
+        shown = [(lbl, self._state.lbs[lbl]) for lbl in self._state.run_labels
+                 if self._state.lbs.get(lbl) in curves]
+        if not shown:
+            self._rare_w.hide()
+            self._rare_placeholder.setText("Run the QIIME2 pipeline to compute rarefaction curves.")
+            self._rare_placeholder.show()
+            return
+
+        ax = self._rare_ax
+        ax.clear()
+        for label, run_id in shown:
+            rows  = curves[run_id]
+            color = run_colors.get(label, "#6366F1")
+            depth = [r["depth"] for r in rows]
+            ax.plot(depth, [r["mean"] for r in rows], color=color, lw=1.8, label=label, zorder=3)
+            ax.fill_between(depth, [r["q1"] for r in rows], [r["q3"] for r in rows],
+                            color=color, alpha=0.2, lw=0, zorder=2)
+        ax.set_xlabel("Sequencing depth (reads)", fontsize=9)
+        ax.set_ylabel(_ALPHA_AXIS[self._alpha_metric], fontsize=9)
+        ax.tick_params(labelsize=8)
+        ax.spines[["top", "right"]].set_visible(False)
+        ax.set_facecolor("none")
+        ax.grid(alpha=0.3, zorder=0)
+        if len(shown) <= 10:
+            ax.legend(fontsize=8, frameon=False)
+        self._rare_fig.tight_layout(pad=1.0)
+        self._rare_canvas.draw()
+
+        # box plots compare runs at the deepest depth every run reached
+        shared = {run_id: curves[run_id] for _, run_id in shown}
+        depth = common_depth(shared)
+        box: dict[str, tuple] = {}
+        for label, run_id in shown:
+            row = next((r for r in shared[run_id] if r["depth"] == depth), None)
+            if row is not None:
+                box[label] = (row["minimum"], row["q1"], row["median"], row["q3"], row["maximum"])
+        self._rare_box_hint.setText(
+            f"{_ALPHA_AXIS[self._alpha_metric]} at {depth:,} reads, "
+            f"{shared[shown[0][1]][0]['n_iter']} subsamples per run" if depth else ""
+        )
+        self._rare_box.set_data(box, [run_colors.get(lbl, "#6366F1") for lbl in box])
+
+        self._rare_w.show()
+        self._rare_placeholder.hide()
+
     # ── Beta ──────────────────────────────────────────────────────────────────
 
+    def _disk_entry(self, metric: str) -> dict | None:
+        """
+        Memory-mapped matrix + ordination the analysis worker cached on disk,
+        if it was computed from the project's current counts (and tree).
+        """
+        if metric not in self._disk_beta:
+            self._disk_beta[metric] = None
+            project_id = self._state.db_project_id
+            try:
+                cm = get_cached_count_matrix(self._state.count_matrices, project_id, as_sparse=True)
+                newick = get_tree(project_id)["newick_string"] if metric.endswith("unifrac") else None
+                self._disk_beta[metric] = default_cache().load(
+                    project_id, f"beta-{metric}", beta_key(cm.digest, metric, newick))
+            except ServiceError:
+                pass
+        return self._disk_beta[metric]
+
     def _fetch_beta_matrix(self, metric: str) -> list[list[float]] | None:
         if metric in self._beta_cache:
             return self._beta_cache[metric]
         if not self._state or not self._state.db_project_id:
             return None
-        try:
-            flat = get_beta_diversity_matrix(self._state.db_project_id, metric)
-        except ServiceError:
-            flat = []
-        if not flat:
+        # labels missing from lbs (never ingested) map to an id with no pairs → zero row
+        run_ids = [self._state.lbs.get(lbl, -1) for lbl in self._state.run_labels]
+        entry = self._disk_entry(metric)
+        if entry is not None:
+            mat = reindex_square(entry["matrix"], entry["run_ids"], run_ids)
+        else:
+            try:
+                mat, _ = get_beta_diversity_matrix(self._state.db_project_id, metric, run_ids)
+            except ServiceError:
+                mat = None
+        if mat is None or mat.size == 0:
             self._beta_cache[metric] = None
             return None
-        labels    = self._state.run_labels
-        n         = len(labels)
-        mat       = [[0.0] * n for _ in range(n)]
-        id_to_idx = {
-            self._state.lbs[lbl]: i
-            for i, lbl in enumerate(labels)
-            if lbl in self._state.lbs
-        }
-        for row in flat:
-            i = id_to_idx.get(row["run_id_1"])
-            j = id_to_idx.get(row["run_id_2"])
-            if i is not None and j is not None:
-                val       = float(row["value"])
-                mat[i][j] = val
-                mat[j][i] = val
+        mat = mat.tolist()
         self._beta_cache[metric] = mat
         return mat
 
@@ -1157,10 +1318,17 @@ class DiversityPage(QWidget):
             return self._pcoa_cache[metric]
         if not self._state or not self._state.db_project_id:
             return None
-        try:
-            rows = get_pcoa(self._state.db_project_id, metric)
-        except ServiceError:
-            rows = []
+        entry = self._disk_entry(metric)
+        if entry is not None and entry["coords"].shape[1] >= 2:
+            coords_k = entry["coords"]
+            rows = [{"run_id": int(r), "pc1": coords_k[i, 0], "pc2": coords_k[i, 1]}
+                    for i, r in enumerate(entry["run_ids"])]
+            self._pcoa_var[metric] = entry["proportion_explained"].tolist()
+        else:
+            try:
+                rows = get_pcoa(self._state.db_project_id, metric)
+            except ServiceError:
+                rows = []
         if not rows:
             self._pcoa_cache[metric] = None
             return None
@@ -1172,6 +1340,12 @@ class DiversityPage(QWidget):
         }
         result = coords if coords else None
         self._pcoa_cache[metric] = result
+        if metric not in self._pcoa_var:
+            try:
+                self._pcoa_var[metric] = [a["proportion_explained"]
+                                          for a in get_pcoa_axes(self._state.db_project_id, metric)]
+            except ServiceError:
+                self._pcoa_var[metric] = []
         return result
 
     def _refresh_beta(self) -> None:
@@ -1194,7 +1368,7 @@ class DiversityPage(QWidget):
         if matrix is None or coords is None:
             self._pcoa_canvas.hide()
             self._hm_canvas.hide()
-            if metric == "unifrac":
+            if metric.endswith("unifrac"):
                 self._pcoa_placeholder.hide()
                 self._hm_placeholder.hide()
                 self._pcoa_no_unifrac.show()
@@ -1221,10 +1395,12 @@ class DiversityPage(QWidget):
             color = run_colors.get(lbl, "#6366F1")
             ax.scatter(x, y, c=color, s=130, zorder=3, edgecolors="white", linewidths=0.8)
             ax.annotate(lbl, (x, y), textcoords="offset points", xytext=(7, 4), fontsize=9)
-        title = "Bray-Curtis PCoA" if metric == "bray_curtis" else "UniFrac PCoA"
+        title = f"{_BETA_LABELS.get(metric, metric)} PCoA"
         ax.set_title(title, fontsize=10, pad=6)
-        ax.set_xlabel("PC1", fontsize=9)
-        ax.set_ylabel("PC2", fontsize=9)
+        var = self._pcoa_var.get(metric, [])
+        for axis, set_label in ((0, ax.set_xlabel), (1, ax.set_ylabel)):
+            share = f" ({var[axis]:.1%})" if axis < len(var) else ""
+            set_label(f"PC{axis + 1}{share}", fontsize=9)
         ax.tick_params(labelsize=8)
         ax.spines[["top", "right"]].set_visible(False)
         ax.set_facecolor("none")
@@ -1261,12 +1437,14 @@ class DiversityPage(QWidget):
     # ── Pill callbacks ────────────────────────────────────────────────────────
 
     def _on_alpha_metric(self, label: str) -> None:
-        self._alpha_metric = "shannon" if "shannon" in label.lower() else "simpson"
+        # every metric is already in alpha_div; switching only re-reads the cache
+        self._alpha_metric = _ALPHA_METRICS.get(label, _ALPHA_METRICS["Shannon"])[0]
         if self._state and self._state.pipeline_complete:
             self._refresh_alpha()
+            self._refresh_rarefaction()
 
     def _on_beta_metric(self, label: str) -> None:
-        self._beta_metric = "bray_curtis" if "bray" in label.lower() else "unifrac"
+        self._beta_metric = _BETA_METRICS.get(label, "bray_curtis")
         if self._state and self._state.pipeline_complete:
             self._refresh_beta()
 
@@ -1600,6 +1778,7 @@ class AsvTablePage(QWidget):
         super().__init__(parent)
         self._state: AppState | None = None
         self._active_run = "R1"
+        self._taxonomy: dict[str, str] | None = None   # project feature dictionary, per load()
         self._build()
 
     def _build(self):
@@ -1701,6 +1880,7 @@ class AsvTablePage(QWidget):
 
     def load(self, state: AppState):
         self._state = state
+        self._taxonomy = None
 
         if not state.pipeline_complete:
             self._show_placeholder()
@@ -1728,13 +1908,24 @@ class AsvTablePage(QWidget):
         run_id = self._state.lbs.get(run_label)
         if run_id is None:
             self._show_placeholder()
+            return
 
+        # counts come from the shared CSR matrix on the AppState (one row slice);
+        # taxonomy from the project dictionary, fetched once per load()
         try:
-            rows = get_feature_counts(run_id)
+            cm = get_cached_count_matrix(self._state.count_matrices,
+                                         self._state.db_project_id, as_sparse=True)
+            if self._taxonomy is None:
+                self._taxonomy = get_project_feature_taxonomy(self._state.db_project_id)
         except ServiceError:
             self._show_placeholder()
             return
-        
+        feature_ids, counts = cm.run_counts(run_id)
+        rows = [
+            {"feature_id": fid, "abundance": int(n), "taxonomy": self._taxonomy.get(fid)}
+            for fid, n in zip(feature_ids, counts)
+        ]
+
         if not rows:
             self._show_placeholder()
             return
@@ -301,8 +301,10 @@ class BoxPlotWidget(QWidget):
         self.setMinimumHeight(110)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
 
-    def set_data(self, data: dict[str, tuple]) -> None:
+    def set_data(self, data: dict[str, tuple], colors: list[str] | None = None) -> None:
         self._data = data
+        if colors:
+            self._colors = colors
         self.update()
 
     def paintEvent(self, _):
@@ -0,0 +1,37 @@
+"""
+tests/conftest.py
+
+Shared fixtures.  ``db`` points the SQLCipher engine (and the analysis
+cache) at throw-away paths under pytest's tmp_path, creates the schema,
+and seeds one user + project.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    import src.db.database as database
+    from src.db.db_models import Base
+    from src.db.repository import create_user, create_project
+
+    import src.services.analysis_cache as analysis_cache
+
+    monkeypatch.setattr(database, "DEFAULT_DB_PATH", str(tmp_path / "axisad.db"))
+    # ingest / delete invalidate the analysis cache; keep it off the real data/cache
+    monkeypatch.setattr(analysis_cache, "_default", analysis_cache.AnalysisCache(tmp_path / "cache"))
+    database.init_engine(b"\x00" * 32)
+    Base.metadata.create_all(database.get_engine())
+
+    session = database.SessionLocal()
+    user = create_user(session, username="tester", password_hash="x", user_email="")
+    project = create_project(session, user=user, name="Test Project")
+    session.commit()
+    ids = {"user_id": user.user_id, "project_id": project.project_id}
+    session.close()
+
+    yield ids
+
+    database.get_engine().dispose()
@@ -0,0 +1,78 @@
+"""
+tests/test_analysis_cache.py
+
+Content-addressed on-disk analysis cache in src/services/analysis_cache.py.
+
+Run:
+    python -m pytest tests/test_analysis_cache.py -v
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+import src.services.analysis_cache as analysis_cache
+from src.services.analysis_cache import AnalysisCache, beta_key, content_key, reindex_square
+from src.services.assessment_service import create_run, ingest_run_data
+from src.services.unifrac import TreeArrays
+
+FEATURES = [{"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"}]
+
+
+class _Node:
+    def __init__(self, name="", length=None, children=()):
+        self.name, self.length, self.children = name, length, list(children)
+
+
+def test_content_key_is_framed_and_order_sensitive():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key(np.arange(3)) != content_key(np.arange(3).astype(np.int32))
+    assert beta_key("d", "bray_curtis") != beta_key("d", "bray_curtis", "(a,b);")
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    cache = AnalysisCache(tmp_path)
+    assert cache.load(1, "beta-bray_curtis", "k") is None
+    cache.store(1, "beta-bray_curtis", "k", {"matrix": np.eye(3), "run_ids": np.array([4, 5, 6])})
+
+    got = cache.load(1, "beta-bray_curtis", "k")
+    assert isinstance(got["matrix"], np.memmap)
+    np.testing.assert_array_equal(got["matrix"], np.eye(3))
+    np.testing.assert_array_equal(reindex_square(got["matrix"], got["run_ids"], [6, 9, 4]),
+                                  [[1, 0, 0], [0, 0, 0], [0, 0, 1]])
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    block = {"x": np.zeros(1000)}                 # ~8 kB per entry
+    cache = AnalysisCache(tmp_path, max_bytes=20_000)
+    cache.store(1, "a", "k", block)
+    cache.store(1, "b", "k", block)
+    os.utime(tmp_path / "p1" / "a-k", (1, 1))     # a is older ...
+    os.utime(tmp_path / "p1" / "b-k", (2, 2))
+    assert cache.load(1, "a", "k") is not None    # ... until it is read again
+    cache.store(1, "c", "k", block)
+
+    assert cache.load(1, "b", "k") is None
+    assert cache.load(1, "a", "k") is not None and cache.size() <= 20_000
+
+
+def test_tree_arrays_survive_the_cache(tmp_path):
+    tree = TreeArrays.from_tree(_Node(children=[
+        _Node(length=1.0, children=[_Node("a", 1.0), _Node("b", 2.0)]), _Node("c", 4.0)]))
+    cache = AnalysisCache(tmp_path)
+    cache.store(1, "tree", "k", tree.to_arrays())
+    again = TreeArrays.from_arrays(cache.load(1, "tree", "k"))
+
+    assert again.tip_names.tolist() == tree.tip_names.tolist()
+    np.testing.assert_array_equal(again.tip_index(["c", "z"]), tree.tip_index(["c", "z"]))
+    assert [lvl.tolist() for lvl in again.levels] == [lvl.tolist() for lvl in tree.levels]
+
+
+def test_ingest_invalidates_the_project(db):
+    cache = analysis_cache.default_cache()
+    cache.store(db["project_id"], "beta-bray_curtis", "k", {"x": np.ones(2)})
+    run_id = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")["run_id"]
+    ingest_run_data(run_id, [], FEATURES, {"asv1": 3})
+    assert cache.load(db["project_id"], "beta-bray_curtis", "k") is None
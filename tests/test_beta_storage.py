@@ -0,0 +1,117 @@
+"""
+tests/test_beta_storage.py
+
+Bulk beta diversity and PCoA writers.
+
+Run:
+    python -m pytest tests/test_beta_storage.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import src.db.database as database
+from src.db.migrations import run_migrations
+
+from src.services.assessment_service import (
+    ServiceError, create_project, create_run, get_beta_diversity_matrix, get_pcoa,
+    store_beta_diversity_matrix, store_pcoa_bulk, store_pcoa_ordination, get_pcoa_axes,
+    delete_project,
+)
+
+
+def _runs(project_id: int, n: int) -> dict[str, int]:
+    return {f"R{i + 1}": create_run(project_id, source="ncbi", srr_accession=f"SRR{i}")["run_id"]
+            for i in range(n)}
+
+
+def test_store_matrix_writes_upper_triangle_once(db):
+    labels = _runs(db["project_id"], 3)
+    mat = np.array([[0, .1, .2], [.1, 0, .3], [.2, .3, 0]])
+    assert store_beta_diversity_matrix(db["project_id"], "bray_curtis", labels, mat) == 3
+    # re-analysis overwrites in place
+    store_beta_diversity_matrix(db["project_id"], "bray_curtis", labels, mat * 2)
+
+    stored, run_ids = get_beta_diversity_matrix(db["project_id"], "bray_curtis")
+    assert run_ids == sorted(labels.values())
+    np.testing.assert_allclose(stored, mat * 2)
+
+
+def test_get_matrix_follows_requested_order(db):
+    labels = _runs(db["project_id"], 3)
+    r1, r2, r3 = labels.values()
+    store_beta_diversity_matrix(db["project_id"], "unifrac", {"R1": r1, "R2": r2},
+                                np.array([[0, .5], [.5, 0]]))
+
+    stored, run_ids = get_beta_diversity_matrix(db["project_id"], "unifrac", [r2, r3, r1])
+    assert run_ids == [r2, r3, r1]
+    np.testing.assert_allclose(stored, [[0, 0, .5], [0, 0, 0], [.5, 0, 0]])
+
+    empty, ids = get_beta_diversity_matrix(db["project_id"], "bray_curtis", [r1, r2])
+    assert empty.shape == (0, 0) and ids == []
+
+
+def test_store_matrix_rejects_foreign_runs(db):
+    labels = _runs(db["project_id"], 2)
+    other = create_project(db["user_id"], "Other")["project_id"]
+    with pytest.raises(ServiceError):
+        store_beta_diversity_matrix(other, "bray_curtis", labels, np.zeros((2, 2)))
+
+
+def test_store_pcoa_bulk_upserts(db):
+    labels = _runs(db["project_id"], 2)
+    r1, r2 = labels.values()
+    store_pcoa_bulk("bray_curtis", {r1: (0.1, 0.2), r2: (0.3, 0.4)})
+    store_pcoa_bulk("bray_curtis", {r1: (1.0, 2.0)})
+
+    coords = {r["run_id"]: (r["pc1"], r["pc2"]) for r in get_pcoa(db["project_id"], "bray_curtis")}
+    assert coords == {r1: (1.0, 2.0), r2: (0.3, 0.4)}
+
+
+def test_store_pcoa_rejects_unknown_runs_but_not_bad_coords(db):
+    labels = _runs(db["project_id"], 2)
+    r1, r2 = labels.values()
+    with pytest.raises(ServiceError):
+        store_pcoa_bulk("bray_curtis", {r1: (0.1, 0.2), r2 + 100: (0.3, 0.4)})
+    other = create_project(db["user_id"], "Other")["project_id"]
+    with pytest.raises(ServiceError):
+        store_pcoa_ordination(other, "bray_curtis", {r1: (1, 2), r2: (3, 4)}, [1.0, 0.5], [0.6, 0.4])
+    # a malformed coordinate is a caller bug, not a storage failure
+    with pytest.raises(TypeError):
+        store_pcoa_ordination(db["project_id"], "bray_curtis", {r1: None, r2: (3, 4)}, [1.0], [1.0])
+    assert get_pcoa(db["project_id"], "bray_curtis") == []
+
+
+def test_store_pcoa_ordination_keeps_k_axes_and_eigenvalues(db):
+    labels = _runs(db["project_id"], 2)
+    r1, r2 = labels.values()
+    store_pcoa_ordination(db["project_id"], "bray_curtis", {r1: (1, 2, 3), r2: (-1, -2, -3)},
+                          [4.0, 2.0, 1.0], [0.5, 0.25, 0.125])
+
+    rows = {r["run_id"]: r for r in get_pcoa(db["project_id"], "bray_curtis")}
+    assert (rows[r1]["pc1"], rows[r1]["pc2"], rows[r1]["coords"]) == (1.0, 2.0, [1.0, 2.0, 3.0])
+    assert [a["proportion_explained"] for a in get_pcoa_axes(db["project_id"], "bray_curtis")] \
+        == [0.5, 0.25, 0.125]
+
+    # re-ordination with fewer axes replaces, rather than extends, the eigenvalues
+    store_pcoa_ordination(db["project_id"], "bray_curtis", {r1: (1, 0), r2: (-1, 0)}, [4.0], [1.0])
+    assert len(get_pcoa_axes(db["project_id"], "bray_curtis")) == 1
+    assert {r["run_id"]: r["coords"] for r in get_pcoa(db["project_id"], "bray_curtis")}[r1] == [1.0, 0.0]
+
+    delete_project(db["project_id"])
+    assert get_pcoa_axes(db["project_id"], "bray_curtis") == []
+
+
+def test_migration_renames_legacy_unifrac_metric(db):
+    labels = _runs(db["project_id"], 2)
+    store_beta_diversity_matrix(db["project_id"], "unifrac", labels, np.array([[0, .3], [.3, 0]]))
+    store_pcoa_bulk("unifrac", {rid: (0.0, 0.0) for rid in labels.values()})
+
+    run_migrations(database.get_engine())
+
+    assert get_beta_diversity_matrix(db["project_id"], "unifrac")[1] == []
+    stored, _ = get_beta_diversity_matrix(db["project_id"], "weighted_normalized_unifrac")
+    assert stored[0, 1] == pytest.approx(0.3)
+    assert len(get_pcoa(db["project_id"], "weighted_normalized_unifrac")) == 2
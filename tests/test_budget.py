@@ -0,0 +1,192 @@
+"""
+tests/test_budget.py
+
+Shared core / memory budget for QiimeRunner subprocesses: thread grants,
+queueing when the pool is exhausted, allocation snapshots for the UI and
+cancellation of queued jobs. The "QIIME" commands are a Python one-liner
+that sleeps and records the thread count it was given.
+
+Run:
+    python -m pytest tests/test_budget.py -v
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src.pipeline.budget import THREADS, BudgetCancelled, ResourceBudget, describe
+from src.pipeline.qiime2_runner import QiimeRunner
+
+
+SLEEP = 0.3
+
+
+def _runner(budget: ResourceBudget) -> QiimeRunner:
+    runner = QiimeRunner(budget=budget)
+    runner.base_cmd = []        # run the fake command directly, not through micromamba
+    return runner
+
+
+def _sleeper(seconds: float = SLEEP) -> list[str]:
+    """Sleeps, then prints the thread count passed as its last argument."""
+    return [sys.executable, "-c", f"import sys, time; time.sleep({seconds}); print('threads', sys.argv[-1])", THREADS]
+
+
+def _in_threads(*calls) -> list:
+    """Run each call on its own thread; return their results (or exceptions) in order."""
+    results = [None] * len(calls)
+
+    def target(i, call):
+        try:
+            results[i] = call()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=target, args=(i, c)) for i, c in enumerate(calls)]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)        # keep the queue order deterministic
+    for t in threads:
+        t.join(10)
+    return results
+
+
+def _granted(lines: list[str]) -> int:
+    return int(next(l.split()[1] for l in lines if l.startswith("threads")))
+
+
+def test_jobs_queue_when_cores_run_out():
+    budget = ResourceBudget(cores=2)
+    peak = []
+    budget.add_listener(lambda snap: peak.append(sum(a.threads for a in snap.running)))
+    runner = _runner(budget)
+
+    start = time.monotonic()
+    _in_threads(*[lambda: runner.run(_sleeper(), threads=1) for _ in range(4)])
+    elapsed = time.monotonic() - start
+
+    assert max(peak) == 2
+    assert elapsed >= 2 * SLEEP             # 4 one-thread jobs on 2 cores: two rounds
+    assert budget.snapshot().free_cores == 2
+
+
+def test_threaded_jobs_share_the_pool_with_a_plain_one():
+    budget = ResourceBudget(cores=4)
+    peak = []
+    budget.add_listener(lambda snap: peak.append(len(snap.running)))
+    runner = _runner(budget)
+    out = {"first": [], "second": []}
+    start = time.monotonic()
+    _in_threads(
+        lambda: runner.run(_sleeper(), callback=out["first"].append),       # THREADS: half the pool
+        lambda: runner.run(_sleeper(), callback=out["second"].append),      # what is left bar one core
+        lambda: runner.run([sys.executable, "-c", f"import time; time.sleep({SLEEP})"]),
+    )
+    assert time.monotonic() - start < 2 * SLEEP     # all three overlapped
+    assert max(peak) == 3
+    assert (_granted(out["first"]), _granted(out["second"])) == (2, 1)
+
+
+def test_threaded_job_leaves_a_core_for_single_threaded_ones():
+    budget = ResourceBudget(cores=4)
+    runner = _runner(budget)
+    out = []
+    start = time.monotonic()
+    _in_threads(
+        lambda: runner.run(_sleeper(), threads=8, callback=out.append),
+        lambda: runner.run([sys.executable, "-c", f"import time; time.sleep({SLEEP})"]),
+    )
+    assert _granted(out) == 3
+    assert time.monotonic() - start < 2 * SLEEP
+
+
+def test_min_threads_waits_for_enough_cores():
+    budget = ResourceBudget(cores=4)
+    runner = _runner(budget)
+    out = []
+    start = time.monotonic()
+    _in_threads(
+        lambda: runner.run(_sleeper(), threads=3),
+        lambda: runner.run(_sleeper(0), threads=4, min_threads=2, callback=out.append),
+    )
+    assert time.monotonic() - start >= SLEEP        # only 1 core free until the first job ends
+    assert _granted(out) == 3                       # one core stays free for single-threaded jobs
+
+
+def test_memory_reservations_serialise_large_jobs():
+    budget = ResourceBudget(cores=4, memory_mb=1000)
+    runner = _runner(budget)
+    start = time.monotonic()
+    _in_threads(*[lambda: runner.run(_sleeper(), threads=1, memory_mb=600) for _ in range(2)])
+    assert time.monotonic() - start >= 2 * SLEEP
+    assert budget.snapshot().free_memory_mb == 1000
+
+
+def test_snapshot_lists_running_and_queued_jobs():
+    budget = ResourceBudget(cores=1)
+    first = budget.acquire(budget.request("qiime deblur denoise-16S", threads=4))
+    waiting = budget.request("qiime phylogeny align-to-tree-mafft-fasttree")
+
+    snap = budget.snapshot()
+    assert [(a.job, a.threads) for a in snap.running] == [("qiime deblur denoise-16S", 1)]
+    assert snap.queued == ["qiime phylogeny align-to-tree-mafft-fasttree"]
+    assert snap.free_cores == 0
+
+    assert describe(snap) == "1/1 cores · qiime deblur denoise-16S (1) · 1 queued"
+
+    budget.release(first)
+    second = budget.acquire(waiting)
+    assert budget.snapshot().queued == [] and second.threads == 1
+    budget.release(second)
+    assert describe(budget.snapshot()) == ""
+
+
+def test_cancel_kills_running_and_drops_queued_jobs():
+    runner = _runner(ResourceBudget(cores=1))
+    results = []
+    worker = threading.Thread(target=lambda: results.extend(_in_threads(
+        lambda: runner.run(_sleeper(30), threads=1),
+        lambda: runner.run(_sleeper(30), threads=1),
+    )))
+    worker.start()
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    runner.cancel()
+    worker.join(10)
+    assert time.monotonic() - start < 5
+    assert isinstance(results[0], subprocess.CalledProcessError)
+    assert isinstance(results[1], BudgetCancelled)
+    assert runner.budget.snapshot().free_cores == 1
+
+
+def test_fq_run_drains_output_and_is_cancellable():
+    runner = _runner(ResourceBudget(cores=1))
+    # more output than a pipe buffer holds: would hang if stdout were not read
+    start = time.monotonic()
+    runner.fq_run([sys.executable, "-c", "print('x' * 1_000_000)"])
+    assert time.monotonic() - start < 5
+
+    worker = threading.Thread(target=lambda: runner.fq_run(_sleeper(30)))
+    worker.start()
+    time.sleep(0.5)
+    runner.cancel()
+    worker.join(10)
+    assert not worker.is_alive()
+    assert runner.budget.snapshot().free_cores == 1
+
+
+def test_request_is_capped_to_the_pool():
+    budget = ResourceBudget(cores=2, memory_mb=100)
+    alloc = budget.acquire(budget.request("huge", threads=64, min_threads=64, memory_mb=10_000))
+    assert (alloc.threads, alloc.memory_mb) == (2, 100)
+    budget.release(alloc)
+    with pytest.raises(BudgetCancelled):
+        req = budget.request("never")
+        budget.cancel(req)
+        budget.acquire(req)
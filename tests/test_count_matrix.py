@@ -0,0 +1,79 @@
+"""
+tests/test_count_matrix.py
+
+Project count matrix loader and its ingest_version-keyed cache.
+
+Run:
+    python -m pytest tests/test_count_matrix.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from src.services.assessment_service import create_run, ingest_run_data
+from src.services.count_matrix import load_count_matrix, get_cached_count_matrix
+
+
+FEATURES = [
+    {"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"},
+    {"feature_id": "asv2", "sequence": "GGCC", "taxonomy": "g__B"},
+    {"feature_id": "asv3", "sequence": "TTAA", "taxonomy": "g__C"},
+]
+
+
+def _seed(project_id: int) -> tuple[int, int, int]:
+    r1 = create_run(project_id, source="ncbi", srr_accession="SRR1")["run_id"]
+    r2 = create_run(project_id, source="ncbi", srr_accession="SRR2")["run_id"]
+    r3 = create_run(project_id, source="ncbi", srr_accession="SRR3")["run_id"]   # never ingested
+    ingest_run_data(r1, [], FEATURES, {"asv1": 5, "asv2": 1})
+    ingest_run_data(r2, [], FEATURES, {"asv3": 7})        # only in the second run
+    return r1, r2, r3
+
+
+def test_matrix_covers_union_of_features(db):
+    r1, r2, r3 = _seed(db["project_id"])
+    cm = load_count_matrix(db["project_id"])
+
+    assert cm.feature_ids.tolist() == ["asv1", "asv2", "asv3"]
+    assert cm.run_ids.tolist() == [r1, r2]
+    np.testing.assert_array_equal(cm.rows_for([r2, r3, r1]),
+                                  [[0, 0, 7], [0, 0, 0], [5, 1, 0]])
+
+
+def test_sparse_matches_dense(db):
+    r1, r2, _ = _seed(db["project_id"])
+    dense = load_count_matrix(db["project_id"])
+    csr = load_count_matrix(db["project_id"], as_sparse=True)
+
+    assert csr.is_sparse and csr.counts.nnz == 3
+    np.testing.assert_array_equal(csr.dense(), dense.counts)
+    np.testing.assert_array_equal(csr.rows_for([r2, r1]), dense.rows_for([r2, r1]))
+
+
+def test_sparse_rows_and_run_counts(db):
+    r1, r2, r3 = _seed(db["project_id"])
+    csr = load_count_matrix(db["project_id"], as_sparse=True)
+
+    assert csr.counts.dtype == np.int32
+    rows = csr.rows_for([r2, r3, r1], sparse=True)
+    assert rows.format == "csr" and rows.nnz == 3
+    np.testing.assert_array_equal(rows.toarray(), [[0, 0, 7], [0, 0, 0], [5, 1, 0]])
+
+    ids, counts = csr.run_counts(r1)
+    assert dict(zip(ids, counts.tolist())) == {"asv1": 5, "asv2": 1}
+    assert len(csr.run_counts(r3)[0]) == 0
+
+
+def test_cache_reloads_only_after_ingest(db):
+    r1, _, r3 = _seed(db["project_id"])
+    cache: dict = {}
+    first = get_cached_count_matrix(cache, db["project_id"])
+    assert get_cached_count_matrix(cache, db["project_id"]) is first
+
+    ingest_run_data(r3, [], None, {"asv2": 4})
+    second = get_cached_count_matrix(cache, db["project_id"])
+
+    assert second is not first and second.version > first.version
+    assert len(cache) == 1                                # stale version evicted
+    assert second.rows_for([r3]).tolist() == [[0, 4, 0]]
@@ -0,0 +1,227 @@
+"""
+tests/test_dag.py
+
+DAG executor for the preprocessing pipeline: dependency order from
+input/output paths, per-step content-hash caching (a parameter or input
+change reruns only what is downstream of it), concurrent independent
+branches, and failure / skip propagation.
+
+Run:
+    python -m pytest tests/test_dag.py -v
+"""
+
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.pipeline.dag import (
+    CACHED, DONE, SKIPPED, DagExecutor, PipelineError, SkipBranch, Step,
+)
+import src.pipeline.qiime_preproc as preproc
+from src.pipeline.qiime_preproc import layout_steps
+
+
+def _pipeline(tmp_path, calls: list[str], params: dict | None = None) -> list[Step]:
+    """
+    src.txt -> upper (upper.txt) -> count (count.txt)
+            -> reverse (reverse.txt)
+    """
+    params = params or {}
+    src, upper, count, rev = (tmp_path / n for n in ("src.txt", "upper.txt", "count.txt", "reverse.txt"))
+
+    def _upper():
+        calls.append("upper")
+        upper.write_text(src.read_text().upper() * params.get("repeat", 1))
+
+    def _count():
+        calls.append("count")
+        count.write_text(str(len(upper.read_text())))
+
+    def _reverse():
+        calls.append("reverse")
+        rev.write_text(src.read_text()[::-1])
+
+    return [
+        Step("count", _count, inputs=[upper], outputs=[count]),
+        Step("upper", _upper, inputs=[src], outputs=[upper], params={"repeat": params.get("repeat", 1)}),
+        Step("reverse", _reverse, inputs=[src], outputs=[rev]),
+    ]
+
+
+def _run(tmp_path, calls, params=None, **kwargs) -> dict[str, str]:
+    return DagExecutor(_pipeline(tmp_path, calls, params), tmp_path / ".steps",
+                       log=lambda msg: None, **kwargs).run()
+
+
+def test_runs_in_dependency_order_then_caches(tmp_path):
+    (tmp_path / "src.txt").write_text("acgt")
+    calls = []
+    assert _run(tmp_path, calls) == {"upper": DONE, "count": DONE, "reverse": DONE}
+    assert calls.index("upper") < calls.index("count")
+    assert (tmp_path / "count.txt").read_text() == "4"
+
+    calls.clear()
+    assert set(_run(tmp_path, calls).values()) == {CACHED}
+    assert calls == []
+
+
+def test_param_change_reruns_only_downstream(tmp_path):
+    (tmp_path / "src.txt").write_text("acgt")
+    _run(tmp_path, [])
+    calls = []
+    state = _run(tmp_path, calls, params={"repeat": 2})
+    assert state == {"upper": DONE, "count": DONE, "reverse": CACHED}
+    assert sorted(calls) == ["count", "upper"]
+    assert (tmp_path / "count.txt").read_text() == "8"
+
+
+def test_input_content_change_invalidates(tmp_path):
+    (tmp_path / "src.txt").write_text("acgt")
+    _run(tmp_path, [])
+    (tmp_path / "src.txt").write_text("ttttt")
+    calls = []
+    _run(tmp_path, calls)
+    assert sorted(calls) == ["count", "reverse", "upper"]
+    assert (tmp_path / "count.txt").read_text() == "5"
+
+
+def test_unchanged_rewrite_of_an_intermediate_stops_propagation(tmp_path):
+    (tmp_path / "src.txt").write_text("acgt")
+    _run(tmp_path, [])
+    # upper reruns (its output no longer matches the stamp) and writes back
+    # the same bytes, so count -- keyed on that content -- stays cached
+    (tmp_path / "upper.txt").write_text("tampered")
+    calls = []
+    state = _run(tmp_path, calls)
+    assert state["upper"] == DONE and state["count"] == CACHED
+
+
+def test_missing_output_is_rebuilt(tmp_path):
+    (tmp_path / "src.txt").write_text("acgt")
+    _run(tmp_path, [])
+    (tmp_path / "reverse.txt").unlink()
+    calls = []
+    _run(tmp_path, calls)
+    assert calls == ["reverse"]
+
+
+def test_independent_branches_run_concurrently(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(name):
+        def run():
+            barrier.wait()          # deadlocks (BrokenBarrierError) if run serially
+            (tmp_path / f"{name}.out").write_text(name)
+        return Step(name, run, outputs=[tmp_path / f"{name}.out"])
+
+    state = DagExecutor([branch("paired"), branch("single")], tmp_path / ".steps",
+                        max_workers=2, log=lambda msg: None).run()
+    assert state == {"paired": DONE, "single": DONE}
+
+
+def test_skip_and_failure_stop_only_their_branch(tmp_path):
+    ran = []
+
+    def step(name, inputs=(), fail=None):
+        out = tmp_path / f"{name}.out"
+
+        def run():
+            if fail:
+                raise fail
+            ran.append(name)
+            out.write_text(name)
+        return Step(name, run, inputs=list(inputs), outputs=[out])
+
+    steps = [
+        step("a_denoise", fail=SkipBranch("no reads")),
+        step("a_tables", [tmp_path / "a_denoise.out"]),
+        step("b_denoise", fail=RuntimeError("boom")),
+        step("b_tables", [tmp_path / "b_denoise.out"]),
+        step("c_denoise"),
+        step("c_tables", [tmp_path / "c_denoise.out"]),
+    ]
+    logs = []
+    with pytest.raises(RuntimeError, match="boom"):
+        DagExecutor(steps, tmp_path / ".steps", log=logs.append).run()
+    assert sorted(ran) == ["c_denoise", "c_tables"]
+    assert "[a_denoise] no reads" in logs
+
+    # a skipped step leaves no stamp, so it is retried next time
+    steps[0] = step("a_denoise")
+    steps[2] = step("b_denoise")
+    state = DagExecutor(steps, tmp_path / ".steps", log=logs.append).run()
+    assert state["a_tables"] == DONE and state["c_tables"] == CACHED
+
+
+def test_step_without_its_outputs_is_not_cached(tmp_path):
+    calls = []
+    step = Step("noop", lambda: calls.append(1), outputs=[tmp_path / "never.txt"])
+    DagExecutor([step], tmp_path / ".steps", log=lambda msg: None).run()
+    DagExecutor([step], tmp_path / ".steps", log=lambda msg: None).run()
+    assert calls == [1, 1]
+
+
+def test_invalid_graphs_are_rejected(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    with pytest.raises(PipelineError, match="cycle"):
+        DagExecutor([Step("x", lambda: None, inputs=[a], outputs=[b]),
+                     Step("y", lambda: None, inputs=[b], outputs=[a])], tmp_path)
+    with pytest.raises(PipelineError, match="both"):
+        DagExecutor([Step("x", lambda: None, outputs=[a]),
+                     Step("y", lambda: None, outputs=[a])], tmp_path)
+    with pytest.raises(PipelineError, match="unknown"):
+        DagExecutor([Step("x", lambda: None, after=["z"])], tmp_path)
+
+
+def test_preprocessing_layouts_are_independent_branches(tmp_path):
+    state = SimpleNamespace(local_paths={"paired": None, "single": None})
+    steps = [s for layout in ("paired", "single") for s in layout_steps(None, "PRJTEST", layout, state)]
+    deps = DagExecutor(steps, tmp_path).deps
+    assert deps["paired/denoise"] == {"paired/import", "paired/qc"}
+    assert deps["paired/tables"] == {"paired/denoise"}
+    assert deps["paired/taxa-tables"] == {"paired/denoise", "paired/classify"}
+    assert not any(d.startswith("single/") for name, ds in deps.items() if name.startswith("paired/") for d in ds)
+
+
+def test_failed_classification_skips_only_the_genus_tables(tmp_path, monkeypatch):
+    io_dir, reps = tmp_path / "qiime", tmp_path / "reps-tree"
+    io_dir.mkdir()
+    ran = []
+
+    def writes(name, *files):
+        def fake(*args, **kwargs):
+            ran.append(name)
+            for f in files:
+                f.write_text(name)
+        return fake
+
+    def classify_fails(*args, **kwargs):
+        ran.append("classify")
+        raise RuntimeError("No such plugin")
+
+    monkeypatch.setattr(preproc, "_layout_dirs", lambda *args: (io_dir, reps))
+    monkeypatch.setattr(preproc, "import_samples", writes("import", io_dir / "demux.qza"))
+    monkeypatch.setattr(preproc, "qc", lambda *args, **kwargs: {"single": 120})
+    monkeypatch.setattr(preproc, "dada2_denoise", writes(
+        "denoise", io_dir / "table.qza", reps / "rep-seqs.qza", io_dir / "stats.qza"))
+    monkeypatch.setattr(preproc, "classify_taxa", classify_fails)
+    monkeypatch.setattr(preproc, "create_tables", writes(
+        "tables", io_dir / "feature-table.tsv", reps / "dna-sequences.fasta"))
+    monkeypatch.setattr(preproc, "create_taxa_tables", writes("taxa-tables"))
+
+    state = SimpleNamespace(local_paths={"paired": None, "single": None})
+    logs = []
+    run = lambda: DagExecutor(layout_steps(None, "PRJTEST", "single", state), tmp_path / ".steps",
+                              log=logs.append).run()
+    first = run()
+    assert first["single/tables"] == DONE
+    assert first["single/classify"] == first["single/taxa-tables"] == SKIPPED
+    assert any("** WARNING: Taxonomy assignment skipped" in msg for msg in logs)
+
+    ran.clear()
+    second = run()
+    assert second["single/tables"] == CACHED and second["single/denoise"] == CACHED
+    assert ran == ["classify"]           # only the failed classification is retried
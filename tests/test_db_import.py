@@ -0,0 +1,125 @@
+"""
+tests/test_db_import.py
+
+Unit tests for pipeline/db_import.py parsers, run against small
+hand-written QIIME2 / biom TSV exports.
+
+Run:
+    python -m pytest tests/test_db_import.py -v
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from src.pipeline.db_import import (
+    clean_genus, read_biom_tsv, parse_genus_table, parse_feature_counts,
+    parse_feat_tax_seqs,
+)
+
+
+GENUS_TSV = """\
+# Constructed from biom file
+#OTU ID\tSRR1\tSRR2
+d__Bacteria;p__Bacteroidota;c__Bacteroidia;o__Bacteroidales;f__Bacteroidaceae;g__Bacteroides\t0.6\t0.25
+d__Bacteria;p__Firmicutes;c__Clostridia;o__Oscillospirales;f__Ruminococcaceae;g__[Eubacterium]\t0.4\t0.0
+d__Bacteria;p__Firmicutes;c__Clostridia;o__Lachnospirales;f__Lachnospiraceae;g__uncultured\t0.0\t0.75
+"""
+
+FEATURE_TSV = """\
+# Constructed from biom file
+#OTU ID\tSRR1\tSRR2
+21f4de567ca86c973a9a0d07ed17e3d2\t4655.0\t0.0
+9cc977b5dee75ca96f18928722049c50\t3818.0\t12.0
+"""
+
+
+@pytest.fixture
+def genus_tsv(tmp_path):
+    p = tmp_path / "genus-table.tsv"
+    p.write_text(GENUS_TSV)
+    return str(p)
+
+
+@pytest.fixture
+def feature_tsv(tmp_path):
+    p = tmp_path / "feature-table.tsv"
+    p.write_text(FEATURE_TSV)
+    return str(p)
+
+
+def test_clean_genus():
+    assert clean_genus("d__Bacteria;g__Bacteroides") == "Bacteroides"
+    assert clean_genus("d__Bacteria;g__[Eubacterium]") == "Eubacterium"
+    assert clean_genus("d__Bacteria;g__uncultured") == "Unclassified"
+    assert clean_genus("d__Bacteria;p__Firmicutes") == "Unclassified"
+
+
+def test_read_biom_tsv_is_sample_major(feature_tsv):
+    ids, samples, mat = read_biom_tsv(feature_tsv)
+    assert list(ids) == ["21f4de567ca86c973a9a0d07ed17e3d2", "9cc977b5dee75ca96f18928722049c50"]
+    assert samples == ["SRR1", "SRR2"]
+    assert mat.shape == (2, 2)
+    assert mat.flags["C_CONTIGUOUS"]
+    assert mat[1].tolist() == [0.0, 12.0]
+
+
+def test_parse_genus_table_shape(genus_tsv):
+    records = parse_genus_table(genus_tsv)
+    assert set(records) == {"SRR1", "SRR2"}
+    assert records["SRR1"] == [("Bacteroides", 0.6), ("Eubacterium", 0.4), ("Unclassified", 0.0)]
+    assert records["SRR2"] == [("Bacteroides", 0.25), ("Eubacterium", 0.0), ("Unclassified", 0.75)]
+    assert all(isinstance(v, float) for _, v in records["SRR1"])
+
+
+def test_parse_genus_table_missing_file(tmp_path):
+    assert parse_genus_table(str(tmp_path / "nope.tsv")) == {}
+
+
+def test_parse_feature_counts_shape(feature_tsv):
+    counts = parse_feature_counts(feature_tsv)
+    assert counts == {
+        "SRR1": {"21f4de567ca86c973a9a0d07ed17e3d2": 4655, "9cc977b5dee75ca96f18928722049c50": 3818},
+        "SRR2": {"21f4de567ca86c973a9a0d07ed17e3d2": 0,    "9cc977b5dee75ca96f18928722049c50": 12},
+    }
+    assert all(type(v) is int for v in counts["SRR1"].values())
+
+
+TAXONOMY_TSV = """\
+Feature ID\tTaxon\tConfidence
+asv1\td__Bacteria;g__Bacteroides\t0.99
+asv3\td__Bacteria;g__Prevotella_9\t0.87
+"""
+
+WRAPPED_FASTA = """\
+>asv1
+TGGGCGAGAG
+CCTGAACCAG
+
+>asv2 some description
+CCAAGTAGCG
+>asv3
+TG
+"""
+
+
+def test_parse_feat_tax_seqs_multiline_and_join(tmp_path):
+    tax = tmp_path / "taxonomy.tsv"
+    tax.write_text(TAXONOMY_TSV)
+    fasta = tmp_path / "dna-sequences.fasta"
+    fasta.write_text(WRAPPED_FASTA)
+
+    feats = parse_feat_tax_seqs(str(tax), str(fasta))
+    assert feats == [
+        {"sequence": "TGGGCGAGAGCCTGAACCAG", "feature_id": "asv1", "taxonomy": "d__Bacteria;g__Bacteroides"},
+        {"sequence": "CCAAGTAGCG",           "feature_id": "asv2", "taxonomy": None},
+        {"sequence": "TG",                   "feature_id": "asv3", "taxonomy": "d__Bacteria;g__Prevotella_9"},
+    ]
+
+
+def test_parse_feat_tax_seqs_without_taxonomy(tmp_path):
+    fasta = tmp_path / "dna-sequences.fasta"
+    fasta.write_text(">asv1\nACGT\n>asv2\nGGCC\n")
+    feats = parse_feat_tax_seqs(str(tmp_path / "missing.tsv"), str(fasta))
+    assert [f["feature_id"] for f in feats] == ["asv1", "asv2"]
+    assert all(f["taxonomy"] is None for f in feats)
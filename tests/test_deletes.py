@@ -0,0 +1,85 @@
+"""
+tests/test_deletes.py
+
+Set-based delete / replace paths in the repository and service layers.
+
+Run:
+    python -m pytest tests/test_deletes.py -v
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import func, select
+
+import src.db.database as database
+from src.db.db_models import AlphaDiversity, Feature, FeatureCount, Project, Run
+from src.db.repository import delete_features_for_run
+from src.services.assessment_service import (
+    create_run, ingest_run_data, store_alpha_diversities_bulk, get_alpha_diversities,
+    store_beta_diversity, store_pcoa, delete_project,
+)
+
+
+FEATURES = [
+    {"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"},
+    {"feature_id": "asv2", "sequence": "GGCC", "taxonomy": "g__B"},
+]
+
+
+def _count(model) -> int:
+    session = database.SessionLocal()
+    try:
+        return session.scalar(select(func.count()).select_from(model))
+    finally:
+        session.close()
+
+
+def _two_runs(project_id: int) -> tuple[int, int]:
+    r1 = create_run(project_id, source="ncbi", srr_accession="SRR1")["run_id"]
+    r2 = create_run(project_id, source="ncbi", srr_accession="SRR2")["run_id"]
+    ingest_run_data(r1, [("A", 1.0)], FEATURES, {"asv1": 3, "asv2": 1})
+    ingest_run_data(r2, [("A", 1.0)], FEATURES, {"asv1": 2})
+    return r1, r2
+
+
+def test_delete_features_for_run_prunes_unshared_entries(db):
+    r1, _ = _two_runs(db["project_id"])
+    session = database.SessionLocal()
+    try:
+        delete_features_for_run(session, r1, prune=True)
+        session.commit()
+    finally:
+        session.close()
+    assert _count(FeatureCount) == 1
+    assert _count(Feature) == 1        # asv2 was only counted by r1
+
+
+def test_store_alpha_diversities_bulk_replaces_rows(db):
+    r1, r2 = _two_runs(db["project_id"])
+    store_alpha_diversities_bulk({r1: {"shannon": 1.0, "simpson": 0.5}, r2: {"shannon": 2.0}})
+    store_alpha_diversities_bulk({r1: {"shannon": 1.5}})
+
+    assert get_alpha_diversities(r1) == [{"metric": "shannon", "value": 1.5}]
+    assert get_alpha_diversities(r2) == [{"metric": "shannon", "value": 2.0}]
+
+
+def test_store_alpha_diversities_bulk_scoped_to_metrics(db):
+    r1, _ = _two_runs(db["project_id"])
+    store_alpha_diversities_bulk({r1: {"shannon": 1.0, "faith_pd": 3.0}})
+    store_alpha_diversities_bulk({r1: {"shannon": 1.5, "pielou_evenness": float("nan")}},
+                                 ["shannon", "pielou_evenness"])
+
+    stored = {a["metric"]: a["value"] for a in get_alpha_diversities(r1)}
+    assert stored == {"shannon": 1.5, "faith_pd": 3.0}        # NaN not stored, faith kept
+
+
+def test_delete_project_removes_every_child_table(db):
+    r1, r2 = _two_runs(db["project_id"])
+    store_alpha_diversities_bulk({r1: {"shannon": 1.0}})
+    store_beta_diversity(r1, r2, "bray_curtis", 0.4)
+    store_pcoa(r1, "bray_curtis", 0.1, 0.2)
+
+    delete_project(db["project_id"])
+
+    for model in (Project, Run, Feature, FeatureCount, AlphaDiversity):
+        assert _count(model) == 0
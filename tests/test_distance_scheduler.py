@@ -0,0 +1,73 @@
+"""
+tests/test_distance_scheduler.py
+
+Tiled pairwise scheduler: in-process and process-pool paths must agree with
+the single-process kernels.
+
+Run:
+    python -m pytest tests/test_distance_scheduler.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from src.services.distance_scheduler import DistanceScheduler, upper_tiles
+from src.services.diversity import braycurtis_matrix
+from src.services.unifrac import TreeArrays, unifrac_matrices
+
+
+class _Node:
+    def __init__(self, name=None, length=None, children=()):
+        self.name, self.length, self.children = name, length, list(children)
+
+
+def _random_tree(rng, n_tips: int) -> _Node:
+    nodes = [_Node(f"t{i}", rng.uniform(0.1, 1.0)) for i in range(n_tips)]
+    while len(nodes) > 1:
+        a, b = nodes.pop(rng.integers(len(nodes))), nodes.pop(rng.integers(len(nodes)))
+        nodes.append(_Node(None, rng.uniform(0.1, 1.0), [a, b]))
+    return nodes[0]
+
+
+def _counts(rng, n: int, f: int) -> np.ndarray:
+    counts = rng.poisson(3.0, size=(n, f)) * (rng.random((n, f)) < 0.3)
+    counts[1] = 0                                           # an empty run
+    return counts
+
+
+def test_tiles_cover_upper_triangle_once():
+    seen = np.zeros((10, 10), dtype=int)
+    for i0, i1, j0, j1 in upper_tiles(10, 3):
+        seen[i0:i1, j0:j1] += 1
+    # every pair i <= j exactly once; diagonal tiles also fill their own lower half
+    assert (np.triu(seen) == np.triu(np.ones_like(seen))).all()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_braycurtis_matches_serial_kernel(workers):
+    counts = _counts(np.random.default_rng(0), 23, 40)
+    calls = []
+    scheduler = DistanceScheduler(max_workers=workers, tile_size=5, min_rows=0,
+                                  progress=lambda done, total: calls.append((done, total)))
+
+    bc = scheduler.pairwise("braycurtis", {"x": counts})
+
+    np.testing.assert_allclose(bc, braycurtis_matrix(counts), atol=1e-12)
+    assert calls[-1][0] == calls[-1][1]                     # progress reaches the total
+    assert len(calls) == len(upper_tiles(23, 5))
+
+
+def test_unifrac_pool_matches_in_process():
+    rng = np.random.default_rng(1)
+    tree = TreeArrays.from_tree(_random_tree(rng, 30))
+    counts = _counts(rng, 17, 30)
+    tips = tree.tip_index([f"t{i}" for i in range(30)])
+    scheduler = DistanceScheduler(max_workers=2, tile_size=4, min_rows=0)
+
+    expected = unifrac_matrices(tree, counts, tips)
+    got = unifrac_matrices(tree, counts, tips, scheduler=scheduler)
+
+    for metric, matrix in expected.items():
+        np.testing.assert_allclose(got[metric], matrix, atol=1e-12, err_msg=metric)
@@ -0,0 +1,98 @@
+"""
+tests/test_diversity.py
+
+Numeric diversity kernels in src/services/diversity.py.
+
+Run:
+    python -m pytest tests/test_diversity.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from scipy import sparse as sp
+from scipy.spatial.distance import pdist, squareform
+
+from src.services.diversity import (
+    braycurtis_matrix, alpha_diversity,
+    OBSERVED, SHANNON, SIMPSON, CHAO1, ACE, PIELOU, GOODS_COVERAGE, FAITH_PD,
+)
+from src.services.unifrac import TreeArrays
+
+
+def _counts(n: int, f: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = rng.poisson(3, size=(n, f))
+    x[rng.random((n, f)) < 0.7] = 0     # mostly-zero, like real ASV tables
+    return x
+
+
+def test_braycurtis_matches_scipy():
+    x = _counts(25, 300)
+    expected = squareform(pdist(x, "braycurtis"))
+    np.testing.assert_allclose(braycurtis_matrix(x), expected, atol=1e-12)
+
+
+def test_braycurtis_blocking_and_sparse_input_agree():
+    x = _counts(40, 500, seed=1)
+    full = braycurtis_matrix(x)
+    tiny = braycurtis_matrix(sp.csr_matrix(x), block_bytes=1, feature_chunk=37)
+    np.testing.assert_allclose(tiny, full, atol=1e-12)
+
+
+def test_braycurtis_empty_rows_are_zero():
+    x = np.array([[0, 0, 0], [0, 0, 0], [1, 2, 0]])
+    bc = braycurtis_matrix(x)
+    assert bc[0, 1] == 0.0
+    assert bc[0, 2] == 1.0
+    np.testing.assert_array_equal(bc, bc.T)
+
+
+class _Node:
+    def __init__(self, name="", length=None, children=()):
+        self.name, self.length, self.children = name, length, list(children)
+
+
+def test_alpha_metrics_match_per_run_formulas():
+    x = np.array([[1, 1, 2, 3, 15, 0],
+                  [0, 0, 0, 0, 0, 0],      # nothing ingested
+                  [1, 1, 1, 0, 0, 0]])     # singletons only
+    out = alpha_diversity(x)
+
+    p = np.array([1, 1, 2, 3, 15]) / 22
+    np.testing.assert_allclose(out[OBSERVED], [5, 0, 3])
+    np.testing.assert_allclose(out[SHANNON][0], -(p * np.log2(p)).sum())
+    np.testing.assert_allclose(out[SIMPSON][0], 1 - (p ** 2).sum())
+    np.testing.assert_allclose(out[PIELOU][[0, 2]], [-(p * np.log2(p)).sum() / np.log2(5), 1.0])
+    np.testing.assert_allclose(out[CHAO1][[0, 2]], [5 + 2 * 1 / (2 * 2), 3 + 3 * 2 / 2])
+    np.testing.assert_allclose(out[GOODS_COVERAGE][[0, 2]], [1 - 2 / 22, 0.0])
+    # rare = {1, 1, 2, 3}: C = 5/7, gamma = (4 / C) * 8 / 42 - 1
+    c, gamma = 5 / 7, (4 / (5 / 7)) * 8 / 42 - 1
+    np.testing.assert_allclose(out[ACE][0], 1 + 4 / c + 2 / c * gamma)
+    assert np.isnan(out[ACE][2])                        # coverage estimate is zero
+    assert all(np.isnan(v[1]) for m, v in out.items() if m != OBSERVED)
+
+
+def test_faith_pd_sums_spanned_branches():
+    # ((a:1,b:2):1,c:4);
+    tree = TreeArrays.from_tree(_Node(children=[
+        _Node(length=1.0, children=[_Node("a", 1.0), _Node("b", 2.0)]),
+        _Node("c", 4.0),
+    ]))
+    x = np.array([[3, 0, 0, 9],     # a, plus a feature that is not on the tree
+                  [1, 1, 0, 0],
+                  [1, 0, 2, 0]])
+    tips = tree.tip_index(["a", "b", "c", "x"])
+
+    out = alpha_diversity(x, tree=tree, tip_index=tips)
+
+    np.testing.assert_allclose(out[FAITH_PD], [2.0, 4.0, 6.0])
+    assert FAITH_PD not in alpha_diversity(x)
+
+
+def test_alpha_sparse_input_matches_dense():
+    x = _counts(25, 60, seed=4)
+    x[3] = 0
+    dense, csr = alpha_diversity(x), alpha_diversity(sp.csr_matrix(x, dtype=np.int32))
+    for metric in dense:
+        np.testing.assert_allclose(csr[metric], dense[metric], equal_nan=True)
@@ -0,0 +1,191 @@
+"""
+tests/test_downloader.py
+
+Parallel, resumable .fastq.gz downloads with md5 checks,
+against local stand-in HTTP (with Range support) and FTP (with REST) servers.
+
+Run:
+    python -m pytest tests/test_downloader.py -v
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.pipeline.downloader import DownloadError, FileJob, download_files, fetch_file
+
+
+FASTQ = b"".join(b"@r%d\nACGTACGTAC\n+\nIIIIIIIIII\n" % i for i in range(5000))
+
+
+class _Files:
+    """Shared state of the stand-in servers: name -> bytes, plus request log."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.offsets: list[int] = []
+        self.cut: int | None = None         # drop the connection after this many bytes, once
+
+
+def _serve(files: _Files, name: str, offset: int, write) -> None:
+    files.offsets.append(offset)
+    body = files.data[name][offset:]
+    if files.cut is not None:
+        body, files.cut = body[:files.cut], None
+    write(body)
+
+
+@pytest.fixture
+def http(tmp_path):
+    files = _Files()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            name = self.path.lstrip("/")
+            if name not in files.data:
+                self.send_error(404)
+                return
+            data = files.data[name]
+            offset = int(self.headers["Range"][6:-1]) if self.headers.get("Range") else 0
+            self.send_response(206 if offset else 200)
+            self.send_header("Content-Length", str(len(data) - offset))
+            self.end_headers()
+            _serve(files, name, offset, self.wfile.write)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield files, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ftp():
+    files = _Files()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line: str) -> None:
+            self.wfile.write(line.encode() + b"\r\n")
+
+        def handle(self):
+            self.reply("220 ready")
+            rest, data_sock = 0, None
+            for raw in self.rfile:
+                cmd, _, arg = raw.decode().strip().partition(" ")
+                cmd = cmd.upper()
+                if cmd == "USER":
+                    self.reply("230 logged in")
+                elif cmd == "TYPE":
+                    self.reply("200 ok")
+                elif cmd == "SIZE":
+                    self.reply(f"213 {len(files.data[arg.lstrip('/')])}")
+                elif cmd == "PASV":
+                    data_sock = socket.create_server(("127.0.0.1", 0))
+                    port = data_sock.getsockname()[1]
+                    self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 255})")
+                elif cmd == "REST":
+                    rest = int(arg)
+                    self.reply("350 restarting")
+                elif cmd == "RETR":
+                    self.reply("150 opening")
+                    conn, _ = data_sock.accept()
+                    with conn:
+                        _serve(files, arg.lstrip("/"), rest, conn.sendall)
+                    data_sock.close()
+                    rest = 0
+                    self.reply("226 done")
+                elif cmd == "QUIT":
+                    self.reply("221 bye")
+                    return
+                else:
+                    self.reply("502 not implemented")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield files, f"ftp://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _publish(files: _Files, name: str, payload: bytes = FASTQ) -> tuple[bytes, str]:
+    gz = gzip.compress(payload)
+    files.data[name] = gz
+    return gz, hashlib.md5(gz).hexdigest()
+
+
+@pytest.mark.parametrize("server", ["http", "ftp"])
+def test_fetch_keeps_file_compressed_and_verifies_md5(request, tmp_path, server):
+    files, base = request.getfixturevalue(server)
+    gz, md5 = _publish(files, "SRR1.fastq.gz")
+    seen = []
+    dest = fetch_file(FileJob("SRR1", f"{base}/SRR1.fastq.gz", tmp_path / "SRR1.fastq.gz", md5, len(gz)),
+                      progress=lambda run, done, total: seen.append((run, done, total)))
+    assert dest.read_bytes() == gz
+    assert seen[-1] == ("SRR1", len(gz), len(gz))
+    assert list(tmp_path.iterdir()) == [dest]          # no .part files left behind
+
+
+@pytest.mark.parametrize("server", ["http", "ftp"])
+def test_interrupted_download_resumes_from_partial(request, tmp_path, server):
+    files, base = request.getfixturevalue(server)
+    gz, md5 = _publish(files, "SRR1.fastq.gz", FASTQ * 4)
+    files.cut = len(gz) // 3
+    job = FileJob("SRR1", f"{base}/SRR1.fastq.gz", tmp_path / "SRR1.fastq.gz", md5, len(gz))
+    assert gzip.decompress(fetch_file(job).read_bytes()) == FASTQ * 4
+    assert files.offsets == [0, len(gz) // 3]
+
+
+def test_leftover_partial_from_an_earlier_session_is_resumed(http, tmp_path):
+    files, base = http
+    gz, md5 = _publish(files, "SRR1.fastq.gz")
+    (tmp_path / "SRR1.fastq.gz.part").write_bytes(gz[:1000])
+    fetch_file(FileJob("SRR1", f"{base}/SRR1.fastq.gz", tmp_path / "SRR1.fastq.gz", md5, len(gz)))
+    assert files.offsets == [1000]
+    assert (tmp_path / "SRR1.fastq.gz").read_bytes() == gz
+
+
+def test_partial_larger_than_the_file_is_discarded(http, tmp_path):
+    files, base = http
+    gz, md5 = _publish(files, "SRR1.fastq.gz")
+    (tmp_path / "SRR1.fastq.gz.part").write_bytes(b"\0" * (len(gz) + 500))
+    fetch_file(FileJob("SRR1", f"{base}/SRR1.fastq.gz", tmp_path / "SRR1.fastq.gz", md5, len(gz)), retries=1)
+    assert files.offsets == [0]
+    assert (tmp_path / "SRR1.fastq.gz").read_bytes() == gz
+
+
+def test_md5_mismatch_is_an_error_and_leaves_no_output(http, tmp_path):
+    files, base = http
+    gz, _ = _publish(files, "SRR1.fastq.gz")
+    job = FileJob("SRR1", f"{base}/SRR1.fastq.gz", tmp_path / "SRR1.fastq.gz", "0" * 32, len(gz))
+    with pytest.raises(DownloadError, match="md5"):
+        fetch_file(job, retries=1)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_files_reports_per_run(http, tmp_path):
+    files, base = http
+    jobs = []
+    for name in ("SRR1_1", "SRR1_2", "SRR2"):
+        gz, md5 = _publish(files, f"{name}.fastq.gz")
+        jobs.append(FileJob(name[:4], f"{base}/{name}.fastq.gz", tmp_path / f"{name}.fastq.gz", md5, len(gz)))
+    jobs.append(FileJob("SRR3", f"{base}/missing.fastq.gz", tmp_path / "SRR3.fastq.gz"))
+
+    progress = {}
+    results = download_files(jobs, lambda run, done, total: progress.__setitem__(run, (done, total)),
+                             max_workers=3, retries=1)
+    assert results["SRR1"] is None and results["SRR2"] is None
+    assert "404" in results["SRR3"]
+    size = len(files.data["SRR1_1.fastq.gz"]) + len(files.data["SRR1_2.fastq.gz"])
+    assert progress["SRR1"] == (size, size)
+    assert (tmp_path / "SRR1_2.fastq.gz").read_bytes() == files.data["SRR1_2.fastq.gz"]
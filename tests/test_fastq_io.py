@@ -0,0 +1,58 @@
+"""
+tests/test_fastq_io.py
+
+FASTQ files are read gzipped or plain: name parsing, directory listing
+(gzipped copy preferred), transparent opening and the upload header check.
+
+Run:
+    python -m pytest tests/test_fastq_io.py -v
+"""
+
+from __future__ import annotations
+
+import gzip
+
+from src.pipeline.fastq_io import find_fastq, list_fastqs, open_fastq, split_fastq_name, validate_fastq_header
+
+
+RECORD = b"@r1\nACGTACGT\n+\nIIIIIIII\n"
+
+
+def test_split_fastq_name():
+    assert split_fastq_name("SRR1_1.fastq.gz") == ("SRR1", "1")
+    assert split_fastq_name("SRR1_2.fastq") == ("SRR1", "2")
+    assert split_fastq_name("SRR2.fastq.gz") == ("SRR2", None)
+    assert split_fastq_name("SRR2.fastq.gz.part") is None
+    assert split_fastq_name("SRR2.sra") is None
+
+
+def test_list_and_find_prefer_gzipped_copy(tmp_path):
+    for name in ("SRR1_1.fastq.gz", "SRR1_2.fastq.gz", "SRR1_1.fastq", "SRR2.fastq", "SRR3.fastq.gz.part"):
+        (tmp_path / name).write_bytes(b"")
+    assert list_fastqs(tmp_path) == {
+        "SRR1": {"1": "SRR1_1.fastq.gz", "2": "SRR1_2.fastq.gz"},
+        "SRR2": {None: "SRR2.fastq"},
+    }
+    assert find_fastq(tmp_path, "SRR1_1").name == "SRR1_1.fastq.gz"
+    assert find_fastq(tmp_path, "SRR2").name == "SRR2.fastq"
+    assert find_fastq(tmp_path, "SRR3") is None
+
+
+def test_open_fastq_reads_both_forms(tmp_path):
+    (tmp_path / "a.fastq").write_bytes(RECORD)
+    (tmp_path / "b.fastq.gz").write_bytes(gzip.compress(RECORD))
+    for name in ("a.fastq", "b.fastq.gz"):
+        with open_fastq(tmp_path / name) as f:
+            assert f.read() == RECORD.decode()
+
+
+def test_validate_fastq_header(tmp_path):
+    (tmp_path / "ok.fastq.gz").write_bytes(gzip.compress(RECORD))
+    (tmp_path / "plain.fastq.gz").write_bytes(RECORD)
+    (tmp_path / "packed.fastq").write_bytes(gzip.compress(RECORD))
+    (tmp_path / "bad.fastq").write_bytes(b">r1\nACGT\n")
+    assert validate_fastq_header(str(tmp_path / "ok.fastq.gz")) == (True, "")
+    assert not validate_fastq_header(str(tmp_path / "plain.fastq.gz"))[0]
+    assert not validate_fastq_header(str(tmp_path / "packed.fastq"))[0]
+    assert not validate_fastq_header(str(tmp_path / "bad.fastq"))[0]
+    assert not validate_fastq_header(str(tmp_path / "missing.fastq"))[0]
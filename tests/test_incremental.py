@@ -0,0 +1,98 @@
+"""
+tests/test_incremental.py
+
+Dirty-run tracking and new-vs-all (rectangular) distance blocks used to
+recompute diversity only for newly ingested runs.
+
+Run:
+    python -m pytest tests/test_incremental.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from scipy import sparse as sp
+
+from src.services.assessment_service import (
+    create_run, ingest_run_data, get_dirty_runs, mark_runs_analysed,
+    store_beta_diversity_matrix, store_beta_diversity_rows, count_beta_pairs,
+    get_beta_diversity_matrix,
+)
+from src.services.diversity import braycurtis_matrix, braycurtis_rows
+from src.services.distance_scheduler import DistanceScheduler
+
+
+FEATURES = [{"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"}]
+
+
+def _runs(project_id: int, n: int) -> list[int]:
+    ids = []
+    for i in range(n):
+        run_id = create_run(project_id, source="ncbi", srr_accession=f"SRR{i}")["run_id"]
+        ingest_run_data(run_id, [("A", 1.0)], FEATURES, {"asv1": i + 1})
+        ids.append(run_id)
+    return ids
+
+
+def test_runs_are_dirty_until_analysed_and_again_after_reingest(db):
+    r1, r2 = _runs(db["project_id"], 2)
+    assert get_dirty_runs(db["project_id"], "alpha") == [r1, r2]
+
+    mark_runs_analysed([r1, r2], "alpha")
+    assert get_dirty_runs(db["project_id"], "alpha") == []
+    assert get_dirty_runs(db["project_id"], "bray_curtis") == [r1, r2]   # per analysis
+
+    ingest_run_data(r2, [("A", 1.0)], FEATURES, {"asv1": 9})
+    assert get_dirty_runs(db["project_id"], "alpha") == [r2]
+
+
+def test_since_marks_older_stamps_stale(db):
+    from datetime import datetime, timedelta, timezone
+    r1, r2 = _runs(db["project_id"], 2)
+    mark_runs_analysed([r1, r2], "unifrac")
+    later = datetime.now(timezone.utc) + timedelta(hours=1)      # e.g. a rebuilt tree
+    assert get_dirty_runs(db["project_id"], "unifrac", since=later) == [r1, r2]
+
+
+def test_store_beta_diversity_rows_fills_the_missing_pairs(db):
+    r1, r2, r3 = _runs(db["project_id"], 3)
+    store_beta_diversity_matrix(db["project_id"], "bray_curtis", {"R1": r1, "R2": r2},
+                                np.array([[0.0, 0.2], [0.2, 0.0]]))
+    assert count_beta_pairs([r1, r2], "bray_curtis") == 1
+    assert count_beta_pairs([r1, r2, r3], "bray_curtis") == 1
+
+    # new run r3 against every run; its self-pair is skipped
+    written = store_beta_diversity_rows(db["project_id"], "bray_curtis", [r3], [r1, r2, r3],
+                                        np.array([[0.5, 0.6, 0.0]]))
+    assert written == 2
+    full, ids = get_beta_diversity_matrix(db["project_id"], "bray_curtis", [r1, r2, r3])
+    np.testing.assert_allclose(full, [[0, .2, .5], [.2, 0, .6], [.5, .6, 0]])
+
+
+def test_store_beta_diversity_rows_writes_shared_pairs_once(db):
+    r1, r2, r3 = _runs(db["project_id"], 3)
+    block = np.array([[0.3, 0.0, 0.7], [0.4, 0.7, 0.0]])     # rows r2, r3 both hold (r2, r3)
+    assert store_beta_diversity_rows(db["project_id"], "bray_curtis", [r2, r3], [r1, r2, r3], block) == 3
+    assert count_beta_pairs([r1, r2, r3], "bray_curtis") == 3
+
+
+def test_rows_block_matches_full_matrix():
+    rng = np.random.default_rng(5)
+    counts = rng.poisson(3, size=(12, 30))
+    rows = [3, 10]
+    full = braycurtis_matrix(counts)
+    np.testing.assert_allclose(braycurtis_rows(counts, rows), full[rows])
+    sched = DistanceScheduler(max_workers=1, tile_size=5)
+    np.testing.assert_allclose(sched.pairwise_rows("braycurtis", {"x": counts}, rows), full[rows])
+
+
+def test_rows_block_of_a_sparse_matrix_stays_sparse(monkeypatch):
+    rng = np.random.default_rng(6)
+    counts = rng.poisson(3, size=(15, 40)) * (rng.random((15, 40)) < 0.3)
+    counts[7] = 0                                   # an empty run: 0/0 pairs are 0
+    rows = [0, 7, 14]
+    full = braycurtis_matrix(counts)
+    csr = sp.csr_matrix(counts)
+    monkeypatch.setattr(sp.csr_matrix, "toarray", lambda self, *a, **k: pytest.fail("densified"))
+    np.testing.assert_allclose(braycurtis_rows(csr, rows), full[rows])
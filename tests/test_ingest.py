@@ -0,0 +1,122 @@
+"""
+tests/test_ingest.py
+
+Service-layer ingestion tests against a temporary SQLCipher database.
+
+Run:
+    python -m pytest tests/test_ingest.py -v
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import func, select, text
+
+import src.db.database as database
+from src.db.db_models import Feature, FeatureCount
+from src.db.migrations import run_migrations
+from src.db.repository import create_project, get_user, get_run, move_run_features
+from src.services.assessment_service import (
+    create_run, ingest_run_data, ingest_project_features, get_feature_counts,
+    get_genus_data, get_project_feature_taxonomy,
+)
+
+
+FEATURES = [
+    {"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "d__Bacteria;g__Bacteroides"},
+    {"feature_id": "asv2", "sequence": "GGCC", "taxonomy": None},
+]
+
+
+def test_ingest_run_data_round_trip(db):
+    run = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")
+    out = ingest_run_data(
+        run_id=run["run_id"],
+        genus_rows=[("Bacteroides", 0.7), ("Unclassified", 0.3)],
+        features=FEATURES,
+        feature_counts={"asv1": 10, "asv2": 5, "stale": 99},
+    )
+    assert out["features_inserted"] == 2
+
+    counts = {r["feature_id"]: r for r in get_feature_counts(run["run_id"])}
+    assert set(counts) == {"asv1", "asv2"}          # stale id dropped by the FK guard
+    assert counts["asv1"]["abundance"] == 10
+    assert counts["asv1"]["taxonomy"] == "d__Bacteria;g__Bacteroides"
+    assert [g["genus"] for g in get_genus_data(run["run_id"])] == ["Bacteroides", "Unclassified"]
+
+
+def test_ingest_run_data_replaces_previous_rows(db):
+    run = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")
+    ingest_run_data(run["run_id"], [("Bacteroides", 1.0)], FEATURES, {"asv1": 1, "asv2": 2})
+    ingest_run_data(run["run_id"], [("Prevotella", 1.0)], FEATURES[:1], {"asv1": 7})
+
+    counts = get_feature_counts(run["run_id"])
+    assert [(r["feature_id"], r["abundance"]) for r in counts] == [("asv1", 7)]
+    assert [g["genus"] for g in get_genus_data(run["run_id"])] == ["Prevotella"]
+
+
+def test_runs_share_one_project_feature_row(db):
+    pid = db["project_id"]
+    ingest_project_features(pid, FEATURES)
+    r1 = create_run(pid, source="ncbi", srr_accession="SRR1")
+    r2 = create_run(pid, source="ncbi", srr_accession="SRR2")
+    ingest_run_data(r1["run_id"], [], None, {"asv1": 3, "asv2": 0})
+    ingest_run_data(r2["run_id"], [], None, {"asv1": 4, "asv2": 1})
+
+    session = database.SessionLocal()
+    try:
+        assert session.scalar(select(func.count()).select_from(Feature)) == 2
+        assert session.scalar(select(func.count()).select_from(FeatureCount)) == 3   # zero count not stored
+    finally:
+        session.close()
+    assert [r["feature_id"] for r in get_feature_counts(r1["run_id"])] == ["asv1"]
+    assert get_project_feature_taxonomy(pid) == {"asv1": "d__Bacteria;g__Bacteroides"}
+
+
+def test_move_run_features_copies_dictionary_entries(db):
+    run = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")
+    ingest_run_data(run["run_id"], [], FEATURES, {"asv1": 2, "asv2": 5})
+
+    session = database.SessionLocal()
+    try:
+        other = create_project(session, user=get_user(session, db["user_id"]), name="Other")
+        db_run = get_run(session, run["run_id"])
+        move_run_features(session, run=db_run, project_id=other.project_id)
+        db_run.project_id = other.project_id
+        session.commit()
+        other_id = other.project_id
+    finally:
+        session.close()
+
+    assert set(get_project_feature_taxonomy(other_id)) == {"asv1"}
+    assert {r["feature_id"] for r in get_feature_counts(run["run_id"])} == {"asv1", "asv2"}
+
+
+def test_migration_folds_run_scoped_features(db):
+    run = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")
+    run2 = create_run(db["project_id"], source="ncbi", srr_accession="SRR2")
+    engine = database.get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE feature_count"))
+        conn.execute(text("DROP TABLE feature"))
+        conn.execute(text(
+            "CREATE TABLE feature (run_id INTEGER NOT NULL, feature_id VARCHAR(64) NOT NULL, "
+            "sequence TEXT, taxonomy TEXT, PRIMARY KEY (run_id, feature_id))"))
+        conn.execute(text(
+            "CREATE TABLE feature_count (run_id INTEGER NOT NULL, feature_id VARCHAR(64) NOT NULL, "
+            "abundance INTEGER NOT NULL, PRIMARY KEY (run_id, feature_id), "
+            "FOREIGN KEY (run_id, feature_id) REFERENCES feature (run_id, feature_id))"))
+        for rid in (run["run_id"], run2["run_id"]):
+            conn.execute(text("INSERT INTO feature VALUES (:r, 'asv1', 'ACGT', 'g__X')"), {"r": rid})
+            conn.execute(text("INSERT INTO feature_count VALUES (:r, 'asv1', :a)"),
+                         {"r": rid, "a": rid % 2})
+
+    run_migrations(engine)
+    run_migrations(engine)      # second pass is a no-op
+
+    session = database.SessionLocal()
+    try:
+        assert session.scalar(select(func.count()).select_from(Feature)) == 1
+        assert session.scalar(select(func.count()).select_from(FeatureCount)) == 1
+    finally:
+        session.close()
+    assert get_project_feature_taxonomy(db["project_id"]) == {"asv1": "g__X"}
@@ -0,0 +1,54 @@
+"""
+tests/test_ordination.py
+
+Truncated PCoA in src/services/ordination.py.
+
+Run:
+    python -m pytest tests/test_ordination.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist, squareform
+
+from src.services.ordination import double_centre, pcoa
+
+
+def _distances(n: int = 40, dims: int = 6, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return squareform(pdist(rng.normal(size=(n, dims)) * np.arange(dims, 0, -1)))
+
+
+def test_double_centre_matches_centering_matrix():
+    d = _distances(12)
+    h = np.eye(12) - np.ones((12, 12)) / 12
+    np.testing.assert_allclose(double_centre(d), -0.5 * h @ d ** 2 @ h, atol=1e-10)
+
+
+def test_truncated_solvers_agree_with_full_eigh():
+    d = _distances()
+    full = np.linalg.eigvalsh(double_centre(d))[::-1][:4]
+    dense, lanczos = pcoa(d, 4, method="dense"), pcoa(d, 4, method="eigsh")
+    np.testing.assert_allclose(dense.eigenvalues, full, rtol=1e-8)
+    np.testing.assert_allclose(lanczos.eigenvalues, full, rtol=1e-8)
+    np.testing.assert_allclose(np.abs(dense.coords), np.abs(lanczos.coords), atol=1e-8)
+    np.testing.assert_allclose(dense.coords, lanczos.coords, atol=1e-8)   # same sign convention
+
+
+def test_euclidean_distances_are_recovered_with_full_variance():
+    d = _distances(n=30, dims=3)
+    result = pcoa(d, 3)
+    np.testing.assert_allclose(squareform(pdist(result.coords)), d, atol=1e-8)
+    assert result.proportion_explained.sum() == pytest.approx(1.0)
+    assert np.all(np.diff(result.proportion_explained) <= 0)
+
+
+def test_small_inputs():
+    assert pcoa(np.zeros((1, 1))).coords.shape == (1, 0)
+    two = pcoa(np.array([[0.0, 0.4], [0.4, 0.0]]))
+    assert two.coords.shape == (2, 1)
+    np.testing.assert_allclose(np.abs(two.coords[:, 0]), [0.2, 0.2])
+    with pytest.raises(ValueError):
+        pcoa(_distances(5), 2, method="svd")
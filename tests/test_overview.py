@@ -0,0 +1,86 @@
+"""
+tests/test_overview.py
+
+Project summaries used by the Profile page and project loader.
+
+Run:
+    python -m pytest tests/test_overview.py -v
+"""
+
+from __future__ import annotations
+
+import contextlib
+
+from sqlalchemy import event
+
+import src.db.database as database
+from src.services.assessment_service import (
+    create_project, create_run, ingest_run_data, get_project_overview, list_user_projects,
+)
+
+
+FEATURES = [
+    {"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"},
+    {"feature_id": "asv2", "sequence": "GGCC", "taxonomy": "g__B"},
+]
+
+
+@contextlib.contextmanager
+def _count_queries():
+    statements: list[str] = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = database.get_engine()
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+
+
+def _seed(project_id: int, n_runs: int, prefix: str) -> list[int]:
+    run_ids = []
+    for i in range(n_runs):
+        rid = create_run(project_id, source="ncbi", srr_accession=f"{prefix}{i}")["run_id"]
+        if i % 2 == 0:   # leave every other run pending
+            ingest_run_data(rid, [("Bacteroides", 0.5), (f"G{i}", 0.5)], FEATURES, {"asv1": 1, "asv2": i})
+        run_ids.append(rid)
+    return run_ids
+
+
+def test_project_overview_counts(db):
+    _seed(db["project_id"], 4, "SRR")
+    ov = get_project_overview(db["project_id"])
+    assert ov["total_runs"] == 4
+    assert ov["uploaded_runs"] == 2 and ov["pending_runs"] == 2
+    assert ov["total_asvs"] == 2           # asv2 has a zero count in run 0 but not in run 2
+    assert ov["total_genera"] == 3         # Bacteroides, G0, G2
+
+
+def test_overview_query_count_is_constant(db):
+    _seed(db["project_id"], 2, "A")
+    with _count_queries() as small:
+        get_project_overview(db["project_id"])
+    _seed(db["project_id"], 6, "B")
+    with _count_queries() as large:
+        get_project_overview(db["project_id"])
+    assert len(small) == len(large)
+
+
+def test_list_user_projects_query_count_is_constant(db):
+    _seed(db["project_id"], 3, "A")
+    with _count_queries() as small:
+        first = list_user_projects(db["user_id"])
+    for n in range(3):
+        pid = create_project(db["user_id"], f"P{n}")["project_id"]
+        _seed(pid, 2, f"P{n}-")
+    with _count_queries() as large:
+        projects = list_user_projects(db["user_id"])
+
+    assert len(small) == len(large)
+    assert first[0]["run_count"] == 3
+    assert [p["run_count"] for p in projects].count(2) == 3
+    runs = next(p for p in projects if p["project_id"] == db["project_id"])["runs"]
+    assert [r["srr_accession"] for r in runs] == ["A2", "A1", "A0"]
@@ -0,0 +1,143 @@
+"""
+tests/test_project_export.py
+
+Columnar (Arrow IPC / Parquet) export of a project's results and the
+round trip back into a new project.
+
+Run:
+    python -m pytest tests/test_project_export.py -v
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.services.assessment_service import (
+    create_project, create_run, ingest_run_data, store_alpha_diversities_bulk, store_beta_diversity_matrix,
+    store_pcoa_ordination, get_beta_diversity_matrix, get_pcoa, get_pcoa_axes, delete_project, ServiceError,
+    create_tree_instance, get_tree, get_dirty_runs, mark_runs_analysed,
+)
+from src.db.database import SessionLocal
+from src.db.db_models import BetaDiversity
+import src.services.project_export as project_export
+from src.services.project_export import export_project, import_project, load_project_tables
+
+
+FEATURES = [{"feature_id": "asv1", "sequence": "ACGT", "taxonomy": "g__A"},
+            {"feature_id": "asv2", "sequence": "GGCC", "taxonomy": "g__B"}]
+COORDS = np.arange(9.0).reshape(3, 3)
+NEWICK = "((asv1:0.1,asv2:0.2):0.05,asv3:0.3);"
+
+
+def _seed(project_id: int) -> list[int]:
+    ids = []
+    for i in range(3):
+        run_id = create_run(project_id, source="ncbi", srr_accession=f"SRR{i}")["run_id"]
+        ingest_run_data(run_id, [("A", 0.6), ("B", 0.4)], FEATURES, {"asv1": i + 1, "asv2": 5})
+        ids.append(run_id)
+    store_alpha_diversities_bulk({r: {"shannon": 1.0 + i} for i, r in enumerate(ids)})
+    store_beta_diversity_matrix(project_id, "bray_curtis", {f"R{i}": r for i, r in enumerate(ids)},
+                                np.array([[0, .2, .3], [.2, 0, .4], [.3, .4, 0]]))
+    store_pcoa_ordination(project_id, "bray_curtis", {r: tuple(COORDS[i]) for i, r in enumerate(ids)},
+                          [3.0, 2.0, 1.0], [0.5, 0.3, 0.2])
+    return ids
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_export_writes_one_file_per_table(db, tmp_path, fmt):
+    _seed(db["project_id"])
+    out = export_project(db["project_id"], tmp_path / "export", fmt=fmt)
+    tables = load_project_tables(out)
+    assert tables["runs"].num_rows == 3
+    assert tables["feature_counts"].num_rows == 6
+    assert tables["beta"].num_rows == 3
+    assert tables["pcoa"].num_rows == 9            # long form: 3 runs x 3 axes
+    assert str(tables["feature_counts"].schema.field("abundance").type) == "int32"
+
+
+def test_beta_pairs_reaching_outside_the_project_are_not_exported(db, tmp_path):
+    ids = _seed(db["project_id"])
+    other = create_project(db["user_id"], "Other")["project_id"]
+    outsider = create_run(other, source="ncbi", srr_accession="SRR9")["run_id"]
+    session = SessionLocal()
+    session.add(BetaDiversity(run_id_1=min(ids[0], outsider), run_id_2=max(ids[0], outsider),
+                              metric="bray_curtis", value=0.9))
+    session.commit()
+    session.close()
+
+    tables = load_project_tables(export_project(db["project_id"], tmp_path / "export"))
+    beta = tables["beta"].to_pydict()
+    assert len(beta["value"]) == 3
+    assert set(beta["run_id_1"]) | set(beta["run_id_2"]) <= set(ids)
+
+
+def test_import_round_trips_into_a_new_project(db, tmp_path):
+    _seed(db["project_id"])
+    out = export_project(db["project_id"], tmp_path / "export")
+    delete_project(db["project_id"])          # the runs must not exist in the target database
+
+    summary = import_project(out, db["user_id"], name="Imported")
+    pid = summary["project_id"]
+    assert summary["runs"] == 3
+
+    rows = sorted(get_pcoa(pid, "bray_curtis"), key=lambda r: r["run_id"])
+    assert [r["coords"] for r in rows] == COORDS.tolist()
+    matrix, _ = get_beta_diversity_matrix(pid, "bray_curtis", [r["run_id"] for r in rows])
+    np.testing.assert_allclose(matrix, [[0, .2, .3], [.2, 0, .4], [.3, .4, 0]])
+    assert [a["proportion_explained"] for a in get_pcoa_axes(pid, "bray_curtis")] == [0.5, 0.3, 0.2]
+
+
+def test_import_carries_the_tree_file_and_analysis_stamps_to_another_machine(db, tmp_path, monkeypatch):
+    ids = _seed(db["project_id"])
+    local = tmp_path / "machine_a" / "tree.nwk"     # the tree as the exporting machine stored it
+    local.parent.mkdir()
+    local.write_text(NEWICK)
+    create_tree_instance(db["project_id"], str(local))
+    mark_runs_analysed(ids, "alpha")
+    mark_runs_analysed(ids, "unifrac")
+
+    out = export_project(db["project_id"], tmp_path / "export")
+    delete_project(db["project_id"])
+    local.unlink()                                  # not there on the importing machine
+    monkeypatch.setattr(project_export, "IMPORT_DATA_DIR", tmp_path / "machine_b")
+
+    pid = import_project(out, db["user_id"], name="Imported")["project_id"]
+    tree = get_tree(pid)
+    path = tmp_path / "machine_b" / str(pid) / "tree.nwk"
+    assert tree["newick_path"] == str(path) and path.is_file()
+    text = path.read_text()
+    assert text == tree["newick_string"] == NEWICK
+    assert text.endswith(";") and text.count("(") == text.count(")")
+
+    assert get_dirty_runs(pid, "alpha") == []
+    since = datetime.fromisoformat(tree["created_at"])
+    assert get_dirty_runs(pid, "unifrac", since=since) == []
+    assert get_dirty_runs(pid, "bray_curtis") != []     # never stamped before the export
+
+
+def test_import_refuses_runs_already_present(db, tmp_path):
+    _seed(db["project_id"])
+    out = export_project(db["project_id"], tmp_path / "export", fmt="parquet")
+    with pytest.raises(ServiceError, match="already in the database"):
+        import_project(out, db["user_id"])
+
+
+def test_import_rejects_rows_of_runs_missing_from_the_export(db, tmp_path):
+    import pyarrow as pa
+
+    ids = _seed(db["project_id"])
+    out = export_project(db["project_id"], tmp_path / "export")
+    delete_project(db["project_id"])
+    # drop the last run from runs.arrow, as a truncated or hand-edited export would
+    runs = load_project_tables(out)["runs"]
+    kept = runs.slice(0, 2)
+    with pa.OSFile(str(out / "runs.arrow"), "wb") as sink, pa.ipc.new_file(sink, kept.schema) as writer:
+        writer.write_table(kept)
+
+    with pytest.raises(ServiceError, match=str(ids[2])):
+        import_project(out, db["user_id"])
@@ -0,0 +1,118 @@
+"""
+tests/test_qc.py
+
+Streaming FASTQ profiler: reservoir sampling, per-position quality
+quantiles in QIIME's seven-number-summary layout, and the truncation
+lengths get_trunc derives from them.
+
+Run:
+    python -m pytest tests/test_qc.py -v
+"""
+
+from __future__ import annotations
+
+import gzip
+import zipfile
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.pipeline.qc as qc
+from src.pipeline.qc import (
+    _reservoir, _trunc_len, find_median_drop, get_trunc, profile_fastq, quality_summary,
+)
+
+
+def _fastq(path, quals: list[list[int]], gz: bool = True) -> str:
+    """One record per quality list; sequences are all A."""
+    body = b"".join(
+        b"@r%d\n%s\n+\n%s\n" % (i, b"A" * len(q), bytes(33 + v for v in q))
+        for i, q in enumerate(quals)
+    )
+    path.write_bytes(gzip.compress(body) if gz else body)
+    return str(path)
+
+
+def test_reservoir_is_uniform_and_counts_everything():
+    rng = np.random.default_rng(0)
+    hits = np.zeros(1000)
+    for _ in range(400):
+        sample, n = _reservoir(iter(range(1000)), 50, rng)
+        assert n == 1000 and len(set(sample)) == 50
+        hits[sample] += 1
+    # each item is drawn with p = 0.05: 20 expected hits in 400 trials
+    assert hits[:500].mean() == pytest.approx(20, rel=0.15)
+    assert hits[500:].mean() == pytest.approx(20, rel=0.15)
+    assert _reservoir(iter(range(7)), 50, rng) == (list(range(7)), 7)
+
+
+@pytest.mark.parametrize("gz", [True, False])
+def test_profile_samples_reads_and_lengths(tmp_path, gz):
+    quals = [[30] * (100 + i % 50) for i in range(3000)]
+    path = _fastq(tmp_path / ("r.fastq.gz" if gz else "r.fastq"), quals, gz=gz)
+    profile = profile_fastq(path, n_reads=500)
+    assert profile.reads == 3000
+    assert len(profile.lengths) == 500 and len(profile.qualities) == 500
+    assert profile.lengths.min() >= 100 and profile.lengths.max() <= 149
+    assert 100 <= profile.min_len <= 103
+
+
+def test_quality_summary_matches_numpy_per_position():
+    rng = np.random.default_rng(1)
+    quals = [rng.integers(2, 41, size=int(rng.integers(5, 9))) for _ in range(200)]
+    summary = quality_summary([(33 + q).astype(np.uint8).tobytes() for q in quals])
+    assert list(summary.index) == ["count", "2%", "9%", "25%", "50%", "75%", "91%", "98%"]
+    assert list(summary.columns) == list(range(1, 9))      # positions count from 1, as in QIIME
+    for pos in range(8):
+        column = np.array([q[pos] for q in quals if len(q) > pos])
+        assert summary.loc["count", pos + 1] == len(column)
+        np.testing.assert_allclose(summary.loc["50%", pos + 1], np.median(column), rtol=1e-6)
+        np.testing.assert_allclose(summary.loc["2%", pos + 1], np.percentile(column, 2), rtol=1e-5)
+
+
+def test_median_drop_on_profiled_summary():
+    quals = [bytes(33 + v for v in [38] * 120 + [20] * 30)] * 10
+    assert find_median_drop(quality_summary(quals), 25) == 121
+    with pytest.raises(ValueError, match="no read positions"):
+        find_median_drop(quality_summary([]), 25)
+    with pytest.raises(ValueError, match="positions start at 1"):
+        _trunc_len(150, 0)
+
+
+def test_get_trunc_from_profiles_without_demux_qzv(tmp_path):
+    good, bad = [38] * 150, [38] * 90 + [15] * 60
+    fwd = _fastq(tmp_path / "s_1.fastq.gz", [good] * 50)
+    rev = _fastq(tmp_path / "s_2.fastq.gz", [bad] * 50)
+    state = SimpleNamespace(local_paths={'paired': [fwd, rev], 'single': []})
+    assert get_trunc("LOCAL_PROJECT", "paired", state) == {'forward': 150, 'reverse': 91}
+
+    single = _fastq(tmp_path / "s.fastq", [[38] * 80] * 80 + [[38] * 60], gz=False)
+    state = SimpleNamespace(local_paths={'paired': [], 'single': [single]})
+    assert get_trunc("LOCAL_PROJECT", "single", state) == {'single': 80}
+
+
+def _demux_qzv(path, summaries: dict[str, list[int]]) -> None:
+    """A demux.qzv holding the seven-number summaries QIIME writes for reads of identical quality."""
+    with zipfile.ZipFile(path, "w") as z:
+        for direction, quals in summaries.items():
+            index = ["count"] + [f"{p}%" for p in qc.SUMMARY_PERCENTILES]
+            df = pd.DataFrame([[50] * len(quals)] + [quals] * (len(index) - 1),
+                              index=index, columns=range(1, len(quals) + 1))
+            z.writestr(f"0a1b2c/data/{direction}-seven-number-summaries.tsv", df.to_csv(sep="\t"))
+
+
+def test_native_and_demux_qzv_summaries_truncate_alike(tmp_path, monkeypatch):
+    good, bad = [38] * 150, [38] * 90 + [15] * 60
+    fwd = _fastq(tmp_path / "s_1.fastq.gz", [good] * 50)
+    rev = _fastq(tmp_path / "s_2.fastq.gz", [bad] * 50)
+    monkeypatch.setattr(qc, "DATA_DIR", tmp_path / "data")
+    qiime_dir = tmp_path / "data" / "LOCAL_PROJECT" / "qiime" / "paired"
+    qiime_dir.mkdir(parents=True)
+    _demux_qzv(qiime_dir / "demux.qzv", {"forward": good, "reverse": bad})
+
+    state = SimpleNamespace(local_paths={'paired': [fwd, rev], 'single': []})
+    native = get_trunc("LOCAL_PROJECT", "paired", state)
+    assert native == get_trunc("LOCAL_PROJECT", "paired", state, use_qzv=True)
+    assert native == {'forward': 150, 'reverse': 91}
@@ -0,0 +1,77 @@
+"""
+tests/test_rarefaction.py
+
+Vectorised rarefaction: subsampling, summaries, seeding and storage.
+
+Run:
+    python -m pytest tests/test_rarefaction.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from src.services.assessment_service import (
+    create_run, store_rarefaction_bulk, get_rarefaction_curves, delete_project,
+)
+from src.services.rarefaction import (
+    OBSERVED, SHANNON, SIMPSON, rarefaction_depths, rarefy_run, rarefy_project, common_depth,
+)
+
+
+COUNTS = np.array([
+    [50, 30, 0, 20, 0],
+    [5, 0, 5, 0, 0],
+    [0, 0, 0, 0, 0],          # never ingested
+])
+
+
+def test_depths_include_shallowest_run():
+    depths = rarefaction_depths(COUNTS.sum(axis=1), n_depths=4)
+    assert depths.tolist() == [10, 25, 50, 75, 100]
+    assert rarefaction_depths(np.zeros(3)).size == 0
+
+
+def test_full_depth_subsample_is_the_run_itself():
+    out = rarefy_run(COUNTS[0], np.array([100, 200]), n_iter=5)
+
+    assert list(out) == [100]                               # deeper than the run is skipped
+    np.testing.assert_allclose(out[100][OBSERVED], 3)
+    p = np.array([0.5, 0.3, 0.2])
+    np.testing.assert_allclose(out[100][SHANNON], -(p * np.log2(p)).sum())
+    np.testing.assert_allclose(out[100][SIMPSON], 1 - (p ** 2).sum())
+
+
+def test_project_rows_are_seeded_per_run():
+    rows = rarefy_project(COUNTS[:2], [7, 8], n_iter=10, seed=3)
+    again = rarefy_project(COUNTS[:2][::-1], [8, 7], n_iter=10, seed=3)
+
+    key = lambda r: (r["run_id"], r["metric"], r["depth"])
+    assert sorted(rows, key=key) == sorted(again, key=key)
+    for r in rows:
+        assert r["minimum"] <= r["q1"] <= r["median"] <= r["q3"] <= r["maximum"]
+    # run 8 has 10 reads, so only depth 10 is shared
+    assert {r["depth"] for r in rows if r["run_id"] == 8} == {10}
+
+
+def test_sparse_matrix_draws_the_same_subsamples():
+    from scipy import sparse as sp
+    rows = rarefy_project(COUNTS, [1, 2, 3], n_iter=5)
+    assert rarefy_project(sp.csr_matrix(COUNTS, dtype=np.int32), [1, 2, 3], n_iter=5) == rows
+
+
+def test_store_and_read_curves(db):
+    r1 = create_run(db["project_id"], source="ncbi", srr_accession="SRR1")["run_id"]
+    r2 = create_run(db["project_id"], source="ncbi", srr_accession="SRR2")["run_id"]
+    rows = rarefy_project(COUNTS[:2], [r1, r2], n_iter=4)
+    store_rarefaction_bulk([r1, r2], rows)
+    store_rarefaction_bulk([r1, r2], rows)                 # re-runs replace, not duplicate
+
+    curves = get_rarefaction_curves(db["project_id"], SHANNON)
+    assert sorted(curves) == [r1, r2]
+    assert [r["depth"] for r in curves[r1]] == sorted(r["depth"] for r in curves[r1])
+    assert len(curves[r1]) == len({r["depth"] for r in rows if r["run_id"] == r1})
+    assert common_depth(curves) == 10
+
+    delete_project(db["project_id"])
+    assert get_rarefaction_curves(db["project_id"], SHANNON) == {}
@@ -0,0 +1,90 @@
+"""
+tests/test_unifrac.py
+
+Flat-array UniFrac engine in src/services/unifrac.py.
+
+Run:
+    python -m pytest tests/test_unifrac.py -v
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from src.services.unifrac import (
+    TreeArrays, node_proportions, unifrac_matrices, weighted_normalized_unifrac,
+    UNWEIGHTED, WEIGHTED, WEIGHTED_NORMALIZED, GENERALIZED, UNIFRAC_METRICS,
+)
+
+
+class _Node:
+    def __init__(self, name="", length=None, children=()):
+        self.name, self.length, self.children = name, length, list(children)
+
+
+def _tree() -> _Node:
+    # ((a:1,b:2):1,c:4);
+    return _Node(children=[
+        _Node(length=1.0, children=[_Node("a", 1.0), _Node("b", 2.0)]),
+        _Node("c", 4.0),
+    ])
+
+
+def test_from_tree_is_postorder_with_levels():
+    tree = TreeArrays.from_tree(_tree())
+    assert tree.n_nodes == 5
+    assert tree.parent[-1] == -1                          # root last
+    assert all(tree.parent[i] > i for i in range(4))      # children before parents
+    assert [sorted(tree.tip_names[np.isin(tree.tip_nodes, lvl)]) for lvl in tree.levels][0] == ["a", "b", "c"]
+
+
+def test_node_proportions_sum_up_the_tree():
+    tree = TreeArrays.from_tree(_tree())
+    counts = np.array([[1, 1, 2], [0, 0, 0]])
+    p = node_proportions(tree, counts, tree.tip_index(["a", "b", "c"]))
+    assert p[-1].tolist() == [1.0, 0.0]                   # root holds everything
+    assert p[tree.parent[tree.tip_nodes[0]], 0] == 0.5    # (a,b) clade
+
+
+def test_weighted_unifrac_by_hand():
+    tree = TreeArrays.from_tree(_tree())
+    counts = np.array([[1, 0, 0], [0, 0, 1]])            # all of A on a, all of B on c
+    d = weighted_normalized_unifrac(tree, counts, tree.tip_index(["a", "b", "c"]))
+    # branches a(1), ab-clade(1), c(4): Σl|pA-pB| = 1+1+4, Σl(pA+pB) = 1+1+4
+    assert d[0, 1] == 1.0 and d[1, 0] == 1.0 and d[0, 0] == 0.0
+
+
+def test_features_missing_from_tree_are_ignored():
+    tree = TreeArrays.from_tree(_tree())
+    counts = np.array([[2, 0, 0, 5], [0, 2, 0, 5]])
+    d = weighted_normalized_unifrac(tree, counts, tree.tip_index(["a", "b", "c", "not_in_tree"]))
+    # only a vs b differ: branches a(1) and b(2), each with proportion 2/7
+    np.testing.assert_allclose(d[0, 1], (1 + 2) / (1 + 2 + 2 * 1))
+
+
+def test_unweighted_unifrac_by_hand():
+    tree = TreeArrays.from_tree(_tree())
+    counts = np.array([[5, 1, 0], [1, 0, 0]])            # A on a,b ; B on a only
+    d = unifrac_matrices(tree, counts, tree.tip_index(["a", "b", "c"]), (UNWEIGHTED,))
+    # A reaches a(1), b(2), clade(1); B reaches a(1), clade(1): unique b = 2 of 4
+    assert d[UNWEIGHTED][0, 1] == 0.5
+
+
+def test_variants_agree_at_their_limits():
+    rng = np.random.default_rng(3)
+    tree = TreeArrays.from_tree(_Node(children=[
+        _Node(length=0.5, children=[_Node(f"t{i}", rng.exponential()) for i in range(6)]),
+        _Node(length=1.5, children=[_Node(f"t{i}", rng.exponential()) for i in range(6, 12)]),
+    ]))
+    counts = rng.poisson(2, size=(5, 12))
+    tips = tree.tip_index([f"t{i}" for i in range(12)])
+
+    out = unifrac_matrices(tree, counts, tips)
+    assert tuple(out) == UNIFRAC_METRICS
+    for m in UNIFRAC_METRICS:
+        np.testing.assert_allclose(out[m], out[m].T)
+    # generalized UniFrac with alpha = 1 is normalised weighted UniFrac
+    g1 = unifrac_matrices(tree, counts, tips, (GENERALIZED,), alpha=1.0, block_bytes=1)
+    np.testing.assert_allclose(g1[GENERALIZED], out[WEIGHTED_NORMALIZED], atol=1e-12)
+    # unnormalised weighted UniFrac is bounded by twice the deepest root-to-tip path
+    assert out[WEIGHTED].max() > 0 and np.all(out[WEIGHTED_NORMALIZED] <= 1)